@@ -1,4 +1,5 @@
 import stat
+import time
 from pathlib import Path
 
 from image_builder.codebase.language import Languages
@@ -19,21 +20,34 @@ class Codebase:
     processes: Processes
     languages: Languages
     original_files: dict
+    timings: dict
 
     def __init__(self, path: str | Path = None):
         self.path = Path(path)
-        self.build = load_codebase_configuration(
-            self.path.joinpath(".copilot/config.yml")
+        self.timings = {}
+        self.build = self._load(
+            "configuration",
+            load_codebase_configuration,
+            self.path.joinpath(".copilot/config.yml"),
         )
-        self.builder = load_builder_configuration()
-        self.revision = load_codebase_revision(self.path)
-        self.processes = load_codebase_processes(self.path)
-        self.languages = load_codebase_languages(self.path)
+        self.builder = self._load("builder", load_builder_configuration)
+        self.revision = self._load("revision", load_codebase_revision, self.path)
+        self.processes = self._load("processes", load_codebase_processes, self.path)
+        self.languages = self._load("languages", load_codebase_languages, self.path)
+        for language, timing in self.languages.timings.items():
+            self.timings[f"languages.{language}"] = timing
         self.original_files = {
             "delete": {},
             "write": {},
         }
 
+    def _load(self, name: str, loader, *args):
+        start_time = time.time()
+        try:
+            return loader(*args)
+        finally:
+            self.timings[name] = (start_time, time.time() - start_time)
+
     def setup(self):
         self.builder.validate(self.build)
         self.original_files["write"]["Procfile"] = self.path.joinpath(
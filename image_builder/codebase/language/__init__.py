@@ -1,3 +1,5 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from .base import CodebaseLanguageError
@@ -15,6 +17,12 @@ LANGUAGES = {
 
 
 class Languages(dict):
+    timings: dict
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = {}
+
     def __str__(self):
         language_list = []
         for language in self.values():
@@ -23,13 +31,28 @@ class Languages(dict):
         return ", ".join(language_list)
 
 
+def load_language(language_class, path: Path):
+    start_time = time.time()
+    try:
+        return language_class.load(path), (start_time, time.time() - start_time)
+    except CodebaseLanguageError:
+        return None, (start_time, time.time() - start_time)
+
+
 def load_codebase_languages(path: Path):
     languages = Languages()
 
-    for language, language_class in LANGUAGES.items():
-        try:
-            languages[language] = language_class.load(path)
-        except CodebaseLanguageError:
-            pass
+    # Each loader may wait on endoflife.date, so detect all languages at once
+    with ThreadPoolExecutor(max_workers=len(LANGUAGES)) as executor:
+        futures = {
+            language: executor.submit(load_language, language_class, path)
+            for language, language_class in LANGUAGES.items()
+        }
+
+    for language, future in futures.items():
+        loaded_language, timing = future.result()
+        languages.timings[language] = timing
+        if loaded_language is not None:
+            languages[language] = loaded_language
 
     return languages
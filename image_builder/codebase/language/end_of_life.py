@@ -1,8 +1,21 @@
 import json
+import os
+import tempfile
+import threading
+import time
 from datetime import date
+from pathlib import Path
 
 import requests
 
+END_OF_LIFE_URL = "https://endoflife.date/api/{product}.json"
+END_OF_LIFE_TIMEOUT = 10
+END_OF_LIFE_CACHE_DIR = "END_OF_LIFE_CACHE_DIR"
+END_OF_LIFE_CACHE_TTL = "END_OF_LIFE_CACHE_TTL"
+END_OF_LIFE_OFFLINE = "END_OF_LIFE_OFFLINE"
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+SNAPSHOT_PATH = Path(__file__).parent.joinpath("end_of_life_snapshot.json")
+
 
 class EndOfLifeError(Exception):
     pass
@@ -12,14 +25,129 @@ class EndOfLifeNoProductError(EndOfLifeError):
     pass
 
 
-def get_versions(product: str):
-    response = requests.get(f"https://endoflife.date/api/{product}.json")
+class EndOfLifeCache:
+    path: Path
+    ttl: int
+
+    def __init__(self, path: str | Path, ttl: int = DEFAULT_CACHE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    def read(self, product: str) -> tuple[list | None, bool]:
+        try:
+            entry = json.loads(self._entry_path(product).read_text())
+            fresh = time.time() - entry["fetched_at"] < self.ttl
+            versions = entry["versions"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            # Treat a malformed entry as a miss so it is fetched again
+            return None, False
+
+        if not isinstance(versions, list):
+            return None, False
+        return versions, fresh
+
+    def write(self, product: str, versions: list):
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = json.dumps({"fetched_at": time.time(), "versions": versions})
+
+        # Write then rename so builds sharing the host never see a partial entry
+        handle, temporary_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, "w") as temporary_file:
+            temporary_file.write(entry)
+        os.replace(temporary_path, self._entry_path(product))
+
+    def _entry_path(self, product: str) -> Path:
+        return self.path.joinpath(f"{product}.json")
+
+
+def get_cache() -> EndOfLifeCache | None:
+    cache_dir = os.getenv(END_OF_LIFE_CACHE_DIR)
+    if not cache_dir:
+        return None
+
+    return EndOfLifeCache(cache_dir, get_cache_ttl())
+
+
+def get_cache_ttl() -> int:
+    try:
+        return int(os.getenv(END_OF_LIFE_CACHE_TTL, DEFAULT_CACHE_TTL))
+    except ValueError:
+        print(
+            f"{END_OF_LIFE_CACHE_TTL} must be a number of seconds, "
+            f"using {DEFAULT_CACHE_TTL}"
+        )
+        return DEFAULT_CACHE_TTL
+
+
+def is_offline() -> bool:
+    return os.getenv(END_OF_LIFE_OFFLINE, "").lower() in ["1", "true", "yes"]
+
+
+def get_snapshot_versions(product: str):
+    snapshot = json.loads(SNAPSHOT_PATH.read_text())
+    if product not in snapshot:
+        raise EndOfLifeNoProductError
+    return snapshot[product]
+
+
+def get_fallback_versions(product: str, error: Exception):
+    print(
+        f"Could not reach endoflife.date for {product}, "
+        f"using the bundled snapshot: {error}"
+    )
+    return get_snapshot_versions(product)
+
+
+def fetch_versions(product: str):
+    response = requests.get(
+        END_OF_LIFE_URL.format(product=product), timeout=END_OF_LIFE_TIMEOUT
+    )
     if response.status_code != 200:
         raise EndOfLifeNoProductError
     versions = json.loads(response.content.decode())
     return versions
 
 
+def refresh_cached_versions(cache: EndOfLifeCache, product: str):
+    try:
+        cache.write(product, fetch_versions(product))
+    except (EndOfLifeError, requests.RequestException, OSError):
+        pass
+
+
+def get_versions(product: str):
+    if is_offline():
+        return get_snapshot_versions(product)
+
+    cache = get_cache()
+    if cache is None:
+        try:
+            return fetch_versions(product)
+        except requests.RequestException as e:
+            return get_fallback_versions(product, e)
+
+    versions, fresh = cache.read(product)
+    if versions is not None:
+        if not fresh:
+            # Serve the stale table now and refresh it for the next build
+            threading.Thread(
+                target=refresh_cached_versions, args=(cache, product), daemon=True
+            ).start()
+        return versions
+
+    try:
+        versions = fetch_versions(product)
+    except requests.RequestException as e:
+        return get_fallback_versions(product, e)
+
+    try:
+        cache.write(product, versions)
+    except OSError:
+        pass
+
+    return versions
+
+
 def get_latest_version_for(product: str, lts: bool = True, version: str = None) -> str:
     versions = get_versions(product)
 
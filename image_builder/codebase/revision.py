@@ -57,36 +57,159 @@ class Revision:
         return tags
 
 
+class GitRepository:
+    path: Path
+    git_dir: Path
+    common_dir: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+        git_path = path.joinpath(".git")
+        if git_path.is_file():
+            # Worktrees and submodules point at their git directory from a file
+            git_dir = git_path.read_text().strip().removeprefix("gitdir:").strip()
+            self.git_dir = path.joinpath(git_dir)
+        else:
+            self.git_dir = git_path
+
+        commondir = self.git_dir.joinpath("commondir")
+        if commondir.exists():
+            self.common_dir = self.git_dir.joinpath(commondir.read_text().strip())
+        else:
+            self.common_dir = self.git_dir
+
+    def get_commits(self) -> tuple[str | None, str | None]:
+        result = subprocess.run(
+            ["git", "log", "-1", "--format=%h %H"],
+            cwd=self.path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            return None, None
+
+        output = result.stdout.strip().decode().split(" ")
+        if len(output) != 2:
+            return None, None
+
+        return output[0], output[1]
+
+    def get_refs(self) -> dict:
+        refs = {}
+
+        packed_refs = self.common_dir.joinpath("packed-refs")
+        if packed_refs.exists():
+            for line in packed_refs.read_text().split("\n"):
+                if not line or line.startswith("#") or line.startswith("^"):
+                    continue
+                commit, ref = line.split(" ", 1)
+                refs[ref] = commit
+
+        for ref_type in ["heads", "tags"]:
+            ref_dir = self.common_dir.joinpath("refs", ref_type)
+            for ref_path in ref_dir.rglob("*") if ref_dir.exists() else []:
+                if not ref_path.is_file():
+                    continue
+                commit = ref_path.read_text().strip()
+                if commit.startswith("ref:"):
+                    continue
+                refs[ref_path.relative_to(self.common_dir).as_posix()] = commit
+
+        return refs
+
+    def get_refs_by_commit(self) -> dict:
+        refs_by_commit = {}
+        for ref, commit in sorted(self.get_refs().items()):
+            refs_by_commit.setdefault(commit, []).append(ref)
+
+        return refs_by_commit
+
+    def get_config(self) -> list[tuple[str, str, str]]:
+        config = self.common_dir.joinpath("config")
+        if not config.exists():
+            return []
+
+        entries = []
+        section = None
+        for line in config.read_text().split("\n"):
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            # Section names and keys are case-insensitive, subsections are not
+            match = re.match(r'^\[\s*([\w.-]+)(?:\s+"(.*)")?\s*\]', line)
+            if match:
+                section = match.group(1).lower()
+                if match.group(2) is not None:
+                    section = f"{section}.{match.group(2)}"
+                continue
+            if section is None:
+                continue
+            key, _, value = line.partition("=")
+            entries.append((section, key.strip().lower(), value.strip().strip('"')))
+
+        return entries
+
+    def get_remote_url(self, remote: str = "origin") -> str | None:
+        config = self.get_config()
+        if any(
+            section == "include" or section.startswith("includeif.")
+            for section, _, _ in config
+        ):
+            # Included files can hold the remote or its rewrites, let git resolve it
+            return self.get_remote_url_from_git(remote)
+
+        url = next(
+            (
+                value
+                for section, key, value in config
+                if section == f"remote.{remote}" and key == "url"
+            ),
+            None,
+        )
+        if not url:
+            return None
+
+        rewrites = [
+            (value, section.removeprefix("url."))
+            for section, key, value in config
+            if section.startswith("url.") and key == "insteadof"
+        ]
+        matches = [rewrite for rewrite in rewrites if url.startswith(rewrite[0])]
+        if matches:
+            prefix, base = max(matches, key=lambda rewrite: len(rewrite[0]))
+            url = base + url.removeprefix(prefix)
+
+        return url
+
+    def get_remote_url_from_git(self, remote: str) -> str | None:
+        result = subprocess.run(
+            ["git", "ls-remote", "--get-url", remote],
+            cwd=self.path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            return None
+
+        # git echoes the remote name back when the remote has no url
+        url = result.stdout.strip().decode()
+        return url if url and url != remote else None
+
+
 def load_codebase_revision(path: Path):
     if not path.joinpath(".git").exists():
         raise CodebaseRevisionNoDataError
 
-    commit = subprocess.run(
-        "git rev-parse --short HEAD", shell=True, stdout=subprocess.PIPE
-    )
-    if commit.returncode == 0:
-        commit = commit.stdout.strip().decode()
-    else:
-        commit = None
+    repository = GitRepository(path)
 
-    branch = None
-
-    long_commit = subprocess.run(
-        "git rev-parse HEAD", shell=True, stdout=subprocess.PIPE
-    )
-    if long_commit.returncode == 0:
-        long_commit = long_commit.stdout.strip().decode()
-        branches = subprocess.run(
-            "git show-ref --heads", shell=True, stdout=subprocess.PIPE
-        )
-        if branches.returncode == 0:
-            branches = branches.stdout.strip().decode().split("\n")
+    commit, long_commit = repository.get_commits()
+    refs = repository.get_refs_by_commit().get(long_commit, [])
 
-            for possible_branch in branches:
-                if possible_branch.startswith(long_commit):
-                    branch = possible_branch.split(" ")[1]
-                    branch = branch.replace("refs/heads/", "")
-                    break
+    branch = None
+    for ref in refs:
+        if ref.startswith("refs/heads/"):
+            branch = ref.replace("refs/heads/", "")
+            break
 
     if (
         branch is None
@@ -96,23 +219,10 @@ def load_codebase_revision(path: Path):
         branch = os.environ["CODEBUILD_WEBHOOK_TRIGGER"].replace("branch/", "")
 
     tag = None
-
-    long_commit = subprocess.run(
-        "git rev-parse HEAD", shell=True, stdout=subprocess.PIPE
-    )
-    if long_commit.returncode == 0:
-        long_commit = long_commit.stdout.strip().decode()
-        tags = subprocess.run("git show-ref --tags", shell=True, stdout=subprocess.PIPE)
-        if tags.returncode == 0:
-            tags = tags.stdout.strip().decode().split("\n")
-
-            for possible_tag in tags:
-                if possible_tag.startswith(long_commit):
-                    tag = possible_tag.split(" ")[1]
-                    tag = tag.replace("refs/tags/", "")
-                    break
-    else:
-        long_commit = None
+    for ref in refs:
+        if ref.startswith("refs/tags/"):
+            tag = ref.replace("refs/tags/", "")
+            break
 
     if (
         tag is None
@@ -121,13 +231,6 @@ def load_codebase_revision(path: Path):
     ):
         tag = os.environ["CODEBUILD_WEBHOOK_TRIGGER"].replace("tag/", "")
 
-    remote_url = subprocess.run(
-        "git ls-remote --get-url origin", shell=True, stdout=subprocess.PIPE
-    )
-    if remote_url.returncode == 0:
-        output = remote_url.stdout.strip().decode()
-        remote = output if output else None
-    else:
-        remote = None
+    remote = repository.get_remote_url()
 
     return Revision(remote, commit, long_commit, tag=tag, branch=branch)
@@ -1,10 +1,21 @@
+import time
+
 import click
 
 from image_builder.codebase.codebase import Codebase
+from image_builder.credentials import login
 from image_builder.docker import Docker
 from image_builder.notify import Notify
+from image_builder.pack import DEFAULT_MAX_PARALLEL_BUILDS
 from image_builder.pack import Pack
+from image_builder.packages import PackagesError
+from image_builder.packages import get_packages_images
+from image_builder.plan import BuildPlan
 from image_builder.progress import Progress
+from image_builder.progress import record_build_duration
+from image_builder.registry import RegistryError
+from image_builder.startup import Startup
+from image_builder.utils.background import run_in_background
 
 
 @click.command("build", help="Build an image.")
@@ -19,99 +30,263 @@ from image_builder.progress import Progress
     "--with-runner-image",
     help="Specify a runner image to be used as the base for your application image.",
 )
-def build(publish, send_notifications, with_runner_image):
-    codebase = Codebase(".")
-    notify = Notify(send_notifications)
+@click.option(
+    "--process-images",
+    is_flag=True,
+    default=False,
+    help="Build a separate image for each process in the Procfile.",
+)
+@click.option(
+    "--max-parallel-builds",
+    type=int,
+    default=DEFAULT_MAX_PARALLEL_BUILDS,
+    show_default=True,
+    help="Maximum number of process images to build at once.",
+)
+@click.option(
+    "--skip-existing/--no-skip-existing",
+    default=True,
+    show_default=True,
+    help="When publishing, only tag an image already built from the same inputs.",
+)
+@click.option(
+    "--report-json",
+    type=click.Path(dir_okay=False),
+    help="Write a JSON report of build timings to this path.",
+)
+@click.option(
+    "--plan",
+    "print_plan",
+    is_flag=True,
+    default=False,
+    help="Print the build plan as JSON and exit without building.",
+)
+def build(
+    publish,
+    send_notifications,
+    with_runner_image,
+    process_images,
+    max_parallel_builds,
+    skip_existing,
+    report_json,
+    print_plan,
+):
+    if print_plan:
+        # Finding prebuilt packages images needs the registry, so leave them out
+        codebase = Codebase(".")
+        click.echo(BuildPlan.from_codebase(codebase, with_runner_image).to_json(2))
+        return
+
     progress = Progress()
     progress.current_phase_running()
-    notify.post_build_progress(progress, codebase.get_notify_attrs())
-    pack = Pack(codebase, notify.reference)
+    notify = Notify(send_notifications, background=True)
+
+    # Everything before pack build only depends on the codebase or the daemon
+    startup = Startup(progress)
+    startup.add("codebase", lambda: Codebase("."))
+    startup.add(
+        "packages",
+        lambda codebase: get_packages_images(codebase, with_runner_image),
+        ["codebase"],
+    )
+    startup.add(
+        "plan",
+        lambda codebase, packages: BuildPlan.from_codebase(
+            codebase, with_runner_image, packages
+        ),
+        ["codebase", "packages"],
+    )
+    startup.add(
+        "pack",
+        lambda codebase, plan: Pack(
+            codebase, progress=progress, skip_existing=skip_existing, plan=plan
+        ),
+        ["codebase", "plan"],
+    )
+    startup.add(
+        "images.resolve",
+        lambda pack, plan: pack.resolve_images(plan.run_image),
+        ["pack", "plan"],
+    )
+    startup.add("docker.start", start_docker)
+    startup.add(
+        "docker.load_builder",
+        lambda pack, started: pack.load_cached_builder(),
+        ["pack", "docker.start"],
+    )
+    startup.add(
+        "docker.login",
+        lambda plan: login(plan.get_registries(publish)),
+        ["plan"],
+    )
+    startup.add(
+        "docker.pull_images",
+        lambda pack, resolved, loaded, logged_in: pack.pull_images(),
+        ["pack", "images.resolve", "docker.load_builder", "docker.login"],
+    )
+    startup.start()
+
+    codebase = None
+    plan = None
     try:
-        if not Docker.running():
-            click.echo("Docker is not running, starting up...")
-            Docker.start()
-        click.echo("Docker is running, continuing with build...")
+        codebase = startup.result("codebase")
+        progress.add_timings("codebase", codebase.timings)
+        plan = startup.result("plan")
+        notify.post_build_progress(progress, plan.get_notify_attrs())
+        pack = startup.result("pack")
+        pack.build_timestamp = notify.reference
 
-        Docker.login(codebase.build.registry)
+        startup.join()
+        progress.critical_path = startup.get_critical_path()
+        click.echo(f"Startup critical path: {' -> '.join(progress.critical_path)}")
 
         click.echo(
             "Found revision: "
-            f"repository={codebase.revision.get_repository_name()}, "
-            f"commit={codebase.revision.commit}, "
-            f"branch={codebase.revision.branch}, "
-            f"tag={codebase.revision.tag}"
+            f"repository={plan.repository_name}, "
+            f"commit={plan.commit}, "
+            f"branch={plan.branch}, "
+            f"tag={plan.tag}"
         )
-        click.echo(f"Using ECR repository: {codebase.build.repository}")
-        if publish and codebase.build.additional_repository:
+        click.echo(f"Using ECR repository: {plan.repository}")
+        if publish and plan.additional_repository:
             click.echo(
-                f"Pushing image to additional ECR repository: {codebase.build.additional_repository}"
+                f"Pushing image to additional ECR repository: {plan.additional_repository}"
             )
-        click.echo(f"Found processes: {[p.name for p in codebase.processes]}")
-        click.echo(f"Found languages: {codebase.languages}")
-        click.echo(
-            f"Using builder: {codebase.build.builder.name}@{codebase.build.builder.version}"
-        )
-        click.echo(f"Using buildpacks: {pack.get_buildpacks()}")
+        click.echo(f"Found processes: {list(plan.processes)}")
+        click.echo(f"Found languages: {plan.get_languages()}")
+        click.echo(f"Using builder: {plan.builder}")
+        click.echo(f"Using buildpacks: {list(plan.buildpacks)}")
+        packages = startup.result("packages")
+        if packages is not None and packages.available:
+            click.echo(f"Using prebuilt packages images: {packages.key}")
 
-        buildpacks = ", ".join(pack.get_buildpacks())
-        processes = ", ".join(p.name for p in pack.codebase.processes)
         notify.post_job_comment(
-            f"Build: {pack.codebase.revision.get_repository_name()}@{pack.codebase.revision.commit} update",
+            f"Build: {plan.repository_name}@{plan.commit} update",
             [
-                f"*GitHub Repository*: {pack.codebase.revision.get_repository_name()}",
-                f"*Commit*: {pack.codebase.revision.commit} "
-                f"*Branch*: {pack.codebase.revision.branch} "
-                f"*Tag*: {pack.codebase.revision.tag}",
-                f"*ECR Image*: {codebase.build.repository}:commit-{pack.codebase.revision.commit}",
-                f"*Processes*: {processes}",
-                f"*Languages*: {pack.codebase.languages}",
-                f"*Builder*: {pack.codebase.build.builder.name}@{pack.codebase.build.builder.version}",
-                f"*Buildpacks*: {buildpacks}",
+                f"*GitHub Repository*: {plan.repository_name}",
+                f"*Commit*: {plan.commit} "
+                f"*Branch*: {plan.branch} "
+                f"*Tag*: {plan.tag}",
+                f"*ECR Image*: {plan.repository}:commit-{plan.commit}",
+                f"*Processes*: {', '.join(plan.processes)}",
+                f"*Languages*: {plan.get_languages()}",
+                f"*Builder*: {plan.builder}",
+                f"*Buildpacks*: {', '.join(plan.buildpacks)}",
             ],
         )
 
-        pack.codebase.setup()
+        with progress.span("codebase.setup"):
+            pack.codebase.setup()
 
-        pack.build(
-            publish,
-            on_building(notify, progress, codebase),
-            on_publishing(notify, progress, codebase),
-            with_runner_image,
-        )
+        # Build the packages images alongside this build so later builds reuse them
+        packages_build = None
+        if publish and packages is not None and not packages.available:
+            click.echo(f"Building packages images for later builds: {packages.key}")
+            packages_build = run_in_background(
+                build_packages_images, packages, progress
+            )
+
+        if process_images:
+            click.echo(
+                "Building process images: "
+                f"{[pack.get_image_repository(p) for p in plan.processes]}"
+            )
+            pack.build_processes(
+                publish,
+                on_building(notify, progress, plan),
+                on_publishing(notify, progress, plan),
+                plan.run_image,
+                max_parallel_builds,
+                on_process_complete(notify, plan),
+            )
+        else:
+            pack.build(
+                publish,
+                on_building(notify, progress, plan),
+                on_publishing(notify, progress, plan),
+                plan.run_image,
+            )
+
+        if packages_build is not None:
+            try:
+                packages_build.result()
+            except (PackagesError, RegistryError) as e:
+                click.echo(f"Could not build packages images: {e}")
 
         progress.current_phase_success()
-        notify.post_build_progress(progress, codebase.get_notify_attrs())
+        notify.post_build_progress(progress, plan.get_notify_attrs())
+
+        # Let a later rebase of this image report the time it saved
+        if publish:
+            try:
+                record_build_duration(
+                    plan.repository, time.time() - progress.start_time
+                )
+            except OSError as e:
+                click.echo(f"Could not record the build duration: {e}")
 
     except (Exception, KeyboardInterrupt) as e:
         reason = "Build was cancelled" if type(e) == KeyboardInterrupt else "Error"
         click.secho(f"{reason}: {str(e)}", fg="red")
         progress.current_phase_failure()
-        notify.post_build_progress(progress, codebase.get_notify_attrs())
-        notify.post_job_comment(
-            f"Build: {pack.codebase.revision.get_repository_name()}@{pack.codebase.revision.commit} cancelled",
-            [f"{reason}: {e.__class__.__name__}", str(e)],
-        )
+        # The codebase or plan may be what failed to load
+        title = "Build: cancelled"
+        if plan is not None:
+            notify.post_build_progress(progress, plan.get_notify_attrs())
+            title = f"Build: {plan.repository_name}@{plan.commit} cancelled"
+        notify.post_job_comment(title, [f"{reason}: {e.__class__.__name__}", str(e)])
         exit(1)
 
     finally:
-        codebase.teardown()
+        if codebase is not None:
+            codebase.teardown()
+        if report_json:
+            progress.write_report(report_json)
 
 
-def on_building(notify, progress, codebase):
+def start_docker():
+    if not Docker.running():
+        click.echo("Docker is not running, starting up...")
+        click.echo(f"Docker started in {round(Docker.start(), 2)} s")
+    click.echo("Docker is running, continuing with build...")
+
+
+def build_packages_images(packages, progress):
+    with progress.span("packages.build"):
+        packages.build()
+
+
+def on_building(notify, progress, plan):
     def on_building_callback():
         progress.current_phase_success()
         progress.set_current_phase("build")
         progress.current_phase_running()
-        notify.post_build_progress(progress, codebase.get_notify_attrs())
+        notify.post_build_progress(progress, plan.get_notify_attrs())
 
     return on_building_callback
 
 
-def on_publishing(notify, progress, codebase):
+def on_publishing(notify, progress, plan):
     def on_publishing_callback():
         progress.current_phase_success()
         progress.set_current_phase("publish")
         progress.current_phase_running()
-        notify.post_build_progress(progress, codebase.get_notify_attrs())
+        notify.post_build_progress(progress, plan.get_notify_attrs())
 
     return on_publishing_callback
+
+
+def on_process_complete(notify, plan):
+    def on_process_complete_callback(result):
+        status = "failed" if result.error else "built"
+        message = (
+            f"*Process*: {result.process} image {status} ({round(result.duration)} s)"
+        )
+        click.echo(message.replace("*", ""))
+        notify.post_job_comment(
+            f"Build: {plan.repository_name}@{plan.commit} "
+            f"{result.process} {status}",
+            [message],
+        )
+
+    return on_process_complete_callback
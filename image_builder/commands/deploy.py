@@ -1,16 +1,32 @@
 import json
 import os
 import subprocess
+import time
 from json import JSONDecodeError
 from pathlib import Path
 
 import click
-import requests
 
 from image_builder.const import ECR_REPO
-from image_builder.docker import Docker
+from image_builder.copilot import DEFAULT_MAX_PARALLEL_DEPLOYS
+from image_builder.copilot import CopilotDeployer
+from image_builder.copilot import CopilotError
+from image_builder.copilot import get_latest_copilot_version
+from image_builder.copilot import install_copilot_binary
+from image_builder.credentials import get_registry_client
+from image_builder.credentials import login
 from image_builder.notify import Notify
 from image_builder.progress import Progress
+from image_builder.registry import RegistryError
+from image_builder.registry import get_image_labels
+from image_builder.registry import split_repository
+from image_builder.utils.background import run_in_background
+
+CLONE_STRATEGY = "DEPLOY_REPOSITORY_CLONE_STRATEGY"
+CLONE_MIRROR_DIR = "DEPLOY_REPOSITORY_MIRROR_DIR"
+CLONE_STRATEGIES = ["full", "shallow", "blobless", "sparse", "mirror"]
+DEFAULT_CLONE_STRATEGY = "full"
+SPARSE_CHECKOUT_DIRECTORY = "copilot"
 
 
 class DeployError(Exception):
@@ -40,21 +56,51 @@ class CannotInstallCopilotDeployError(DeployError):
     default=False,
     help="Send slack notifications.",
 )
-def deploy(send_notifications):
+@click.option(
+    "--report-json",
+    type=click.Path(dir_okay=False),
+    help="Write a JSON report of deploy timings to this path.",
+)
+@click.option(
+    "--max-parallel-deploys",
+    type=int,
+    default=DEFAULT_MAX_PARALLEL_DEPLOYS,
+    show_default=True,
+    help="Maximum number of services to deploy at once.",
+)
+def deploy(send_notifications, report_json, max_parallel_deploys):
+    progress = Progress()
     try:
-        clone_deployment_repository()
-        copilot_version, version_cached = install_copilot()
+        copilot_services = os.getenv("COPILOT_SERVICES", "").split()
+        if not copilot_services:
+            raise MissingConfigurationDeployError(
+                "No services to deploy, set COPILOT_SERVICES"
+            )
+
+        with progress.span("deploy.clone"):
+            clone_deployment_repository()
+        copilot_version = get_copilot_version()
+
+        def install():
+            with progress.span("deploy.install_copilot"):
+                return install_copilot(copilot_version)
+
+        # Fetch copilot while the image and registry are checked
+        copilot_installed = run_in_background(install)
+        copilot_latest = run_in_background(check_copilot_version, copilot_version)
+
         tag = get_image_tag_for_deployment()
         os.environ["IMAGE_TAG"] = tag
 
         repository = get_image_repository_url()
-        Docker.login(repository.split("/")[0])
-        timestamp = get_deployment_reference(repository, tag)
-        notify = Notify(send_notifications)
+        with progress.span("docker.login"):
+            login([repository.split("/")[0]])
+        with progress.span("deploy.reference"):
+            timestamp = get_deployment_reference(repository, tag)
+        notify = Notify(send_notifications, background=True)
         notify.reference = timestamp
 
         copilot_environment = os.getenv("COPILOT_ENVIRONMENT")
-        copilot_services = os.getenv("COPILOT_SERVICES", "").split(" ")
         codebase_repository = os.getenv("CODEBASE_REPOSITORY")
         commit_hash = tag.replace("commit-", "")
 
@@ -64,7 +110,6 @@ def deploy(send_notifications):
             "repository_url": f"https://github.com/{codebase_repository}",
         }
 
-        progress = Progress()
         progress.set_current_phase("deploy")
         progress.current_phase_running()
         notify.post_build_progress(progress, text_blocks)
@@ -77,15 +122,10 @@ def deploy(send_notifications):
             ],
         )
 
-        if not check_copilot_version(copilot_version):
-            notify.post_job_comment(
-                "Warning: A newer version of copilot-cli is available",
-                [
-                    "Warning: A newer version of `copilot-cli` is available. "
-                    "Download the <https://github.com/aws/copilot-cli/releases/latest|latest version> "
-                    "and update the `.copilot-version` file"
-                ],
-            )
+        # Post the result of the latest version check whenever it arrives
+        copilot_latest.add_done_callback(on_copilot_version_checked(notify))
+
+        version_cached = copilot_installed.result()
 
         if not version_cached:
             notify.post_job_comment(
@@ -96,15 +136,20 @@ def deploy(send_notifications):
                 ],
             )
 
-        deploy_command = f"/copilot/./copilot-{copilot_version} deploy --env {copilot_environment} --deploy-env=false --force"
-        for i, service in enumerate(copilot_services):
-            deploy_command += f" --name {service}/{i + 1}"
-
-        result = subprocess.run(
-            deploy_command, stdout=subprocess.PIPE, shell=True, cwd=Path("./deploy")
+        deployer = CopilotDeployer(
+            copilot_version, copilot_environment, progress=progress
         )
+        with progress.span("deploy.copilot"):
+            results = deployer.deploy(
+                copilot_services,
+                max_parallel_deploys,
+                on_service_deployed(
+                    notify, codebase_repository, commit_hash, copilot_environment
+                ),
+            )
 
-        if result.returncode != 0:
+        failed = [r.service for r in results if not r.succeeded]
+        if failed:
             progress.current_phase_failure()
             deploy_status_msg = "failed to deploy to"
         else:
@@ -122,13 +167,48 @@ def deploy(send_notifications):
             True,
         )
 
-        if result.returncode != 0:
-            raise DeployError("Failed to deploy")
+        if failed:
+            raise DeployError(f"Failed to deploy {', '.join(failed)}")
 
     except DeployError as e:
         click.secho(f"{e.__class__.__name__}: {e}", fg="red")
         exit(1)
 
+    finally:
+        if report_json:
+            progress.write_report(report_json)
+
+
+def on_copilot_version_checked(notify):
+    def on_copilot_version_checked_callback(future):
+        if future.exception() is None and future.result() is False:
+            notify.post_job_comment(
+                "Warning: A newer version of copilot-cli is available",
+                [
+                    "Warning: A newer version of `copilot-cli` is available. "
+                    "Download the <https://github.com/aws/copilot-cli/releases/latest|latest version> "
+                    "and update the `.copilot-version` file"
+                ],
+            )
+
+    return on_copilot_version_checked_callback
+
+
+def on_service_deployed(notify, codebase_repository, commit_hash, environment):
+    def on_service_deployed_callback(result):
+        status = "deployed to" if result.succeeded else "failed to deploy to"
+        message = (
+            f"*Service*: {result.service} {status} `{environment}` "
+            f"({round(result.duration)} s)"
+        )
+        click.echo(message.replace("*", "").replace("`", ""))
+        notify.post_job_comment(
+            f"{codebase_repository}@{commit_hash} {result.service} {status} {environment}",
+            [message],
+        )
+
+    return on_service_deployed_callback
+
 
 def get_image_repository_url() -> str:
     account_id = os.getenv("AWS_ACCOUNT_ID")
@@ -145,17 +225,16 @@ def get_image_repository_url() -> str:
 
 
 def get_deployment_reference(repository: str, tag: str) -> str:
-    regctl = subprocess.run(
-        f"regctl image config {repository}:{tag}", stdout=subprocess.PIPE, shell=True
-    )
+    registry, repository_name = split_repository(repository)
 
     image_timestamp = None
     try:
-        image_timestamp = json.loads(regctl.stdout)["config"]["Labels"][
+        client = get_registry_client(registry)
+        image_timestamp = get_image_labels(client, repository_name, tag).get(
             "uk.gov.trade.digital.build.timestamp"
-        ]
-    except (FileNotFoundError, JSONDecodeError, KeyError):
-        pass
+        )
+    except RegistryError as e:
+        click.echo(f"Failed to read image config for {repository}:{tag}: {e}")
 
     if not image_timestamp:
         raise MissingConfigurationDeployError("Image contains no timestamp")
@@ -224,10 +303,48 @@ def clone_deployment_repository():
             "and DEPLOY_REPOSITORY environment variables not set."
         )
 
+    strategy = os.getenv(CLONE_STRATEGY, DEFAULT_CLONE_STRATEGY)
+    if strategy not in CLONE_STRATEGIES:
+        raise CannotCloneDeployRepositoryDeployError(
+            f"Unknown clone strategy {strategy}, expected one of "
+            f"{', '.join(CLONE_STRATEGIES)}"
+        )
+
+    mirror_dir = os.getenv(CLONE_MIRROR_DIR)
+    if strategy == "mirror" and not mirror_dir:
+        click.echo(f"{CLONE_MIRROR_DIR} is not set, using a full clone")
+        strategy = DEFAULT_CLONE_STRATEGY
+
+    url = (
+        f"https://codestar-connections.{region}.amazonaws.com/git-http/{account}/"
+        f"{region}/{codestar_connection_id}/{deploy_repository}.git"
+    )
+
+    if strategy == "mirror":
+        mirror = Path(mirror_dir).joinpath(f"{deploy_repository}.git")
+        if mirror.exists():
+            command = f"git -C {mirror} remote update --prune && "
+        else:
+            command = f"git clone --mirror {url} {mirror} && "
+        # A local clone hard links the mirror's objects rather than copying them
+        command += f"git clone {mirror}{branch_option} deploy"
+    else:
+        clone_options = {
+            "full": "",
+            "shallow": " --depth 1",
+            "blobless": " --filter=blob:none",
+            "sparse": " --depth 1 --filter=blob:none --sparse",
+        }[strategy]
+        command = f"git clone{clone_options} {url}{branch_option} deploy"
+        if strategy == "sparse":
+            command += (
+                f" && git -C deploy sparse-checkout set {SPARSE_CHECKOUT_DIRECTORY}"
+            )
+
     click.echo(f"Cloning repository {deploy_repository}")
+    start_time = time.time()
     proc = subprocess.run(
-        f"git clone https://codestar-connections.{region}.amazonaws.com/git-http/{account}/"
-        f"{region}/{codestar_connection_id}/{deploy_repository}.git{branch_option} deploy",
+        command,
         stdout=subprocess.PIPE,
         shell=True,
     )
@@ -237,10 +354,15 @@ def clone_deployment_repository():
             f"Failed to clone deploy repository: " f"{proc.stderr}"
         )
 
+    duration = time.time() - start_time
+    click.echo(
+        f"Cloned repository {deploy_repository} using a {strategy} clone "
+        f"in {round(duration, 2)} s"
+    )
+    return duration
 
-def install_copilot() -> (str, bool):
-    cached = True
 
+def get_copilot_version() -> str:
     try:
         version = open("deploy/.copilot-version").read().rstrip("\n")
     except FileNotFoundError:
@@ -249,6 +371,12 @@ def install_copilot() -> (str, bool):
         )
 
     click.echo(f"Using copilot version {version}")
+    return version
+
+
+def install_copilot(version: str) -> bool:
+    cached = True
+
     proc = subprocess.run(
         f"/copilot/./copilot-{version} --version",
         stdout=subprocess.PIPE,
@@ -260,23 +388,18 @@ def install_copilot() -> (str, bool):
         click.echo(f"Copilot version {version} not pre-installed, installing now")
         cached = False
 
-        proc = subprocess.run(
-            f"wget -q -O copilot-{version} https://ecs-cli-v2-release.s3.amazonaws.com/copilot-linux-v{version} && "
-            f"chmod +x ./copilot-{version} && mv copilot-{version} /copilot",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=True,
-        )
-
-        if proc.returncode != 0:
+        try:
+            install_copilot_binary(version)
+        except (CopilotError, OSError) as e:
             raise CannotInstallCopilotDeployError(
-                f"Failed to install copilot version {version}: " f"{proc.stderr}"
+                f"Failed to install copilot version {version}: {e}"
             )
 
-    return version, cached
+    return cached
 
 
-def check_copilot_version(version):
-    response = requests.get("https://github.com/aws/copilot-cli/releases/latest")
-    release_version = response.url.split("/").pop().replace("v", "")
+def check_copilot_version(version) -> bool | None:
+    release_version = get_latest_copilot_version()
+    if release_version is None:
+        return None
     return release_version == version
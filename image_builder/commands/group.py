@@ -0,0 +1,46 @@
+import importlib
+
+import click
+
+
+class LazyCommand:
+    import_path: str
+    help: str
+
+    def __init__(self, import_path: str, help: str):
+        self.import_path = import_path
+        self.help = help
+
+    def load(self) -> click.Command:
+        module_name, _, attribute = self.import_path.partition(":")
+        return getattr(importlib.import_module(module_name), attribute)
+
+
+class LazyGroup(click.Group):
+    # Commands are only imported when invoked so `--help` doesn't load boto3 etc.
+    lazy_commands: dict
+
+    def __init__(self, *args, lazy_commands: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            self.add_command(self.lazy_commands[name].load(), name)
+
+        return super().get_command(ctx, name)
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                rows.append((name, self.commands[name].get_short_help_str()))
+            else:
+                rows.append((name, self.lazy_commands[name].help))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
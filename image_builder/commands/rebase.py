@@ -0,0 +1,147 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+
+from image_builder.codebase.codebase import Codebase
+from image_builder.credentials import login
+from image_builder.docker import Docker
+from image_builder.pack import DEFAULT_MAX_PARALLEL_BUILDS
+from image_builder.pack import Pack
+from image_builder.pack import PackError
+from image_builder.packages import get_packages_images
+from image_builder.plan import BuildPlan
+from image_builder.progress import get_build_duration
+from image_builder.startup import Startup
+
+
+@click.command("rebase", help="Rebase an image onto the latest run image.")
+@click.option(
+    "--with-runner-image",
+    help="Specify a runner image to rebase onto instead of the builder's.",
+)
+@click.option(
+    "--process-images",
+    is_flag=True,
+    default=False,
+    help="Rebase the separate image for each process in the Procfile.",
+)
+@click.option(
+    "--max-parallel-rebases",
+    type=int,
+    default=DEFAULT_MAX_PARALLEL_BUILDS,
+    show_default=True,
+    help="Maximum number of process images to rebase at once.",
+)
+@click.option(
+    "--build-report",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON report from a full build to compare the rebase against.",
+)
+def rebase(with_runner_image, process_images, max_parallel_rebases, build_report):
+    start_time = time.time()
+
+    # pack rebase only touches the registry so docker is only started to build
+    # packages images
+    startup = Startup()
+    startup.add("codebase", lambda: Codebase("."))
+    # Keep images built on a packages run image on one with the same packages
+    startup.add(
+        "packages",
+        lambda codebase: get_rebase_packages_images(codebase, with_runner_image),
+        ["codebase"],
+    )
+    startup.add(
+        "plan",
+        lambda codebase, packages: BuildPlan.from_codebase(
+            codebase, with_runner_image, packages
+        ),
+        ["codebase", "packages"],
+    )
+    startup.add(
+        "pack", lambda codebase, plan: Pack(codebase, plan=plan), ["codebase", "plan"]
+    )
+    startup.add(
+        "images.resolve",
+        lambda pack, plan: pack.resolve_images(plan.run_image),
+        ["pack", "plan"],
+    )
+    startup.add(
+        "images.run_image_top_layer",
+        lambda pack, resolved: pack.get_run_image_top_layer(),
+        ["pack", "images.resolve"],
+    )
+    startup.add("docker.login", lambda plan: login(plan.get_registries(True)), ["plan"])
+    startup.start()
+
+    try:
+        results = startup.join()
+    except Exception as e:
+        click.secho(f"Error: {e}", fg="red")
+        exit(1)
+
+    plan = results["plan"]
+    pack = results["pack"]
+    run_image_top_layer = results["images.run_image_top_layer"]
+    processes = list(plan.processes) if process_images else [None]
+    if not processes:
+        click.secho("Error: No processes found in the Procfile to rebase", fg="red")
+        exit(1)
+
+    def rebase_image(process):
+        try:
+            return pack.rebase(process, run_image_top_layer), None
+        except PackError as e:
+            return False, f"{process or plan.repository}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max_parallel_rebases) as executor:
+        rebased = list(executor.map(rebase_image, processes))
+
+    errors = [error for _, error in rebased if error is not None]
+    if errors:
+        click.secho("Error: " + "\n".join(errors), fg="red")
+        exit(1)
+
+    duration = time.time() - start_time
+    count = len([r for r, _ in rebased if r])
+    click.echo(f"Rebased {count} of {len(rebased)} images in {round(duration, 2)} s")
+
+    if build_report:
+        build_duration = json.loads(Path(build_report).read_text())["duration"]
+        click.echo(
+            f"Saved {round(build_duration - duration, 2)} s compared to the full "
+            f"build in {build_report} ({round(build_duration, 2)} s)"
+        )
+        return
+
+    # Otherwise estimate against the last published build on this host
+    build_duration = get_build_duration(plan.repository)
+    if build_duration is None:
+        click.echo(
+            f"No full build of {plan.repository} recorded, pass --build-report "
+            "to report the time saved"
+        )
+    else:
+        click.echo(
+            f"Saved an estimated {round(build_duration - duration, 2)} s compared "
+            f"to the last full build of {plan.repository} "
+            f"({round(build_duration, 2)} s)"
+        )
+
+
+def get_rebase_packages_images(codebase, run_image):
+    packages = get_packages_images(codebase, run_image)
+    if packages is None or packages.available:
+        return packages
+
+    # Rebasing onto the plain run image would drop the packages, and the old
+    # packages run image would not pick up the patches being rebased onto
+    click.echo(f"Building packages images for the latest run image: {packages.key}")
+    login([codebase.build.registry])
+    if not Docker.running():
+        click.echo(f"Docker started in {round(Docker.start(), 2)} s")
+    packages.build()
+    packages.available = True
+    return packages
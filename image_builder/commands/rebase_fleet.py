@@ -0,0 +1,175 @@
+import time
+
+import click
+
+from image_builder.credentials import login
+from image_builder.fleet import DEFAULT_FLEET_STATE
+from image_builder.fleet import DEFAULT_MAX_PARALLEL_REBASES
+from image_builder.fleet import DEFAULT_MAX_REBASES_PER_REGISTRY
+from image_builder.fleet import DEFAULT_REGISTRY_INTERVAL
+from image_builder.fleet import FAILED
+from image_builder.fleet import REBASED
+from image_builder.fleet import SKIPPED
+from image_builder.fleet import FleetError
+from image_builder.fleet import FleetRebaser
+from image_builder.fleet import RegistryRateLimiter
+from image_builder.fleet import load_fleet_manifest
+from image_builder.notify import Notify
+from image_builder.progress import Progress
+from image_builder.registry import has_registry_credentials
+
+
+@click.command("rebase-fleet", help="Rebase every image in a manifest.")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--run-image",
+    help="The run image to rebase onto, overriding the manifest's run_image.",
+)
+@click.option(
+    "--max-parallel-rebases",
+    type=int,
+    default=DEFAULT_MAX_PARALLEL_REBASES,
+    show_default=True,
+    help="Maximum number of images to rebase at once.",
+)
+@click.option(
+    "--max-per-registry",
+    type=int,
+    default=DEFAULT_MAX_REBASES_PER_REGISTRY,
+    show_default=True,
+    help="Maximum number of images to rebase at once in a single registry.",
+)
+@click.option(
+    "--registry-interval",
+    type=float,
+    default=DEFAULT_REGISTRY_INTERVAL,
+    show_default=True,
+    help="Minimum seconds between starting rebases in a single registry.",
+)
+@click.option(
+    "--state",
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_FLEET_STATE,
+    show_default=True,
+    help="File recording progress so an interrupted run can be resumed.",
+)
+@click.option(
+    "--send-notifications",
+    is_flag=True,
+    default=False,
+    help="Send slack notifications.",
+)
+@click.option(
+    "--report-json",
+    type=click.Path(dir_okay=False),
+    help="Write a JSON report of rebase timings to this path.",
+)
+def rebase_fleet(
+    manifest,
+    run_image,
+    max_parallel_rebases,
+    max_per_registry,
+    registry_interval,
+    state,
+    send_notifications,
+    report_json,
+):
+    start_time = time.time()
+    progress = Progress()
+    progress.set_current_phase("publish")
+    progress.current_phase_running()
+
+    try:
+        manifest_run_image, images = load_fleet_manifest(manifest)
+    except FleetError as e:
+        click.secho(f"Error: {e}", fg="red")
+        exit(1)
+
+    run_image = run_image or manifest_run_image
+    if not run_image:
+        click.secho(
+            "Error: a run image must be set in the manifest or with --run-image",
+            fg="red",
+        )
+        exit(1)
+
+    notify = Notify(send_notifications, background=True)
+    notify.start_thread(
+        f"Rebasing {len(images)} images onto {run_image}",
+        [
+            f"*Rebasing*: {len(images)} images onto `{run_image}`",
+            f"<{notify.get_build_url()}|Build Logs>",
+        ],
+    )
+
+    registries = sorted({image.registry for image in images})
+    with progress.span("docker.login"):
+        logged_in = login(registries)
+
+    # login reports registries it couldn't get credentials for rather than raising
+    missing = [
+        registry
+        for registry in registries
+        if has_registry_credentials(registry) and registry not in logged_in
+    ]
+    if missing:
+        summary = f"Failed to log in to {', '.join(missing)}"
+        click.secho(f"Error: {summary}", fg="red")
+        progress.current_phase_failure()
+        notify.post_job_comment(
+            f"Rebasing {len(images)} images failed",
+            [summary],
+            send_to_main_channel=True,
+        )
+        if report_json:
+            progress.write_report(report_json)
+        exit(1)
+
+    rebaser = FleetRebaser(
+        run_image,
+        state,
+        RegistryRateLimiter(max_per_registry, registry_interval),
+        max_parallel_rebases,
+        progress,
+    )
+    results = rebaser.rebase(images, on_image_rebased(notify))
+
+    counts = {
+        status: len([r for r in results if r.status == status])
+        for status in [REBASED, SKIPPED, FAILED]
+    }
+    already_done = len(images) - len(results)
+    summary = (
+        f"Rebased {counts[REBASED]}, skipped {counts[SKIPPED]} and failed "
+        f"{counts[FAILED]} of {len(images)} images"
+        f"{f' ({already_done} already done)' if already_done else ''} in "
+        f"{round(time.time() - start_time, 2)} s"
+    )
+    click.echo(summary)
+
+    if counts[FAILED]:
+        progress.current_phase_failure()
+    else:
+        progress.current_phase_success()
+    notify.post_job_comment(
+        f"Rebasing {len(images)} images complete", [summary], send_to_main_channel=True
+    )
+
+    if report_json:
+        progress.write_report(report_json)
+
+    if counts[FAILED]:
+        exit(1)
+
+
+def on_image_rebased(notify):
+    def on_image_rebased_callback(result):
+        message = (
+            f"*Image*: {result.image.key} {result.status} ({round(result.duration)} s)"
+        )
+        if result.error:
+            message += f": {result.error}"
+        click.echo(message.replace("*", ""))
+        notify.post_job_comment(f"{result.image.key} {result.status}", [message])
+
+    return on_image_rebased_callback
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from image_builder.configuration.builder import load_builder_configuration
+from image_builder.docker import Docker
+from image_builder.docker import save_to_oci_layout
+from image_builder.images import DEFAULT_MAX_PARALLEL_PULLS
+from image_builder.images import ImageReference
+from image_builder.images import pull_images
+from image_builder.images import resolve_builder_images
+from image_builder.registry import RegistryError
+
+
+@click.command("warm-up", help="Pull the supported builder and run images.")
+@click.option(
+    "--max-parallel-pulls",
+    type=int,
+    default=DEFAULT_MAX_PARALLEL_PULLS,
+    show_default=True,
+    help="Maximum number of images to pull at once.",
+)
+@click.option(
+    "--latest-versions",
+    type=int,
+    help="Only use the latest versions of each builder.",
+)
+@click.option(
+    "--oci-layout",
+    type=click.Path(file_okay=False),
+    help="Save the builders to an OCI image layout instead of pulling them.",
+)
+def warm_up(max_parallel_pulls, latest_versions, oci_layout):
+    builders = load_builder_configuration().get_supported_builders(latest_versions)
+
+    if oci_layout:
+        click.echo(f"Saving builders to {oci_layout}: {builders}")
+        # Versions of a builder share a layout directory and its index.json, so
+        # only copy different builders at the same time
+        groups = {}
+        for builder in builders:
+            groups.setdefault(ImageReference(builder).name, []).append(builder)
+
+        def save(group):
+            for builder in group:
+                save_to_oci_layout(builder, oci_layout)
+
+        with ThreadPoolExecutor(max_workers=max_parallel_pulls) as executor:
+            list(executor.map(save, groups.values()))
+        return
+
+    if not Docker.running():
+        click.echo("Docker is not running, starting up...")
+        click.echo(f"Docker started in {round(Docker.start(), 2)} s")
+
+    def resolve(builder):
+        try:
+            return list(resolve_builder_images(builder))
+        except RegistryError as e:
+            click.echo(f"Could not resolve {builder}, pulling by tag: {e}")
+            return [builder]
+
+    with ThreadPoolExecutor() as executor:
+        images = [
+            image
+            for resolved in executor.map(resolve, builders)
+            for image in resolved
+            if image is not None
+        ]
+
+    click.echo(f"Pulling images: {images}")
+    failed = pull_images(images, max_parallel_pulls)
+    if failed:
+        click.secho(f"Error: failed to pull {', '.join(failed)}", fg="red")
+        exit(1)
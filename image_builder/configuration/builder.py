@@ -2,9 +2,8 @@ from enum import Enum
 from pathlib import Path
 from typing import List
 
-from yaml import safe_load as yaml_load
-
 from image_builder.configuration.codebase import CodebaseConfiguration
+from image_builder.utils.yaml_loader import yaml_load
 
 
 class BuilderError(Exception):
@@ -72,6 +71,19 @@ class BuilderConfiguration:
             f"not supported."
         )
 
+    def get_supported_builders(self, latest_versions: int = None) -> List[str]:
+        # Versions are listed newest first
+        supported = []
+        for builder in self.builders:
+            versions = [
+                f"{builder.name}:{version.version}"
+                for version in builder.versions
+                if not builder.deprecated and not version.deprecated
+            ]
+            supported += versions[:latest_versions]
+
+        return supported
+
 
 def load_builder_configuration(path: Path = None) -> BuilderConfiguration:
     if not path:
@@ -2,12 +2,11 @@ import os
 from pathlib import Path
 from typing import List
 
-from yaml import safe_load as yaml_load
-
 from image_builder.const import ADDITIONAL_ECR_REPO
 from image_builder.const import ECR_REPO
 from image_builder.const import PUBLIC_REGISTRY
 from image_builder.utils.arn_parser import ARN
+from image_builder.utils.yaml_loader import yaml_load
 
 
 class Builder:
@@ -19,17 +18,33 @@ class Buildpack:
     name: str
 
 
+CACHE_TYPES = ["registry", "volume", "bind"]
+
+
+class Cache:
+    type: str
+    name: str | None
+    path: str | None
+
+    def __init__(self, type: str = "registry", name: str = None, path: str = None):
+        self.type = type
+        self.name = name
+        self.path = path
+
+
 class CodebaseConfiguration:
     builder: Builder
     packs: List[Buildpack]
     registry: str
     repository_from_config_file: str
     packages: List[str]
+    cache: Cache
 
     def __init__(self):
         self.builder = Builder()
         self.packs = []
         self.packages = []
+        self.cache = Cache()
         self.repository_from_config_file = ""
         self.additional_repository_from_config_file = None
 
@@ -130,8 +145,32 @@ def load_codebase_configuration(path) -> CodebaseConfiguration:
         if "packages" in config:
             build.packages = config["packages"]
 
+        if "cache" in config:
+            build.cache = load_cache_configuration(config["cache"])
+
         return build
     except FileNotFoundError as error:
         raise CodebaseConfigurationLoadError(f"file {error.filename} does not exist")
     except TypeError:
         raise CodebaseConfigurationLoadError(f"file is not valid")
+
+
+def load_cache_configuration(config) -> Cache:
+    if not isinstance(config, dict):
+        raise CodebaseConfigurationLoadError(
+            "cache must be a mapping with a type and a name or path"
+        )
+
+    cache = Cache(
+        config.get("type", "registry"), config.get("name"), config.get("path")
+    )
+
+    if cache.type not in CACHE_TYPES:
+        raise CodebaseConfigurationLoadError(
+            f"cache type {cache.type} is not one of {', '.join(CACHE_TYPES)}"
+        )
+
+    if cache.type == "bind" and not cache.path:
+        raise CodebaseConfigurationLoadError("cache path must be set for bind caches")
+
+    return cache
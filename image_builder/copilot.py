@@ -0,0 +1,293 @@
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import requests
+
+from image_builder.progress import Progress
+from image_builder.utils.output_reader import OutputReader
+
+DEFAULT_MAX_PARALLEL_DEPLOYS = 1
+COPILOT_DIR = "/copilot"
+COPILOT_CACHE_DIR = "COPILOT_CACHE_DIR"
+COPILOT_RELEASE_URL = (
+    "https://ecs-cli-v2-release.s3.amazonaws.com/copilot-linux-v{version}"
+)
+COPILOT_DOWNLOAD_TIMEOUT = 60
+COPILOT_LATEST_RELEASE_URL = "https://github.com/aws/copilot-cli/releases/latest"
+COPILOT_LATEST_RELEASE_TIMEOUT = 5
+COPILOT_LATEST_RELEASE_TTL = "COPILOT_LATEST_RELEASE_TTL"
+DEFAULT_LATEST_RELEASE_TTL = 6 * 60 * 60
+COPILOT_CHUNK_SIZE = 1024 * 1024
+
+
+class CopilotError(Exception):
+    pass
+
+
+class CopilotDownloadError(CopilotError):
+    pass
+
+
+class CopilotChecksumError(CopilotError):
+    pass
+
+
+class ServiceDeployResult:
+    service: str
+    duration: float
+    returncode: int
+
+    def __init__(self, service: str, duration: float, returncode: int):
+        self.service = service
+        self.duration = duration
+        self.returncode = returncode
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0
+
+
+class CopilotDeployer:
+    version: str
+    environment: str
+    path: Path
+    progress: Progress | None
+
+    def __init__(
+        self,
+        version: str,
+        environment: str,
+        path: Path = None,
+        progress: Progress = None,
+    ):
+        self.version = version
+        self.environment = environment
+        self.path = path or Path("./deploy")
+        self.progress = progress
+
+    def get_command(self, service: str, order: int) -> str:
+        return (
+            f"/copilot/./copilot-{self.version} deploy --env {self.environment} "
+            f"--deploy-env=false --force --name {service}/{order}"
+        )
+
+    def deploy_service(self, service: str, order: int = 1) -> ServiceDeployResult:
+        start_time = time.time()
+        with self._span(f"deploy.copilot.{service}"):
+            proc = subprocess.Popen(
+                self.get_command(service, order),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                shell=True,
+                cwd=self.path,
+            )
+            OutputReader(proc, prefix=f"[{service}] ").read()
+
+        return ServiceDeployResult(service, time.time() - start_time, proc.returncode)
+
+    def deploy(
+        self,
+        services: list,
+        max_workers: int = DEFAULT_MAX_PARALLEL_DEPLOYS,
+        on_service_complete: Callable = None,
+    ) -> list:
+        def deploy_service(service, order):
+            result = self.deploy_service(service, order)
+            if on_service_complete is not None:
+                on_service_complete(result)
+            return result
+
+        # Keep the service/N order copilot deploys in, one at a time by default
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(deploy_service, services, range(1, len(services) + 1))
+            )
+
+    def _span(self, name: str):
+        if self.progress is None:
+            return contextlib.nullcontext()
+        return self.progress.span(name)
+
+
+class CopilotBinaryCache:
+    path: Path
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def get(self, version: str) -> Path | None:
+        try:
+            digest = self._version_path(version).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+        binary = self._binary_path(digest)
+        if not binary.exists() or get_sha256(binary) != digest:
+            return None
+
+        return binary
+
+    def add(self, version: str, binary: Path, digest: str) -> Path:
+        cached = self._binary_path(digest)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(binary, cached)
+        cached.chmod(0o755)
+
+        # Write then rename so deploys sharing the host never see a partial entry
+        self._version_path(version).parent.mkdir(parents=True, exist_ok=True)
+        handle, temporary_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, "w") as temporary_file:
+            temporary_file.write(digest)
+        os.replace(temporary_path, self._version_path(version))
+        return cached
+
+    def get_latest_release(self, ttl: int) -> tuple[str | None, bool]:
+        try:
+            entry = json.loads(self._latest_release_path().read_text())
+            return entry["version"], time.time() - entry["fetched_at"] < ttl
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            # Treat a malformed entry as a miss so it is fetched again
+            return None, False
+
+    def set_latest_release(self, version: str):
+        self.path.mkdir(parents=True, exist_ok=True)
+        handle, temporary_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, "w") as temporary_file:
+            temporary_file.write(
+                json.dumps({"fetched_at": time.time(), "version": version})
+            )
+        os.replace(temporary_path, self._latest_release_path())
+
+    def _latest_release_path(self) -> Path:
+        return self.path.joinpath("latest_release.json")
+
+    def _version_path(self, version: str) -> Path:
+        return self.path.joinpath("versions", version)
+
+    def _binary_path(self, digest: str) -> Path:
+        return self.path.joinpath("sha256", digest)
+
+
+def get_binary_cache() -> CopilotBinaryCache:
+    return CopilotBinaryCache(
+        os.getenv(COPILOT_CACHE_DIR) or Path(COPILOT_DIR).joinpath("cache")
+    )
+
+
+def get_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(COPILOT_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_published_sha256(version: str) -> str | None:
+    try:
+        response = requests.get(
+            f"{COPILOT_RELEASE_URL.format(version=version)}.sha256",
+            timeout=COPILOT_DOWNLOAD_TIMEOUT,
+        )
+    except requests.RequestException:
+        return None
+
+    if response.status_code != 200 or not response.text.strip():
+        return None
+    return response.text.split()[0].lower()
+
+
+def download_copilot(version: str, directory: Path) -> tuple[Path, str]:
+    directory.mkdir(parents=True, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(dir=directory)
+    sha256 = hashlib.sha256()
+    try:
+        with os.fdopen(handle, "wb") as binary, requests.get(
+            COPILOT_RELEASE_URL.format(version=version),
+            stream=True,
+            timeout=COPILOT_DOWNLOAD_TIMEOUT,
+        ) as response:
+            if response.status_code != 200:
+                raise CopilotDownloadError(
+                    f"Download failed with {response.status_code}"
+                )
+            for chunk in response.iter_content(COPILOT_CHUNK_SIZE):
+                sha256.update(chunk)
+                binary.write(chunk)
+    except requests.RequestException as e:
+        os.remove(temporary_path)
+        raise CopilotDownloadError(f"Download failed: {e}")
+    except CopilotError:
+        os.remove(temporary_path)
+        raise
+
+    return Path(temporary_path), sha256.hexdigest()
+
+
+def install_copilot_binary(
+    version: str,
+    cache: CopilotBinaryCache = None,
+    install_dir: str | Path = COPILOT_DIR,
+) -> Path:
+    cache = cache or get_binary_cache()
+    binary = cache.get(version)
+
+    if binary is None:
+        published_sha256 = get_published_sha256(version)
+        downloaded, digest = download_copilot(version, cache.path)
+        if published_sha256 is None:
+            print(f"No published checksum for copilot {version}, caching {digest}")
+        elif published_sha256 != digest:
+            os.remove(downloaded)
+            raise CopilotChecksumError(
+                f"Checksum {digest} does not match published checksum {published_sha256}"
+            )
+        binary = cache.add(version, downloaded, digest)
+    else:
+        print(f"Using cached copilot {version} from {binary}")
+
+    installed = Path(install_dir).joinpath(f"copilot-{version}")
+    installed.unlink(missing_ok=True)
+    installed.symlink_to(binary)
+    return installed
+
+
+def fetch_latest_copilot_version() -> str:
+    # The latest release page redirects to the release's tag
+    response = requests.head(
+        COPILOT_LATEST_RELEASE_URL,
+        allow_redirects=True,
+        timeout=COPILOT_LATEST_RELEASE_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.url.split("/").pop().replace("v", "")
+
+
+def get_latest_copilot_version(cache: CopilotBinaryCache = None) -> str | None:
+    cache = cache or get_binary_cache()
+    try:
+        ttl = int(os.getenv(COPILOT_LATEST_RELEASE_TTL, DEFAULT_LATEST_RELEASE_TTL))
+    except ValueError:
+        ttl = DEFAULT_LATEST_RELEASE_TTL
+    cached_version, fresh = cache.get_latest_release(ttl)
+    if fresh:
+        return cached_version
+
+    try:
+        version = fetch_latest_copilot_version()
+    except requests.RequestException as e:
+        print(f"Failed to check the latest copilot version: {e}")
+        return cached_version
+
+    try:
+        cache.set_latest_release(version)
+    except OSError:
+        pass
+    return version
@@ -0,0 +1,145 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+import botocore
+
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
+from image_builder.registry import get_registry_credentials
+from image_builder.utils.background import run_in_background
+
+DOCKER_HUB_REGISTRY = "https://index.docker.io/v1/"
+DOCKER_HUB_CREDENTIALS_PARAMETER = "/codebuild/docker_hub_credentials"
+
+
+class CredentialManager:
+    def __init__(self):
+        self._credentials = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, registry: str, ssm_client=None) -> tuple | None:
+        with self._lock:
+            if registry in self._credentials:
+                return self._credentials[registry]
+
+        if registry == DOCKER_HUB_REGISTRY:
+            credentials = get_docker_hub_credentials(ssm_client)
+        else:
+            credentials = get_registry_credentials(registry)
+
+        with self._lock:
+            self._credentials[registry] = credentials
+        return credentials
+
+    def get_client(
+        self, registry: str, credentials_registry: str = None
+    ) -> RegistryClient:
+        with self._lock:
+            if registry in self._clients:
+                return self._clients[registry]
+
+        # Share one client, and so its session and tokens, per registry
+        client = RegistryClient(registry, self.get(credentials_registry or registry))
+        with self._lock:
+            return self._clients.setdefault(registry, client)
+
+    def fetch(self, registries: list, ssm_client=None) -> dict:
+        def fetch_registry(registry):
+            try:
+                return registry, self.get(registry, ssm_client)
+            except RegistryError as e:
+                print(f"Failed to get credentials for {registry}", e)
+                return registry, None
+
+        with ThreadPoolExecutor(max_workers=len(registries) or 1) as executor:
+            return {
+                registry: credentials
+                for registry, credentials in executor.map(fetch_registry, registries)
+                if credentials is not None
+            }
+
+    def login(self, registries: list, ssm_client=None) -> list:
+        # Are we running in codebuild?
+        if os.environ.get("CODESTAR_CONNECTION_ARN"):
+            registries = [DOCKER_HUB_REGISTRY] + registries
+
+        credentials = self.fetch(list(dict.fromkeys(registries)), ssm_client)
+        write_docker_config(credentials)
+        for registry in credentials:
+            print(f"Logged into {registry}")
+        return list(credentials)
+
+    def login_in_background(self, registries: list, ssm_client=None) -> Future:
+        return run_in_background(self.login, registries, ssm_client)
+
+
+def get_docker_hub_credentials(ssm_client=None) -> tuple | None:
+    try:
+        if not ssm_client:
+            ssm_client = boto3.client("ssm")
+
+        response = ssm_client.get_parameter(
+            Name=DOCKER_HUB_CREDENTIALS_PARAMETER, WithDecryption=True
+        )
+    except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+        raise RegistryError(f"Failed to get credentials for docker hub: {e}")
+
+    credentials = json.loads(response["Parameter"]["Value"])
+    return credentials["username"], credentials["password"]
+
+
+def get_docker_config_path() -> Path:
+    return Path(
+        os.environ.get("DOCKER_CONFIG", Path.home().joinpath(".docker"))
+    ).joinpath("config.json")
+
+
+def write_docker_config(credentials: dict):
+    if not credentials:
+        return
+
+    path = get_docker_config_path()
+    try:
+        config = json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        config = {}
+
+    auths = config.setdefault("auths", {})
+    for registry, (username, password) in credentials.items():
+        auth = base64.b64encode(f"{username}:{password}".encode()).decode()
+        auths[registry] = {"auth": auth}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(handle, "w") as temporary_file:
+        temporary_file.write(json.dumps(config, indent=2))
+    os.replace(temporary_path, path)
+
+
+credential_manager = CredentialManager()
+
+
+def get_credentials(registry: str) -> tuple | None:
+    return credential_manager.get(registry)
+
+
+def get_registry_client(
+    registry: str, credentials_registry: str = None
+) -> RegistryClient:
+    return credential_manager.get_client(registry, credentials_registry)
+
+
+def login(registries: list) -> list:
+    return credential_manager.login(registries)
+
+
+def login_in_background(registries: list) -> Future:
+    return credential_manager.login_in_background(registries)
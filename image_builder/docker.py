@@ -1,12 +1,20 @@
 import json
 import os
+import socket
 import subprocess
 import time
+from pathlib import Path
 
-import boto3
-import botocore
+from image_builder.images import ImageReference
 
-from image_builder.const import PUBLIC_REGISTRY
+DOCKER_SOCKET = "/var/run/docker.sock"
+DOCKERD = "/usr/local/bin/dockerd"
+DOCKER_START_TIMEOUT = 60
+DOCKER_PING_TIMEOUT = 1
+DOCKER_PING_INITIAL_DELAY = 0.01
+DOCKER_PING_MAX_DELAY = 1
+OCI_LAYOUT_CACHE = "/builder_cache"
+OCI_REF_NAME_ANNOTATION = "org.opencontainers.image.ref.name"
 
 
 class DockerError(Exception):
@@ -22,69 +30,138 @@ class DockerNotInstalledError(DockerError):
 
 
 class Docker:
+    startup_time: float | None = None
+
     @staticmethod
-    def start():
+    def start() -> float:
+        start_time = time.time()
         if not Docker.running():
+            if not Path(DOCKERD).exists():
+                raise DockerNotInstalledError()
             subprocess.Popen(
-                "nohup /usr/local/bin/dockerd --host=unix:///var/run/docker.sock "
+                f"nohup {DOCKERD} --host=unix://{DOCKER_SOCKET} "
                 "--host=tcp://127.0.0.1:2375 --storage-driver=overlay2",
                 shell=True,
             )
+            Docker.wait_until_ready()
+
+        Docker.startup_time = time.time() - start_time
+        return Docker.startup_time
 
-        counter = 0
-        while not Docker.running():
-            counter += 1
-            if counter > 60:
+    @staticmethod
+    def wait_until_ready(timeout: float = DOCKER_START_TIMEOUT):
+        waited = 0
+        delay = DOCKER_PING_INITIAL_DELAY
+        while not Docker.ping():
+            if waited >= timeout:
                 raise DockerStartTimeoutError()
-            time.sleep(1)
+            time.sleep(delay)
+            waited += delay
+            delay = min(delay * 2, DOCKER_PING_MAX_DELAY)
 
     @staticmethod
-    def login(registry, ssm_client=None):
-        # Are we running in codebuild?
-        if os.environ.get("CODESTAR_CONNECTION_ARN"):
-            print("Logging into Docker Hub")
-
-            try:
-                if not ssm_client:
-                    ssm_client = boto3.client("ssm")
-
-                response = ssm_client.get_parameter(
-                    Name="/codebuild/docker_hub_credentials", WithDecryption=True
-                )
-                credentials = json.loads(response["Parameter"]["Value"])
-
-                subprocess.run(
-                    f"docker login --username {credentials['username']} --password {credentials['password']}",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                )
-            except botocore.exceptions.ClientError as e:
-                print("Failed to get credentials to login to docker hub", e)
-            except (
-                botocore.exceptions.NoCredentialsError,
-                botocore.exceptions.SSOError,
-                botocore.exceptions.NoRegionError,
-            ) as e:
-                print(
-                    "Failed to authenticate with AWS to retrieve credentials for docker hub",
-                    e,
-                )
-
-        if registry == PUBLIC_REGISTRY:
-            command = f"aws ecr-public get-login-password --region us-east-1 | docker login --username AWS --password-stdin {registry}"
-        else:
-            command = f"aws ecr get-login-password --region {registry.split('.')[3]} | docker login --username AWS --password-stdin {registry}"
-
-        print(f"Running command: {command}")
-        subprocess.run(
-            f"{command}",
-            stdout=subprocess.PIPE,
-            shell=True,
-        )
+    def ping(socket_path: str = DOCKER_SOCKET) -> bool:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(DOCKER_PING_TIMEOUT)
+                connection.connect(socket_path)
+                connection.sendall(b"GET /_ping HTTP/1.0\r\nHost: docker\r\n\r\n")
+                status_line = connection.makefile("rb").readline()
+        except OSError:
+            return False
+
+        return status_line.split(b" ")[1:2] == [b"200"]
 
     @staticmethod
     def running() -> bool:
-        result = subprocess.run("docker ps", stdout=subprocess.PIPE, shell=True)
-        if result.returncode == 127:
-            raise DockerNotInstalledError()
+        socket_path = get_docker_socket()
+        if socket_path is not None:
+            return Docker.ping(socket_path)
+
+        # Other DOCKER_HOST schemes, such as tcp:// or ssh://, need the docker CLI
+        result = subprocess.run(
+            "docker ps", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
+        )
         return result.returncode == 0
+
+    @staticmethod
+    def load_cached_image(image: str, layout: str = OCI_LAYOUT_CACHE) -> bool:
+        reference = get_cached_image_reference(image, layout)
+        if reference is None:
+            print(f"Builder cache miss: {image}")
+            return False
+
+        start_time = time.time()
+        export = subprocess.Popen(
+            ["regctl", "image", "export", "--name", image, reference],
+            stdout=subprocess.PIPE,
+        )
+        result = subprocess.run(
+            ["docker", "load"],
+            stdin=export.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        export.stdout.close()
+        if export.wait() != 0 or result.returncode != 0:
+            print(f"Builder cache miss: {image} could not be loaded: {result.stderr}")
+            return False
+
+        print(
+            f"Builder cache hit: {image} loaded in {round(time.time() - start_time, 2)} s"
+        )
+        return True
+
+
+def get_docker_socket() -> str | None:
+    docker_host = os.getenv("DOCKER_HOST")
+    if not docker_host:
+        return DOCKER_SOCKET
+    if docker_host.startswith("unix://"):
+        return docker_host.removeprefix("unix://")
+    return None
+
+
+def get_oci_layout_reference(image: str, layout: str = OCI_LAYOUT_CACHE) -> str:
+    reference = ImageReference(image)
+    return f"ocidir://{Path(layout).joinpath(reference.name)}:{reference.reference}"
+
+
+def get_cached_image_reference(
+    image: str, layout: str = OCI_LAYOUT_CACHE
+) -> str | None:
+    reference = ImageReference(image)
+    try:
+        index = json.loads(
+            Path(layout).joinpath(reference.name, "index.json").read_text()
+        )
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    for manifest in index.get("manifests", []):
+        if manifest.get("annotations", {}).get(OCI_REF_NAME_ANNOTATION) == (
+            reference.reference
+        ):
+            return get_oci_layout_reference(image, layout)
+
+    return None
+
+
+def save_to_oci_layout(image: str, layout: str = OCI_LAYOUT_CACHE):
+    result = subprocess.run(
+        [
+            "regctl",
+            "image",
+            "copy",
+            "--platform",
+            "linux/amd64",
+            image,
+            get_oci_layout_reference(image, layout),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise DockerError(f"Failed to save {image} to {layout}: {result.stderr}")
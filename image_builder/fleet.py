@@ -0,0 +1,254 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from image_builder.images import get_top_layer
+from image_builder.images import resolve_image
+from image_builder.pack import rebase_image
+from image_builder.progress import Progress
+from image_builder.registry import RegistryError
+from image_builder.registry import split_repository
+from image_builder.utils.yaml_loader import yaml_load
+
+DEFAULT_MAX_PARALLEL_REBASES = 8
+DEFAULT_MAX_REBASES_PER_REGISTRY = 4
+DEFAULT_REGISTRY_INTERVAL = 0.5
+DEFAULT_FLEET_STATE = "rebase-fleet-state.json"
+REBASED = "rebased"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class FleetError(Exception):
+    pass
+
+
+class FleetManifestError(FleetError):
+    pass
+
+
+class FleetImage:
+    repository: str
+    tag: str
+    tags: list
+
+    def __init__(self, repository: str, tag: str, tags: list = None):
+        self.repository = repository
+        self.tag = tag
+        self.tags = tags or [tag]
+
+    @property
+    def key(self) -> str:
+        return f"{self.repository}:{self.tag}"
+
+    @property
+    def registry(self) -> str:
+        return split_repository(self.repository)[0]
+
+
+class FleetRebaseResult:
+    image: FleetImage
+    status: str
+    duration: float
+    error: str | None
+
+    def __init__(
+        self, image: FleetImage, status: str, duration: float, error: str = None
+    ):
+        self.image = image
+        self.status = status
+        self.duration = duration
+        self.error = error
+
+
+class FleetState:
+    path: Path
+    run_image: str
+    results: dict
+
+    def __init__(self, path: str | Path, run_image: str):
+        self.path = Path(path)
+        self.run_image = run_image
+        self.results = {}
+        self._lock = threading.Lock()
+
+        try:
+            state = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        # Progress towards another run image has to start again
+        if state.get("run_image") == run_image:
+            self.results = {
+                key: result
+                for key, result in state.get("results", {}).items()
+                if result["status"] != FAILED
+            }
+
+    def is_done(self, image: FleetImage) -> bool:
+        with self._lock:
+            return image.key in self.results
+
+    def record(self, result: FleetRebaseResult):
+        with self._lock:
+            self.results[result.image.key] = {
+                "status": result.status,
+                "duration": result.duration,
+                "error": result.error,
+            }
+            state = json.dumps({"run_image": self.run_image, "results": self.results})
+
+            # Write then rename so an interrupted job never leaves a partial state
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handle, temporary_path = tempfile.mkstemp(dir=self.path.parent)
+            with os.fdopen(handle, "w") as temporary_file:
+                temporary_file.write(state)
+            os.replace(temporary_path, self.path)
+
+
+class RegistryRateLimiter:
+    max_concurrent: int
+    interval: float
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_REBASES_PER_REGISTRY,
+        interval: float = DEFAULT_REGISTRY_INTERVAL,
+    ):
+        self.max_concurrent = max_concurrent
+        self.interval = interval
+        self._semaphores = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def limit(self, registry: str):
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                registry, threading.BoundedSemaphore(self.max_concurrent)
+            )
+
+        with semaphore:
+            with self._lock:
+                start = max(time.monotonic(), self._next_start.get(registry, 0))
+                self._next_start[registry] = start + self.interval
+            time.sleep(max(0.0, start - time.monotonic()))
+            yield
+
+
+class FleetRebaser:
+    run_image: str
+    state_path: Path
+    state: FleetState | None
+    limiter: RegistryRateLimiter
+    max_workers: int
+    progress: Progress | None
+
+    def __init__(
+        self,
+        run_image: str,
+        state_path: str | Path,
+        limiter: RegistryRateLimiter = None,
+        max_workers: int = DEFAULT_MAX_PARALLEL_REBASES,
+        progress: Progress = None,
+    ):
+        self.run_image = run_image
+        self.state_path = Path(state_path)
+        self.state = None
+        self.limiter = limiter or RegistryRateLimiter()
+        self.max_workers = max_workers
+        self.progress = progress
+
+    def resolve_run_image(self) -> tuple[str, str | None]:
+        # Pin the run image so every image in the fleet gets the same one
+        try:
+            resolved = resolve_image(self.run_image)
+        except RegistryError as e:
+            print(f"Could not resolve {self.run_image}, rebasing onto the tag: {e}")
+            return self.run_image, None
+
+        return resolved.pinned, get_top_layer(resolved)
+
+    def rebase_fleet_image(
+        self, image: FleetImage, run_image: str, run_image_top_layer: str = None
+    ) -> FleetRebaseResult:
+        with self.limiter.limit(image.registry):
+            # Time the rebase itself rather than the wait for the registry
+            start_time = time.time()
+            try:
+                with self._span(f"rebase.{image.key}"):
+                    rebased = rebase_image(
+                        image.repository,
+                        image.tag,
+                        image.tags,
+                        run_image,
+                        run_image_top_layer,
+                        prefix=f"[{image.key}] ",
+                    )
+                status = REBASED if rebased else SKIPPED
+                result = FleetRebaseResult(image, status, time.time() - start_time)
+            except Exception as e:
+                # Record any failure so one bad image can't stop the rest of the fleet
+                result = FleetRebaseResult(
+                    image, FAILED, time.time() - start_time, str(e)
+                )
+
+        self.state.record(result)
+        return result
+
+    def rebase(self, images: list, on_image_complete: Callable = None) -> list:
+        # Key the progress on the digest so a patch pushed to the same tag starts over
+        run_image, run_image_top_layer = self.resolve_run_image()
+        self.state = FleetState(self.state_path, run_image)
+
+        pending = [image for image in images if not self.state.is_done(image)]
+        if len(pending) < len(images):
+            print(f"Resuming, {len(images) - len(pending)} images already done")
+
+        def rebase(image):
+            result = self.rebase_fleet_image(image, run_image, run_image_top_layer)
+            if on_image_complete is not None:
+                on_image_complete(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(rebase, pending))
+
+    def _span(self, name: str):
+        if self.progress is None:
+            return contextlib.nullcontext()
+        return self.progress.span(name)
+
+
+def load_fleet_manifest(path: str | Path) -> tuple[str | None, list]:
+    try:
+        manifest = yaml_load(Path(path).read_text())
+    except FileNotFoundError as error:
+        raise FleetManifestError(f"file {error.filename} does not exist")
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("images"), list):
+        raise FleetManifestError(f"{path} must contain a list of images")
+
+    images = []
+    for entry in manifest["images"]:
+        if not isinstance(entry, dict) or "repository" not in entry:
+            raise FleetManifestError(f"image {entry} must have a repository")
+
+        # Follow the commit-* naming used by Revision.get_docker_tags
+        tag = entry.get("tag") or (
+            f"commit-{entry['commit']}" if entry.get("commit") else None
+        )
+        if tag is None:
+            raise FleetManifestError(f"image {entry['repository']} must have a tag")
+
+        images.append(
+            FleetImage(entry["repository"], tag, [tag] + entry.get("tags", []))
+        )
+
+    return manifest.get("run_image"), images
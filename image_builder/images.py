@@ -0,0 +1,166 @@
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from image_builder.credentials import DOCKER_HUB_REGISTRY
+from image_builder.credentials import get_registry_client
+from image_builder.registry import Manifest
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
+from image_builder.registry import get_image_config
+
+DOCKER_HUB = "docker.io"
+DOCKER_HUB_CLIENT_REGISTRY = "registry-1.docker.io"
+BUILDER_METADATA_LABEL = "io.buildpacks.builder.metadata"
+LIFECYCLE_METADATA_LABEL = "io.buildpacks.lifecycle.metadata"
+DEFAULT_PLATFORM = {"os": "linux", "architecture": "amd64"}
+DEFAULT_MAX_PARALLEL_PULLS = 2
+
+
+class ImageReference:
+    name: str
+    registry: str
+    repository: str
+    reference: str
+
+    def __init__(self, image: str):
+        name, digest_separator, digest = image.partition("@")
+        first, _, rest = name.partition("/")
+        if rest and ("." in first or ":" in first or first == "localhost"):
+            registry, path = first, rest
+        else:
+            registry, path = DOCKER_HUB, name
+
+        last_slash = path.rfind("/")
+        if ":" in path[last_slash + 1 :]:
+            path, _, tag = path.rpartition(":")
+            name = name[: -len(tag) - 1]
+        else:
+            tag = "latest"
+
+        if registry == DOCKER_HUB and "/" not in path:
+            path = f"library/{path}"
+
+        self.name = name
+        self.registry = registry
+        self.repository = path
+        self.reference = digest if digest_separator else tag
+
+    @property
+    def client_registry(self) -> str:
+        if self.registry == DOCKER_HUB:
+            return DOCKER_HUB_CLIENT_REGISTRY
+        return self.registry
+
+    def pinned(self, digest: str) -> str:
+        return f"{self.name}@{digest}"
+
+
+class ResolvedImage:
+    image: str
+    pinned: str
+    config: dict
+
+    def __init__(self, image: str, pinned: str, config: dict):
+        self.image = image
+        self.pinned = pinned
+        self.config = config
+
+    @property
+    def labels(self) -> dict:
+        return self.config.get("config", {}).get("Labels") or {}
+
+
+def get_client(reference: ImageReference) -> RegistryClient:
+    credentials_registry = reference.registry
+    # Use the CodeBuild Docker Hub account to avoid anonymous rate limits
+    if reference.registry == DOCKER_HUB and os.environ.get("CODESTAR_CONNECTION_ARN"):
+        credentials_registry = DOCKER_HUB_REGISTRY
+
+    return get_registry_client(reference.client_registry, credentials_registry)
+
+
+def get_platform_manifest(
+    client: RegistryClient, repository: str, manifest: Manifest
+) -> Manifest:
+    if not manifest.is_index():
+        return manifest
+
+    for child in manifest.data.get("manifests", []):
+        platform = child.get("platform", {})
+        if all(platform.get(k) == v for k, v in DEFAULT_PLATFORM.items()):
+            return client.get_manifest(repository, child["digest"])
+
+    raise RegistryError(
+        f"{repository}@{manifest.digest} has no "
+        f"{DEFAULT_PLATFORM['os']}/{DEFAULT_PLATFORM['architecture']} image"
+    )
+
+
+def resolve_image(image: str) -> ResolvedImage:
+    reference = ImageReference(image)
+    client = get_client(reference)
+    manifest = client.get_manifest(reference.repository, reference.reference)
+    config = get_image_config(
+        client,
+        reference.repository,
+        get_platform_manifest(client, reference.repository, manifest),
+    )
+
+    # Pin the index rather than the platform image so docker picks the same one
+    return ResolvedImage(image, reference.pinned(manifest.digest), config)
+
+
+def get_builder_run_image(builder: ResolvedImage) -> str | None:
+    try:
+        metadata = json.loads(builder.labels[BUILDER_METADATA_LABEL])
+    except (KeyError, json.JSONDecodeError):
+        return None
+
+    run_images = metadata.get("run", {}).get("images") or []
+    if run_images:
+        return run_images[0].get("image")
+
+    return metadata.get("stack", {}).get("runImage", {}).get("image")
+
+
+def get_top_layer(image: ResolvedImage) -> str | None:
+    diff_ids = image.config.get("rootfs", {}).get("diff_ids") or []
+    return diff_ids[-1] if diff_ids else None
+
+
+def get_run_image_top_layer(labels: dict) -> str | None:
+    # The run image layer an application image was built or last rebased on
+    try:
+        metadata = json.loads(labels[LIFECYCLE_METADATA_LABEL])
+    except (KeyError, json.JSONDecodeError):
+        return None
+
+    return metadata.get("runImage", {}).get("topLayer")
+
+
+def resolve_builder_images(
+    builder: str, run_image: str = None
+) -> tuple[str, str | None]:
+    resolved_builder = resolve_image(builder)
+    run_image = run_image or get_builder_run_image(resolved_builder)
+    if run_image is None:
+        return resolved_builder.pinned, None
+
+    return resolved_builder.pinned, resolve_image(run_image).pinned
+
+
+def pull_images(images: list, max_workers: int = DEFAULT_MAX_PARALLEL_PULLS) -> list:
+    images = list(dict.fromkeys(images))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                lambda image: subprocess.run(["docker", "pull", image]), images
+            )
+        )
+
+    failed = [image for image, result in zip(images, results) if result.returncode != 0]
+    for image in failed:
+        print(f"Failed to pull {image}")
+    return failed
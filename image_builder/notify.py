@@ -1,5 +1,10 @@
+import atexit
 import logging
 import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
 from typing import List
 
 from slack_sdk import WebClient
@@ -10,6 +15,8 @@ from image_builder.progress import Progress
 from image_builder.utils.arn_parser import ARN
 
 NOTIFY_DATA_KEYS = ["revision_commit", "repository_name", "repository_url"]
+NOTIFY_FLUSH_TIMEOUT = 10
+SLACK_RATE_LIMIT_RETRIES = 3
 
 
 class Settings:
@@ -18,19 +25,88 @@ class Settings:
     build_arn: str
 
 
+class NotifyDispatcher:
+    deadline: float | None
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.pending = []
+        self.sending = False
+        self.deadline = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, send: Callable, key: str = None) -> Future:
+        with self.condition:
+            if key is not None and self.pending and self.pending[-1][0] == key:
+                # Only the latest state of a message is worth sending
+                future = self.pending[-1][2]
+                self.pending[-1] = (key, send, future)
+            else:
+                future = Future()
+                self.pending.append((key, send, future))
+            self.condition.notify_all()
+        return future
+
+    def flush(self, timeout: float = NOTIFY_FLUSH_TIMEOUT) -> bool:
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.pending and not self.sending, timeout
+            )
+
+    def close(self, timeout: float = NOTIFY_FLUSH_TIMEOUT):
+        with self.condition:
+            self.deadline = time.monotonic() + timeout
+
+        if not self.flush(timeout):
+            with self.condition:
+                dropped = len(self.pending)
+                self.pending.clear()
+            self.logger.error(
+                f"Dropped {dropped} Slack messages still pending after {timeout} s"
+            )
+
+    def wait_before_retry(self, seconds: float) -> bool:
+        with self.condition:
+            if self.deadline is not None and time.monotonic() + seconds > self.deadline:
+                return False
+        time.sleep(seconds)
+        return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                key, send, future = self.pending.pop(0)
+                self.sending = True
+
+            try:
+                future.set_result(send())
+            except Exception as e:
+                future.set_exception(e)
+
+            with self.condition:
+                self.sending = False
+                self.condition.notify_all()
+
+
 class Notify:
     reference: str | None
     settings: Settings
+    dispatcher: NotifyDispatcher | None
 
     def __init__(
         self,
         send_notifications: bool = True,
         logger: logging.Logger = logging.getLogger(__name__),
+        background: bool = False,
     ):
         self.settings = Settings()
         self.send_notifications = send_notifications
         self.reference = None
         self.logger = logger
+        self.dispatcher = None
 
         if self.send_notifications:
             try:
@@ -40,6 +116,14 @@ class Notify:
             except KeyError as e:
                 raise ValueError(f"{e} environment variable must be set")
 
+            if background:
+                self.dispatcher = NotifyDispatcher(logger)
+                atexit.register(self.close)
+
+    def close(self, timeout: float = NOTIFY_FLUSH_TIMEOUT):
+        if self.dispatcher is not None:
+            self.dispatcher.close(timeout)
+
     def _validate_data(self, data):
         if data is None:
             raise ValueError(f"The notification data can't be empty.")
@@ -99,57 +183,111 @@ class Notify:
                 ),
             ]
 
-            try:
-                if self.reference is None:
-                    response = self.slack.chat_postMessage(
-                        channel=os.environ["SLACK_CHANNEL_ID"],
-                        blocks=message_blocks,
-                        text=f"Building: {text_blocks['repository_name']}@{text_blocks['revision_commit']}",
-                        unfurl_links=False,
-                        unfurl_media=False,
-                    )
-                    self.reference = response["ts"]
-                else:
-                    response = self.slack.chat_update(
-                        channel=os.environ["SLACK_CHANNEL_ID"],
-                        blocks=message_blocks,
-                        ts=self.reference,
-                        text=f"Building: {text_blocks['repository_name']}@{text_blocks['revision_commit']}",
-                        unfurl_links=False,
-                        unfurl_media=False,
-                    )
-                    self.reference = response["ts"]
-            except SlackApiError as e:
-                self.logger.error(f"Slack API Error: {e.response['error']}")
-            except Exception as e:
-                self.logger.error(f"Error sending Slack message: {str(e)}")
+            text = (
+                f"Building: {text_blocks['repository_name']}@"
+                f"{text_blocks['revision_commit']}"
+            )
 
-    def post_job_comment(
-        self, title: str, message: List[str], send_to_main_channel=False
-    ):
+            # The first message sets the thread reference everything else uses
+            first_message = self.reference is None
+            self._dispatch(
+                lambda: self._send_build_progress(message_blocks, text),
+                key=None if first_message else "build_progress",
+                wait=first_message,
+            )
+
+    def _send_build_progress(self, message_blocks, text):
         try:
-            if self.send_notifications:
-                response = self.slack.chat_postMessage(
+            if self.reference is None:
+                response = self._call_slack(
+                    self.slack.chat_postMessage,
                     channel=os.environ["SLACK_CHANNEL_ID"],
-                    blocks=[
-                        blocks.SectionBlock(
-                            text=blocks.TextObject(type="mrkdwn", text=line)
-                        )
-                        for line in message
-                        if line
-                    ],
-                    text=title,
-                    reply_broadcast=send_to_main_channel,
+                    blocks=message_blocks,
+                    text=text,
                     unfurl_links=False,
                     unfurl_media=False,
-                    thread_ts=self.reference,
                 )
-                return response["ts"]
+                self.reference = response["ts"]
+            else:
+                response = self._call_slack(
+                    self.slack.chat_update,
+                    channel=os.environ["SLACK_CHANNEL_ID"],
+                    blocks=message_blocks,
+                    ts=self.reference,
+                    text=text,
+                    unfurl_links=False,
+                    unfurl_media=False,
+                )
+                self.reference = response["ts"]
+        except SlackApiError as e:
+            self.logger.error(f"Slack API Error: {e.response['error']}")
+        except Exception as e:
+            self.logger.error(f"Error sending Slack message: {str(e)}")
+
+    def start_thread(self, title: str, message: List[str]):
+        # Job comments posted after this are replies to this message
+        if self.send_notifications:
+            self.reference = self._dispatch(
+                lambda: self._send_job_comment(title, message, False), wait=True
+            )
+
+    def post_job_comment(
+        self, title: str, message: List[str], send_to_main_channel=False
+    ):
+        if self.send_notifications:
+            return self._dispatch(
+                lambda: self._send_job_comment(title, message, send_to_main_channel)
+            )
+
+    def _send_job_comment(self, title, message, send_to_main_channel):
+        try:
+            response = self._call_slack(
+                self.slack.chat_postMessage,
+                channel=os.environ["SLACK_CHANNEL_ID"],
+                blocks=[
+                    blocks.SectionBlock(
+                        text=blocks.TextObject(type="mrkdwn", text=line)
+                    )
+                    for line in message
+                    if line
+                ],
+                text=title,
+                reply_broadcast=send_to_main_channel,
+                unfurl_links=False,
+                unfurl_media=False,
+                thread_ts=self.reference,
+            )
+            return response["ts"]
         except SlackApiError as e:
             self.logger.error(f"Slack API Error: {e.response['error']}")
         except Exception as e:
             self.logger.error(f"Error sending Slack message: {str(e)}")
 
+    def _dispatch(self, send: Callable, key: str = None, wait: bool = False):
+        if self.dispatcher is None:
+            return send()
+
+        future = self.dispatcher.submit(send, key)
+        if wait:
+            return future.result()
+
+    def _call_slack(self, method: Callable, **kwargs):
+        for attempt in range(SLACK_RATE_LIMIT_RETRIES + 1):
+            try:
+                return method(**kwargs)
+            except SlackApiError as e:
+                if (
+                    attempt == SLACK_RATE_LIMIT_RETRIES
+                    or getattr(e.response, "status_code", None) != 429
+                ):
+                    raise
+
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                if self.dispatcher is None:
+                    time.sleep(retry_after)
+                elif not self.dispatcher.wait_before_retry(retry_after):
+                    raise
+
     def get_build_url(self):
         if self.send_notifications:
             try:
@@ -1,8 +1,31 @@
+import contextlib
+import re
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
 from image_builder.codebase.codebase import Codebase
+from image_builder.credentials import get_registry_client
+from image_builder.docker import Docker
+from image_builder.images import get_run_image_top_layer
+from image_builder.images import get_top_layer
+from image_builder.images import pull_images
+from image_builder.images import resolve_builder_images
+from image_builder.images import resolve_image
+from image_builder.plan import BuildPlan
+from image_builder.progress import Progress
+from image_builder.progress import Span
 from image_builder.publish import publish_to_additional_repository
+from image_builder.registry import RegistryError
+from image_builder.registry import RegistryNotFoundError
+from image_builder.registry import create_repository
+from image_builder.registry import get_image_config
+from image_builder.registry import get_image_labels
+from image_builder.registry import split_repository
+from image_builder.utils.output_reader import ERROR_OUTPUT_SIZE
+from image_builder.utils.output_reader import OutputReader
 
 
 class PackError(Exception):
@@ -13,13 +36,127 @@ class PackCommandFailedError(PackError):
     pass
 
 
+class PackRebaseError(PackError):
+    pass
+
+
+class PackNoProcessesError(PackError):
+    pass
+
+
+PHASE_MARKER = re.compile(r"===> ([A-Z]+)")
+DEFAULT_MAX_PARALLEL_BUILDS = 3
+BUILD_KEY_LABEL = "uk.gov.trade.digital.build.key"
+
+
+class PackOutputReader(OutputReader):
+    def __init__(
+        self,
+        proc: subprocess.Popen,
+        on_phase: Callable = None,
+        error_size: int = ERROR_OUTPUT_SIZE,
+        prefix: str = "",
+    ):
+        super().__init__(proc, self._on_line, error_size, prefix)
+        self.on_phase = on_phase
+
+    def _on_line(self, line: str):
+        match = PHASE_MARKER.search(line)
+        if match and self.on_phase is not None:
+            self.on_phase(match.group(1))
+
+
+class ProcessBuildResult:
+    process: str
+    duration: float
+    error: Exception | None
+
+    def __init__(self, process: str, duration: float, error: Exception = None):
+        self.process = process
+        self.duration = duration
+        self.error = error
+
+
+def get_rebase_command(image: str, run_image: str = None) -> str:
+    command = f"pack rebase {image} --publish"
+    if run_image:
+        command += f" --run-image {run_image}"
+
+    return command
+
+
+def rebase_image(
+    image_repository: str,
+    tag: str,
+    tags: list,
+    run_image: str = None,
+    run_image_top_layer: str = None,
+    prefix: str = "",
+) -> bool:
+    registry, repository = split_repository(image_repository)
+    image = f"{registry}/{repository}:{tag}"
+
+    client = get_registry_client(registry)
+    try:
+        labels = get_image_labels(client, repository, tag)
+    except RegistryNotFoundError:
+        raise PackRebaseError(f"{image} has not been built so cannot be rebased")
+
+    if (
+        run_image_top_layer is not None
+        and get_run_image_top_layer(labels) == run_image_top_layer
+    ):
+        print(f"{image} is already on the latest run image")
+        return False
+
+    proc = subprocess.Popen(
+        get_rebase_command(f"{image_repository}:{tag}", run_image),
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    reader = PackOutputReader(proc, prefix=prefix)
+    reader.read()
+
+    if proc.returncode != 0:
+        raise PackCommandFailedError(str(reader.error))
+
+    manifest = client.get_manifest(repository, tag)
+    for other_tag in tags:
+        if other_tag != tag:
+            client.put_manifest(repository, other_tag, manifest)
+
+    return True
+
+
 class Pack:
     codebase: Codebase
     build_timestamp: str
-
-    def __init__(self, codebase: Codebase, build_timestamp: str = None):
+    progress: Progress | None
+    skip_existing: bool
+    builder_image: str | None
+    run_image: str | None
+    builder_cached: bool
+    images_pulled: bool
+
+    def __init__(
+        self,
+        codebase: Codebase,
+        build_timestamp: str = None,
+        progress: Progress = None,
+        skip_existing: bool = False,
+        plan: BuildPlan = None,
+    ):
         self.codebase = codebase
+        self._plan = plan
         self.build_timestamp = build_timestamp
+        self.progress = progress
+        self.skip_existing = skip_existing
+        self.builder_image = None
+        self.run_image = None
+        self.builder_cached = False
+        self.images_pulled = False
 
     def build(
         self,
@@ -27,145 +164,298 @@ class Pack:
         on_building: Callable = None,
         on_exporting: Callable = None,
         run_image=None,
+        process: str = None,
     ):
+        if (
+            publish
+            and self.skip_existing
+            and self.tag_existing_build(run_image, process)
+        ):
+            for callback in [on_building, on_exporting]:
+                if callback is not None:
+                    callback()
+            self.publish_to_additional_repository(process)
+            return
+
         proc = subprocess.Popen(
-            self.get_command(publish, run_image),
+            self.get_command(publish, run_image, process),
             shell=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
         )
 
-        while proc.poll() is None:
-            output = proc.stdout.readline()
-            print(output, end="")
-            if on_building is not None and "===> BUILDING" in output:
+        span_prefix = f"pack.{process}" if process else "pack"
+        stage: Span | None = None
+
+        def on_phase(phase):
+            nonlocal stage
+            if self.progress is not None:
+                if stage is not None:
+                    stage.finish()
+                stage = self.progress.start_span(f"{span_prefix}.{phase.lower()}")
+
+            if on_building is not None and phase == "BUILDING":
                 on_building()
-            if on_exporting is not None and "===> EXPORTING" in output:
+            if on_exporting is not None and phase == "EXPORTING":
                 on_exporting()
 
+        reader = PackOutputReader(
+            proc, on_phase, prefix=f"[{process}] " if process else ""
+        )
+        reader.read()
+        if stage is not None:
+            stage.finish()
+
         if proc.returncode != 0:
-            error = proc.stderr.read()
+            raise PackCommandFailedError(str(reader.error))
 
-            # To account for different systems (macOS produces a byte array, linux produces a str)
-            if hasattr(error, "decode"):
-                error = error.decode("utf-8")
+        if publish:
+            self.publish_to_additional_repository(process)
+
+    def publish_to_additional_repository(self, process: str = None):
+        if not self.plan.additional_repository:
+            return
+
+        span_prefix = f"pack.{process}" if process else "pack"
+        with self._span(f"{span_prefix}.publish_additional_repository"):
+            publish_to_additional_repository(
+                self.get_image_repository(process),
+                self.get_image_repository(process, self.plan.additional_repository),
+                list(self.plan.tags),
+            )
 
+    def tag_existing_build(self, run_image=None, process: str = None) -> bool:
+        registry, repository = split_repository(self.get_image_repository(process))
+        build_key = self.get_build_key(run_image, process)
+        commit_tag = f"commit-{self.plan.commit}"
+
+        try:
+            client = get_registry_client(registry)
+            manifest = client.get_manifest(repository, commit_tag)
+            config = get_image_config(client, repository, manifest)
+            labels = config.get("config", {}).get("Labels") or {}
+            if labels.get(BUILD_KEY_LABEL) != build_key:
+                return False
+
+            print(f"{registry}/{repository}:{commit_tag} is already built, tagging it")
+            for tag in self.plan.tags:
+                if tag != commit_tag:
+                    client.put_manifest(repository, tag, manifest)
+        except RegistryNotFoundError:
+            return False
+        except RegistryError as e:
+            print(f"Could not check for an existing build, building: {e}")
+            return False
+
+        return True
+
+    def build_processes(
+        self,
+        publish=False,
+        on_building: Callable = None,
+        on_exporting: Callable = None,
+        run_image=None,
+        max_workers: int = DEFAULT_MAX_PARALLEL_BUILDS,
+        on_process_complete: Callable = None,
+    ):
+        if not self.plan.processes:
+            raise PackNoProcessesError("No processes found in the Procfile")
+
+        # Pull the images once so the concurrent builds don't each fetch them
+        self.pull_images()
+
+        on_building = self._once(on_building)
+        on_exporting = self._once(on_exporting)
+
+        def build_process(process):
+            start_time = time.time()
+            try:
+                if publish:
+                    self.create_process_repositories(process)
+                self.build(publish, on_building, on_exporting, run_image, process)
+                result = ProcessBuildResult(process, time.time() - start_time)
+            except (PackError, RegistryError) as e:
+                result = ProcessBuildResult(process, time.time() - start_time, e)
+
+            if on_process_complete is not None:
+                on_process_complete(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(build_process, self.plan.processes))
+
+        failed = [r for r in results if r.error is not None]
+        if failed:
             raise PackCommandFailedError(
-                error[len(error) - 2500 :] if len(error) > 2500 else error
+                "\n".join(f"{r.process}: {r.error}" for r in failed)
             )
 
-        if publish and self.codebase.build.additional_repository:
-            publish_to_additional_repository(
-                self.codebase.build.repository,
-                self.codebase.build.additional_repository,
-                self.codebase.revision.get_docker_tags(),
+        return results
+
+    def create_process_repositories(self, process: str):
+        with self._span(f"pack.{process}.create_repositories"):
+            create_repository(self.get_image_repository(process))
+            if self.plan.additional_repository:
+                create_repository(
+                    self.get_image_repository(process, self.plan.additional_repository)
+                )
+
+    def rebase(self, process: str = None, run_image_top_layer: str = None) -> bool:
+        span_prefix = f"pack.{process}" if process else "pack"
+        with self._span(f"{span_prefix}.rebase"):
+            rebased = rebase_image(
+                self.get_image_repository(process),
+                f"commit-{self.plan.commit}",
+                list(self.plan.tags),
+                self.run_image or self.plan.run_image,
+                run_image_top_layer,
+                prefix=f"[{process}] " if process else "",
             )
 
-    def get_command(self, publish=False, run_image=None):
+        if rebased:
+            self.publish_to_additional_repository(process)
+        return rebased
+
+    def get_rebase_command(self, process: str = None):
+        return get_rebase_command(
+            f"{self.get_image_repository(process)}:commit-{self.plan.commit}",
+            self.run_image or self.plan.run_image,
+        )
+
+    def get_run_image_top_layer(self) -> str | None:
+        run_image = self.run_image or self.plan.run_image
+        if run_image is None:
+            return None
+
+        try:
+            return get_top_layer(resolve_image(run_image))
+        except RegistryError as e:
+            print(f"Could not read the run image {run_image}, rebasing anyway: {e}")
+            return None
+
+    def _span(self, name: str):
+        if self.progress is None:
+            return contextlib.nullcontext()
+        return self.progress.span(name)
+
+    @staticmethod
+    def _once(callback: Callable = None):
+        if callback is None:
+            return None
+
+        lock = threading.Lock()
+        called = []
+
+        def once():
+            with lock:
+                if called:
+                    return
+                called.append(True)
+                callback()
+
+        return once
+
+    def get_command(self, publish=False, run_image=None, process: str = None):
+        repository = self.get_image_repository(process)
         buildpacks = " ".join([f"--buildpack {p}" for p in self.get_buildpacks()])
-        environment = " ".join([f"--env {e}" for e in self.get_environment()])
-        tags = " ".join(
-            [
-                f"--tag {self._repository}:{t}"
-                for t in self.codebase.revision.get_docker_tags()
-            ]
+        environment = " ".join(
+            [f"--env {e}" for e in self.get_environment(run_image, process)]
         )
+        tags = " ".join([f"--tag {repository}:{t}" for t in self.plan.tags])
         command = (
-            f"pack build {self._repository} "
-            f"--builder {self.codebase.build.builder.name}:{self.codebase.build.builder.version} "
+            f"pack build {repository} "
+            f"--builder {self.get_builder_image()} "
             f"{tags} {environment} {buildpacks}"
         )
 
+        if process:
+            command += f" --default-process {process}"
+
+        if process or self.images_pulled:
+            command += " --pull-policy if-not-present"
+
         if publish:
-            command += f" --publish --cache-image {self._repository}:cache"
+            command += " --publish"
 
+        cache_option = self.get_cache_option(publish, process)
+        if cache_option:
+            command += f" {cache_option}"
+
+        run_image = self.run_image or run_image
         if run_image:
             command += f" --run-image {run_image}"
 
         return command
 
+    def get_cache_option(self, publish=False, process: str = None):
+        cache_type, source = self.plan.cache
+
+        # Process images build concurrently so each needs a cache of its own
+        if cache_type == "volume":
+            if source and process:
+                source = f"{source}-{process}"
+            name = f";name={source}" if source else ""
+            return f"--cache 'type=build;format=volume{name}'"
+
+        if cache_type == "bind":
+            if process:
+                source = f"{source}/{process}"
+            return f"--cache 'type=build;format=bind;source={source}'"
+
+        if process:
+            source = f"{self.get_image_repository(process)}:cache"
+
+        # A registry cache image can only be written when publishing
+        if publish:
+            return f"--cache-image {source}"
+
+        return None
+
+    def resolve_images(self, run_image=None):
+        try:
+            self.builder_image, self.run_image = resolve_builder_images(
+                self.get_builder(), run_image
+            )
+        except RegistryError as e:
+            print(f"Could not resolve image digests, using tags: {e}")
+
+    def load_cached_builder(self):
+        self.builder_cached = Docker.load_cached_image(self.get_builder())
+
+    def pull_images(self):
+        if not self.images_pulled:
+            # A builder loaded from the cache is only tagged, so it can't be pinned
+            images = [] if self.builder_cached else [self.get_builder_image()]
+            if self.run_image:
+                images.append(self.run_image)
+            # Retry on the next call rather than telling pack the images are present
+            self.images_pulled = not pull_images(images)
+
+    def get_builder(self):
+        return self.plan.builder
+
+    def get_builder_image(self):
+        if self.builder_cached or self.builder_image is None:
+            return self.get_builder()
+        return self.builder_image
+
+    def get_image_repository(self, process: str = None, repository: str = None):
+        repository = repository or self._repository
+        if process:
+            return f"{repository}/{process}"
+
+        return repository
+
     def get_buildpacks(self):
-        buildpacks = ["paketo-buildpacks/git"]
-
-        if self.codebase.build.packages:
-            buildpacks.append("fagiani/apt")
-
-        for pack in self.codebase.build.packs:
-            buildpacks.append(pack.name)
-
-        if "paketo-buildpacks/python" not in buildpacks:
-            if "python" in self.codebase.languages:
-                buildpacks.append("paketo-buildpacks/python")
-
-        if "paketo-buildpacks/nodejs" not in buildpacks:
-            if "nodejs" in self.codebase.languages:
-                buildpacks.append("paketo-buildpacks/nodejs")
-
-        if "paketo-buildpacks/ruby" not in buildpacks:
-            if "ruby" in self.codebase.languages:
-                buildpacks.append("paketo-buildpacks/ruby")
-
-        if "paketo-buildpacks/php" not in buildpacks:
-            if "php" in self.codebase.languages:
-                buildpacks.append("paketo-buildpacks/php")
-
-        buildpacks.append("fagiani/run")
-        buildpacks.append("paketo-buildpacks/image-labels@4.9.0")
-        buildpacks.append("paketo-buildpacks/environment-variables@4.9.0")
-
-        return buildpacks
-
-    def get_environment(self):
-        buildpacks = self.get_buildpacks()
-        environment = []
-        if "paketo-buildpacks/python" in buildpacks:
-            python_version = self.codebase.languages["python"].version
-            environment.append(f"BP_CPYTHON_VERSION={python_version}")
-
-        if "paketo-buildpacks/nodejs" in buildpacks:
-            node_version = self.codebase.languages["nodejs"].version
-            environment.append(f"BP_NODE_VERSION={node_version}")
-
-        if "paketo-buildpacks/ruby" in buildpacks:
-            ruby_version = self.codebase.languages["ruby"].version
-            environment.append(f"BP_RUBY_VERSION={ruby_version}")
-
-        if "paketo-buildpacks/php" in buildpacks:
-            php_version = self.codebase.languages["php"].version
-            environment.append(f"BP_PHP_VERSION={php_version}")
-            environment.append("BP_PHP_WEB_DIR=web")
-            environment.append("BP_PHP_SERVER=httpd")
-            environment.append("COMPOSER=composer.json")
-            environment.append("COMPOSER_VENDOR_DIR=vendor")
-
-        if self.codebase.revision.tag:
-            environment.append(f"BPE_GIT_TAG={self.codebase.revision.tag}")
-            # DD environment parameter
-            environment.append(f"BPE_DD_VERSION={self.codebase.revision.tag}")
-        else:
-            environment.append(f"BPE_DD_VERSION={self.codebase.revision.commit}")
-
-        if self.codebase.revision.commit:
-            environment.append(f"BPE_GIT_COMMIT={self.codebase.revision.commit}")
-            environment.append(f"BP_OCI_REVISION={self.codebase.revision.commit}")
-            environment.append(f"BP_OCI_VERSION={self.codebase.revision.commit}")
-
-        if self.codebase.revision.branch:
-            environment.append(f"BPE_GIT_BRANCH={self.codebase.revision.branch}")
-
-        environment.append(f"BP_OCI_REF_NAME={self.get_bp_oci_ref_name()}")
-        environment.append(
-            f"BP_OCI_SOURCE={self.codebase.revision.get_repository_url()}"
-        )
+        return list(self.plan.buildpacks)
 
-        # DD environment parameters.
-        environment.append(
-            f"BPE_DD_GIT_REPOSITORY_URL={self.codebase.revision.get_repository_url()}"
-        )
-        environment.append(
-            f"BPE_DD_GIT_COMMIT_SHA={self.codebase.revision.long_commit}"
-        )
+    def get_build_key(self, run_image=None, process: str = None) -> str:
+        # Key on the resolved digest so a patched run image invalidates it
+        return self.plan.get_build_key(self.run_image or run_image, process)
+
+    def get_environment(self, run_image=None, process: str = None):
+        environment = list(self.plan.environment)
 
         additional_labels = []
 
@@ -174,18 +464,21 @@ class Pack:
                 f"uk.gov.trade.digital.build.timestamp={self.build_timestamp}"
             )
 
-        if additional_labels:
-            additional_labels = " ".join(additional_labels)
-            environment.append(f'BP_IMAGE_LABELS="{additional_labels}"')
+        additional_labels.append(
+            f"{BUILD_KEY_LABEL}={self.get_build_key(run_image, process)}"
+        )
 
-        return environment
+        additional_labels = " ".join(additional_labels)
+        environment.append(f'BP_IMAGE_LABELS="{additional_labels}"')
 
-    def get_bp_oci_ref_name(self):
-        if self.codebase.revision.tag:
-            return f"tag-{self.codebase.revision.tag}"
+        return environment
 
-        return f"commit-{self.codebase.revision.commit}"
+    @property
+    def plan(self) -> BuildPlan:
+        if self._plan is None:
+            self._plan = BuildPlan.from_codebase(self.codebase)
+        return self._plan
 
     @property
     def _repository(self):
-        return self.codebase.build.repository
+        return self.plan.repository
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import subprocess
+
+from image_builder.codebase.codebase import Codebase
+from image_builder.credentials import get_registry_client
+from image_builder.images import resolve_builder_images
+from image_builder.images import resolve_image
+from image_builder.registry import RegistryError
+from image_builder.registry import RegistryNotFoundError
+from image_builder.registry import split_repository
+
+PACKAGES_BUILD_TAG = "packages-build"
+PACKAGES_RUN_TAG = "packages-run"
+PACKAGES_DOCKERFILE = """FROM {base}
+USER root
+RUN apt-get update \\
+    && DEBIAN_FRONTEND=noninteractive apt-get install --yes --no-install-recommends {packages} \\
+    && rm -rf /var/lib/apt/lists/*
+USER {user}
+"""
+
+
+class PackagesError(Exception):
+    pass
+
+
+class PackagesBuildError(PackagesError):
+    pass
+
+
+class PackagesImages:
+    repository: str
+    packages: list
+    builder: str
+    run_image: str
+    key: str
+    available: bool
+
+    def __init__(
+        self,
+        repository: str,
+        packages: list,
+        builder: str,
+        run_image: str,
+    ):
+        self.repository = repository
+        self.packages = sorted(set(packages))
+        self.builder = builder
+        self.run_image = run_image
+        self.key = get_packages_key(self.packages, builder, run_image)
+        self.available = False
+
+    @property
+    def tags(self) -> list:
+        return [f"{PACKAGES_BUILD_TAG}-{self.key}", f"{PACKAGES_RUN_TAG}-{self.key}"]
+
+    @property
+    def build_image(self) -> str:
+        return f"{self.repository}:{self.tags[0]}"
+
+    @property
+    def prebuilt_run_image(self) -> str:
+        return f"{self.repository}:{self.tags[1]}"
+
+    def exists(self) -> bool:
+        registry, repository = split_repository(self.repository)
+        try:
+            client = get_registry_client(registry)
+            for tag in self.tags:
+                client.get_manifest(repository, tag)
+        except RegistryNotFoundError:
+            return False
+        except RegistryError as e:
+            print(f"Could not check for prebuilt packages images: {e}")
+            return False
+
+        return True
+
+    def build(self):
+        # The run image needs the libraries and the build image needs them to compile
+        build_packages_image(self.builder, self.build_image, self.packages)
+        build_packages_image(self.run_image, self.prebuilt_run_image, self.packages)
+
+
+def get_packages_key(packages: list, builder: str, run_image: str) -> str:
+    key = {
+        "packages": sorted(set(packages)),
+        "builder": builder,
+        "run_image": run_image,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def get_packages_images(
+    codebase: Codebase, run_image: str = None
+) -> PackagesImages | None:
+    packages = codebase.build.packages
+    # Aptfile repositories and .deb URLs need the apt buildpack
+    if not packages or any(":" in p or "/" in p for p in packages):
+        return None
+
+    # Key on the digests so an OS patch pushed to the same tags gets new images
+    builder = f"{codebase.build.builder.name}:{codebase.build.builder.version}"
+    try:
+        builder, run_image = resolve_builder_images(builder, run_image)
+    except RegistryError as e:
+        print(f"Could not resolve the base images for prebuilt packages: {e}")
+        return None
+    if run_image is None:
+        return None
+
+    images = PackagesImages(codebase.build.repository, packages, builder, run_image)
+    images.available = images.exists()
+    return images
+
+
+def get_packages_dockerfile(base: str, packages: list, user: str) -> str:
+    return PACKAGES_DOCKERFILE.format(
+        base=base, packages=" ".join(packages), user=user or "root"
+    )
+
+
+def build_packages_image(base: str, image: str, packages: list):
+    resolved = resolve_image(base)
+    user = resolved.config.get("config", {}).get("User")
+    dockerfile = get_packages_dockerfile(resolved.pinned, packages, user)
+
+    # Send the Dockerfile on stdin so the build has no context to upload
+    for command, stdin in [
+        (["docker", "build", "--tag", image, "-"], dockerfile),
+        (["docker", "push", image], None),
+    ]:
+        print(f"Running command: {' '.join(command)}")
+        result = subprocess.run(
+            command,
+            input=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise PackagesBuildError(f"Failed to build {image}: {result.stderr}")
@@ -0,0 +1,252 @@
+import hashlib
+import json
+
+from image_builder.codebase.codebase import Codebase
+from image_builder.packages import PackagesImages
+
+
+class BuildPlanError(Exception):
+    pass
+
+
+class BuildPlan:
+    repository_name: str
+    repository_url: str
+    commit: str
+    long_commit: str
+    branch: str | None
+    tag: str | None
+    builder: str
+    buildpacks: tuple
+    environment: tuple
+    repository: str
+    additional_repository: str | None
+    tags: tuple
+    cache: tuple
+    run_image: str | None
+    processes: tuple
+    languages: tuple
+
+    def __init__(
+        self,
+        repository_name: str,
+        repository_url: str,
+        commit: str,
+        long_commit: str,
+        branch: str | None,
+        tag: str | None,
+        builder: str,
+        buildpacks: tuple,
+        environment: tuple,
+        repository: str,
+        additional_repository: str | None,
+        tags: tuple,
+        cache: tuple,
+        run_image: str | None,
+        processes: tuple,
+        languages: tuple,
+    ):
+        values = dict(locals())
+        values.pop("self")
+        # Freeze lists, including the language pairs, so the plan can be hashed
+        for name, value in values.items():
+            if isinstance(value, list):
+                value = tuple(tuple(v) if isinstance(v, list) else v for v in value)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise BuildPlanError(f"Cannot set {name}, build plans are immutable")
+
+    def __delattr__(self, name):
+        raise BuildPlanError(f"Cannot delete {name}, build plans are immutable")
+
+    def __eq__(self, other):
+        return isinstance(other, BuildPlan) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(self.to_json())
+
+    @property
+    def registry(self) -> str:
+        return self.repository.split("/")[0]
+
+    @property
+    def additional_registry(self) -> str | None:
+        if not self.additional_repository:
+            return None
+        return self.additional_repository.split("/")[0]
+
+    def get_registries(self, publish: bool = False) -> list:
+        registries = [self.registry]
+        if publish and self.additional_registry:
+            registries.append(self.additional_registry)
+        return registries
+
+    def get_languages(self) -> str:
+        return ", ".join(f"{name}@{version}" for name, version in self.languages)
+
+    def get_notify_attrs(self) -> dict:
+        return {
+            "repository_name": self.repository_name,
+            "repository_url": self.repository_url,
+            "revision_commit": self.commit,
+        }
+
+    def get_build_key(self, run_image=None, process: str = None) -> str:
+        # The whole environment counts as the tag and ref are baked into the image
+        build = {
+            "commit": self.long_commit,
+            "builder": self.builder,
+            "buildpacks": list(self.buildpacks),
+            "environment": list(self.environment),
+            "run_image": run_image,
+            "process": process,
+        }
+        return hashlib.sha256(json.dumps(build, sort_keys=True).encode()).hexdigest()
+
+    def to_dict(self) -> dict:
+        return {
+            name: list(value) if isinstance(value, tuple) else value
+            for name, value in vars(self).items()
+        }
+
+    def to_json(self, indent: int = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, data: str) -> "BuildPlan":
+        return cls(**json.loads(data))
+
+    @classmethod
+    def from_codebase(
+        cls,
+        codebase: Codebase,
+        run_image: str = None,
+        packages: PackagesImages = None,
+    ) -> "BuildPlan":
+        prebuilt_packages = packages is not None and packages.available
+        buildpacks = get_buildpacks(codebase, prebuilt_packages)
+        builder = f"{codebase.build.builder.name}:{codebase.build.builder.version}"
+        if prebuilt_packages:
+            builder = packages.build_image
+            run_image = packages.prebuilt_run_image
+        revision = codebase.revision
+        return cls(
+            repository_name=revision.get_repository_name(),
+            repository_url=revision.get_repository_url(),
+            commit=revision.commit,
+            long_commit=revision.long_commit,
+            branch=revision.branch,
+            tag=revision.tag,
+            builder=builder,
+            buildpacks=buildpacks,
+            environment=get_build_environment(codebase, buildpacks),
+            repository=codebase.build.repository,
+            additional_repository=codebase.build.additional_repository,
+            tags=revision.get_docker_tags(),
+            cache=get_cache(codebase),
+            run_image=run_image,
+            processes=[p.name for p in codebase.processes],
+            languages=[
+                [language.name, language.version]
+                for language in codebase.languages.values()
+            ],
+        )
+
+
+def get_cache(codebase: Codebase) -> list:
+    cache = codebase.build.cache
+    if cache.type == "volume":
+        return [cache.type, cache.name]
+    if cache.type == "bind":
+        return [cache.type, cache.path]
+
+    return [cache.type, f"{codebase.build.repository}:cache"]
+
+
+def get_buildpacks(codebase: Codebase, prebuilt_packages: bool = False) -> list:
+    buildpacks = ["paketo-buildpacks/git"]
+
+    # Prebuilt packages images already have the Aptfile packages installed
+    if codebase.build.packages and not prebuilt_packages:
+        buildpacks.append("fagiani/apt")
+
+    for pack in codebase.build.packs:
+        buildpacks.append(pack.name)
+
+    if "paketo-buildpacks/python" not in buildpacks:
+        if "python" in codebase.languages:
+            buildpacks.append("paketo-buildpacks/python")
+
+    if "paketo-buildpacks/nodejs" not in buildpacks:
+        if "nodejs" in codebase.languages:
+            buildpacks.append("paketo-buildpacks/nodejs")
+
+    if "paketo-buildpacks/ruby" not in buildpacks:
+        if "ruby" in codebase.languages:
+            buildpacks.append("paketo-buildpacks/ruby")
+
+    if "paketo-buildpacks/php" not in buildpacks:
+        if "php" in codebase.languages:
+            buildpacks.append("paketo-buildpacks/php")
+
+    buildpacks.append("fagiani/run")
+    buildpacks.append("paketo-buildpacks/image-labels@4.9.0")
+    buildpacks.append("paketo-buildpacks/environment-variables@4.9.0")
+
+    return buildpacks
+
+
+def get_build_environment(codebase: Codebase, buildpacks: list) -> list:
+    revision = codebase.revision
+    environment = []
+    if "paketo-buildpacks/python" in buildpacks:
+        python_version = codebase.languages["python"].version
+        environment.append(f"BP_CPYTHON_VERSION={python_version}")
+
+    if "paketo-buildpacks/nodejs" in buildpacks:
+        node_version = codebase.languages["nodejs"].version
+        environment.append(f"BP_NODE_VERSION={node_version}")
+
+    if "paketo-buildpacks/ruby" in buildpacks:
+        ruby_version = codebase.languages["ruby"].version
+        environment.append(f"BP_RUBY_VERSION={ruby_version}")
+
+    if "paketo-buildpacks/php" in buildpacks:
+        php_version = codebase.languages["php"].version
+        environment.append(f"BP_PHP_VERSION={php_version}")
+        environment.append("BP_PHP_WEB_DIR=web")
+        environment.append("BP_PHP_SERVER=httpd")
+        environment.append("COMPOSER=composer.json")
+        environment.append("COMPOSER_VENDOR_DIR=vendor")
+
+    if revision.tag:
+        environment.append(f"BPE_GIT_TAG={revision.tag}")
+        # DD environment parameter
+        environment.append(f"BPE_DD_VERSION={revision.tag}")
+    else:
+        environment.append(f"BPE_DD_VERSION={revision.commit}")
+
+    if revision.commit:
+        environment.append(f"BPE_GIT_COMMIT={revision.commit}")
+        environment.append(f"BP_OCI_REVISION={revision.commit}")
+        environment.append(f"BP_OCI_VERSION={revision.commit}")
+
+    if revision.branch:
+        environment.append(f"BPE_GIT_BRANCH={revision.branch}")
+
+    environment.append(f"BP_OCI_REF_NAME={get_bp_oci_ref_name(codebase)}")
+    environment.append(f"BP_OCI_SOURCE={revision.get_repository_url()}")
+
+    # DD environment parameters.
+    environment.append(f"BPE_DD_GIT_REPOSITORY_URL={revision.get_repository_url()}")
+    environment.append(f"BPE_DD_GIT_COMMIT_SHA={revision.long_commit}")
+
+    return environment
+
+
+def get_bp_oci_ref_name(codebase: Codebase) -> str:
+    if codebase.revision.tag:
+        return f"tag-{codebase.revision.tag}"
+
+    return f"commit-{codebase.revision.commit}"
@@ -1,6 +1,17 @@
+import json
+import os
+import tempfile
+import threading
 import time
+from contextlib import contextmanager
+from pathlib import Path
 from typing import List
 
+BUILD_DURATIONS_FILE = "BUILD_DURATIONS_FILE"
+DEFAULT_BUILD_DURATIONS_FILE = Path.home().joinpath(
+    ".cache", "ci-image-builder", "build-durations.json"
+)
+
 
 class Status:
     name: str
@@ -55,9 +66,33 @@ class Phase:
             self.end_time = time.time()
 
 
+class Span:
+    name: str
+    start_time: float
+    end_time: float | None
+
+    def __init__(self, name: str, start_time: float = None, end_time: float = None):
+        self.name = name
+        self.start_time = time.time() if start_time is None else start_time
+        self.end_time = end_time
+
+    def finish(self):
+        if self.end_time is None:
+            self.end_time = time.time()
+
+    @property
+    def duration(self) -> float | None:
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+
 class Progress:
     phases: List[Phase]
     phase: int
+    spans: List[Span]
+    critical_path: List[str]
+    start_time: float
 
     def __init__(self):
         self.phases = [
@@ -67,6 +102,10 @@ class Progress:
             Phase("deploy"),
         ]
         self.phase = 0
+        self.spans = []
+        self.critical_path = []
+        self.start_time = time.time()
+        self._lock = threading.Lock()
 
     def set_current_phase(self, phase_name: str):
         for index, phase in enumerate(self.phases):
@@ -86,3 +125,87 @@ class Progress:
 
     def current_phase_success(self):
         self.phases[self.phase].set_status(SuccessStatus())
+
+    def start_span(self, name: str) -> Span:
+        span = Span(name)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str):
+        span = self.start_span(name)
+        try:
+            yield span
+        finally:
+            span.finish()
+
+    def add_timings(self, prefix: str, timings: dict):
+        with self._lock:
+            for name, (start_time, duration) in timings.items():
+                self.spans.append(
+                    Span(f"{prefix}.{name}", start_time, start_time + duration)
+                )
+
+    def get_report(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_time)
+
+        return {
+            "started_at": self.start_time,
+            "duration": time.time() - self.start_time,
+            "phases": [
+                {
+                    "name": phase.name,
+                    "status": phase.status.name,
+                    "duration": (
+                        phase.end_time - phase.start_time
+                        if hasattr(phase, "start_time") and hasattr(phase, "end_time")
+                        else None
+                    ),
+                }
+                for phase in self.phases
+            ],
+            "spans": [
+                {
+                    "name": span.name,
+                    "start": span.start_time - self.start_time,
+                    "duration": span.duration,
+                }
+                for span in spans
+            ],
+            "critical_path": self.critical_path,
+        }
+
+    def write_report(self, path: str | Path):
+        Path(path).write_text(json.dumps(self.get_report(), indent=2))
+
+
+def get_build_durations_path() -> Path:
+    return Path(os.getenv(BUILD_DURATIONS_FILE) or DEFAULT_BUILD_DURATIONS_FILE)
+
+
+def get_build_duration(repository: str) -> float | None:
+    try:
+        durations = json.loads(get_build_durations_path().read_text())
+        return float(durations[repository])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def record_build_duration(repository: str, duration: float):
+    path = get_build_durations_path()
+    try:
+        durations = json.loads(path.read_text())
+    except (OSError, ValueError):
+        durations = {}
+    if not isinstance(durations, dict):
+        durations = {}
+    durations[repository] = duration
+
+    # Write then rename so a rebase reading the file never sees a partial write
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(handle, "w") as temporary_file:
+        temporary_file.write(json.dumps(durations))
+    os.replace(temporary_path, path)
@@ -1,6 +1,10 @@
 import subprocess
 
-from image_builder.docker import Docker
+from image_builder.credentials import get_registry_client
+from image_builder.credentials import login
+from image_builder.registry import RegistryError
+from image_builder.registry import copy_image_tags
+from image_builder.registry import split_repository
 
 
 def run_and_check_result(cmd):
@@ -10,13 +14,26 @@ def run_and_check_result(cmd):
 
 
 def publish_to_additional_repository(initial_repository, additional_repository, tags):
+    source_registry, source_repository = split_repository(initial_repository)
+    target_registry, target_repository = split_repository(additional_repository)
+
+    try:
+        source = get_registry_client(source_registry)
+        target = get_registry_client(target_registry)
+        copy_image_tags(source, source_repository, target, target_repository, tags)
+    except RegistryError as e:
+        print(f"Failed to copy image between registries, falling back to docker: {e}")
+        publish_with_docker(initial_repository, additional_repository, tags)
+
+
+def publish_with_docker(initial_repository, additional_repository, tags):
     for tag in tags:
         from_tag = f"{initial_repository}:{tag}"
         tag_cmd = ["docker", "pull", from_tag]
         print(f"Running command: {' '.join(tag_cmd)}")
         run_and_check_result(tag_cmd)
 
-    Docker.login(additional_repository.split("/")[0])
+    login([additional_repository.split("/")[0]])
 
     for tag in tags:
         from_tag = f"{initial_repository}:{tag}"
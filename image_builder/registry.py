@@ -0,0 +1,403 @@
+import base64
+import hashlib
+import json
+import re
+import threading
+from urllib.parse import urljoin
+
+import boto3
+import botocore
+import requests
+
+from image_builder.const import PUBLIC_REGISTRY
+
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+OCI_INDEX = "application/vnd.oci.image.index.v1+json"
+DOCKER_MANIFEST = "application/vnd.docker.distribution.manifest.v2+json"
+DOCKER_MANIFEST_LIST = "application/vnd.docker.distribution.manifest.list.v2+json"
+MANIFEST_MEDIA_TYPES = [OCI_MANIFEST, OCI_INDEX, DOCKER_MANIFEST, DOCKER_MANIFEST_LIST]
+INDEX_MEDIA_TYPES = [OCI_INDEX, DOCKER_MANIFEST_LIST]
+REQUEST_TIMEOUT = 60
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+# Image configs are content addressed, so can be shared by every client
+_image_configs = {}
+_image_configs_lock = threading.Lock()
+
+
+class RegistryError(Exception):
+    pass
+
+
+class RegistryRequestError(RegistryError):
+    pass
+
+
+class RegistryNotFoundError(RegistryRequestError):
+    pass
+
+
+class Manifest:
+    media_type: str
+    content: bytes
+
+    def __init__(self, media_type: str, content: bytes):
+        self.media_type = media_type
+        self.content = content
+
+    @property
+    def digest(self) -> str:
+        return f"sha256:{hashlib.sha256(self.content).hexdigest()}"
+
+    @property
+    def data(self) -> dict:
+        return json.loads(self.content)
+
+    def get_blob_digests(self) -> list:
+        data = self.data
+        return [data["config"]["digest"]] + [
+            layer["digest"] for layer in data.get("layers", [])
+        ]
+
+    def get_child_digests(self) -> list:
+        return [manifest["digest"] for manifest in self.data.get("manifests", [])]
+
+    def is_index(self) -> bool:
+        return self.media_type in INDEX_MEDIA_TYPES
+
+
+class BlobStream:
+    def __init__(self, response: requests.Response):
+        self.response = response
+        self.length = int(response.headers["Content-Length"])
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return self.response.iter_content(BLOB_CHUNK_SIZE)
+
+    def read(self, size=-1):
+        return self.response.raw.read(size if size > 0 else None)
+
+
+class RegistryClient:
+    registry: str
+
+    def __init__(self, registry: str, credentials: tuple = None):
+        self.registry = registry
+        self.credentials = credentials
+        self.session = requests.Session()
+        self._basic_token = None
+        self._tokens = {}
+
+        # Like docker, only talk plain HTTP to registries on this host
+        scheme = (
+            "http" if re.match(r"^(localhost|127\.0\.0\.1)(:|$)", registry) else "https"
+        )
+        self.url = f"{scheme}://{registry}"
+
+    def get_manifest(self, repository: str, reference: str) -> Manifest:
+        response = self._request(
+            "GET",
+            f"/v2/{repository}/manifests/{reference}",
+            [f"repository:{repository}:pull"],
+            headers={"Accept": ", ".join(MANIFEST_MEDIA_TYPES)},
+        )
+        return Manifest(response.headers["Content-Type"], response.content)
+
+    def put_manifest(self, repository: str, reference: str, manifest: Manifest):
+        self._request(
+            "PUT",
+            f"/v2/{repository}/manifests/{reference}",
+            [f"repository:{repository}:pull,push"],
+            headers={"Content-Type": manifest.media_type},
+            data=manifest.content,
+        )
+
+    def blob_exists(self, repository: str, digest: str) -> bool:
+        response = self._request(
+            "HEAD",
+            f"/v2/{repository}/blobs/{digest}",
+            [f"repository:{repository}:pull"],
+            allowed_statuses=[404],
+        )
+        return response.status_code == 200
+
+    def get_blob(self, repository: str, digest: str) -> requests.Response:
+        return self._request(
+            "GET",
+            f"/v2/{repository}/blobs/{digest}",
+            [f"repository:{repository}:pull"],
+            stream=True,
+        )
+
+    def mount_blob(self, repository: str, digest: str, from_repository: str) -> bool:
+        response = self._request(
+            "POST",
+            f"/v2/{repository}/blobs/uploads/",
+            [
+                f"repository:{repository}:pull,push",
+                f"repository:{from_repository}:pull",
+            ],
+            params={"mount": digest, "from": from_repository},
+        )
+        if response.status_code == 201:
+            return True
+
+        # The registry started a regular upload instead, so abandon it
+        self._request(
+            "DELETE",
+            urljoin(self.url, response.headers["Location"]),
+            [f"repository:{repository}:pull,push"],
+            allowed_statuses=[404],
+        )
+        return False
+
+    def upload_blob(self, repository: str, digest: str, blob: BlobStream):
+        scopes = [f"repository:{repository}:pull,push"]
+        response = self._request("POST", f"/v2/{repository}/blobs/uploads/", scopes)
+        self._request(
+            "PUT",
+            urljoin(self.url, response.headers["Location"]),
+            scopes,
+            params={"digest": digest},
+            headers={"Content-Type": "application/octet-stream"},
+            data=blob,
+        )
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        scopes: list,
+        allowed_statuses: list = None,
+        **kwargs,
+    ) -> requests.Response:
+        url = path if path.startswith("http") else f"{self.url}{path}"
+        headers = kwargs.pop("headers", {})
+        token = self._basic_token or self._tokens.get(" ".join(scopes))
+
+        try:
+            response = self.session.request(
+                method,
+                url,
+                headers={**headers, **self._authorization(token)},
+                timeout=REQUEST_TIMEOUT,
+                **kwargs,
+            )
+
+            if response.status_code == 401 and token is None:
+                token = self._authenticate(response, scopes)
+                response = self.session.request(
+                    method,
+                    url,
+                    headers={**headers, **self._authorization(token)},
+                    timeout=REQUEST_TIMEOUT,
+                    **kwargs,
+                )
+        except requests.RequestException as e:
+            raise RegistryRequestError(f"{method} {url} failed: {e}")
+
+        if response.status_code >= 400 and response.status_code not in (
+            allowed_statuses or []
+        ):
+            error = (
+                RegistryNotFoundError
+                if response.status_code == 404
+                else RegistryRequestError
+            )
+            raise error(
+                f"{method} {url} failed with {response.status_code}: {response.text}"
+            )
+
+        return response
+
+    def _authorization(self, token: str | None) -> dict:
+        if token is None:
+            return {}
+
+        return {"Authorization": token}
+
+    def _authenticate(self, response: requests.Response, scopes: list) -> str:
+        challenge = response.headers.get("WWW-Authenticate", "")
+        scheme, _, parameters = challenge.partition(" ")
+        parameters = dict(re.findall(r'(\w+)="([^"]*)"', parameters))
+
+        if scheme.lower() == "basic":
+            if self.credentials is None:
+                raise RegistryRequestError(f"No credentials for {self.registry}")
+            encoded = base64.b64encode(":".join(self.credentials).encode()).decode()
+            self._basic_token = f"Basic {encoded}"
+            return self._basic_token
+        elif scheme.lower() == "bearer":
+            token_response = self.session.get(
+                parameters["realm"],
+                params={"service": parameters.get("service"), "scope": scopes},
+                auth=self.credentials,
+                timeout=REQUEST_TIMEOUT,
+            )
+            if token_response.status_code != 200:
+                raise RegistryRequestError(
+                    f"Failed to get a token for {self.registry}: {token_response.text}"
+                )
+            token_data = token_response.json()
+            token = f"Bearer {token_data.get('token') or token_data['access_token']}"
+        else:
+            raise RegistryRequestError(
+                f"Unsupported authentication challenge from {self.registry}: {challenge}"
+            )
+
+        self._tokens[" ".join(scopes)] = token
+        return token
+
+
+def split_repository(repository: str) -> tuple[str, str]:
+    registry, _, name = repository.partition("/")
+    return registry, name
+
+
+def has_registry_credentials(registry: str) -> bool:
+    return registry == PUBLIC_REGISTRY or ".dkr.ecr." in registry
+
+
+def get_registry_credentials(registry: str) -> tuple | None:
+    if not has_registry_credentials(registry):
+        return None
+
+    try:
+        if registry == PUBLIC_REGISTRY:
+            response = boto3.client(
+                "ecr-public", region_name="us-east-1"
+            ).get_authorization_token()
+            token = response["authorizationData"]["authorizationToken"]
+        else:
+            account, _, _, region = registry.split(".")[0:4]
+            response = boto3.client("ecr", region_name=region).get_authorization_token(
+                registryIds=[account]
+            )
+            token = response["authorizationData"][0]["authorizationToken"]
+    except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+        raise RegistryError(f"Failed to get credentials for {registry}: {e}")
+
+    username, _, password = base64.b64decode(token).decode().partition(":")
+    return username, password
+
+
+def create_repository(repository: str):
+    registry, name = split_repository(repository)
+    if ".dkr.ecr." not in registry:
+        return
+
+    account, _, _, region = registry.split(".")[0:4]
+    client = boto3.client("ecr", region_name=region)
+    try:
+        # Only needs describe permissions when the repository already exists
+        client.describe_repositories(registryId=account, repositoryNames=[name])
+        return
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "RepositoryNotFoundException":
+            raise RegistryError(f"Failed to check repository {repository}: {e}")
+    except botocore.exceptions.BotoCoreError as e:
+        raise RegistryError(f"Failed to check repository {repository}: {e}")
+
+    try:
+        # Match the settings of the repositories the platform creates
+        client.create_repository(
+            registryId=account,
+            repositoryName=name,
+            imageScanningConfiguration={"scanOnPush": True},
+            imageTagMutability="IMMUTABLE",
+        )
+        print(f"Created ECR repository {repository}")
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "RepositoryAlreadyExistsException":
+            raise RegistryError(f"Failed to create repository {repository}: {e}")
+    except botocore.exceptions.BotoCoreError as e:
+        raise RegistryError(f"Failed to create repository {repository}: {e}")
+
+
+def get_image_config(
+    client: RegistryClient, repository: str, manifest: Manifest
+) -> dict:
+    if manifest.is_index():
+        raise RegistryError(f"{repository}@{manifest.digest} is a multi-platform image")
+
+    digest = manifest.data["config"]["digest"]
+    with _image_configs_lock:
+        if digest in _image_configs:
+            return _image_configs[digest]
+
+    config = client.get_blob(repository, digest).json()
+    with _image_configs_lock:
+        _image_configs[digest] = config
+    return config
+
+
+def get_image_labels(client: RegistryClient, repository: str, reference: str) -> dict:
+    manifest = client.get_manifest(repository, reference)
+    config = get_image_config(client, repository, manifest)
+    return config.get("config", {}).get("Labels") or {}
+
+
+def copy_blob(
+    source: RegistryClient,
+    source_repository: str,
+    target: RegistryClient,
+    target_repository: str,
+    digest: str,
+):
+    if target.blob_exists(target_repository, digest):
+        return
+
+    if source.registry == target.registry:
+        if target.mount_blob(target_repository, digest, source_repository):
+            return
+
+    target.upload_blob(
+        target_repository,
+        digest,
+        BlobStream(source.get_blob(source_repository, digest)),
+    )
+
+
+def copy_manifest(
+    source: RegistryClient,
+    source_repository: str,
+    target: RegistryClient,
+    target_repository: str,
+    manifest: Manifest,
+):
+    if manifest.is_index():
+        for child_digest in manifest.get_child_digests():
+            child = source.get_manifest(source_repository, child_digest)
+            copy_manifest(source, source_repository, target, target_repository, child)
+            target.put_manifest(target_repository, child_digest, child)
+        return
+
+    for digest in manifest.get_blob_digests():
+        copy_blob(source, source_repository, target, target_repository, digest)
+
+
+def copy_image_tags(
+    source: RegistryClient,
+    source_repository: str,
+    target: RegistryClient,
+    target_repository: str,
+    tags: list,
+):
+    manifests = {}
+    tags_by_digest = {}
+    for tag in tags:
+        manifest = source.get_manifest(source_repository, tag)
+        manifests[manifest.digest] = manifest
+        tags_by_digest.setdefault(manifest.digest, []).append(tag)
+
+    for digest, manifest in manifests.items():
+        print(
+            f"Copying {source.registry}/{source_repository}@{digest} to "
+            f"{target.registry}/{target_repository}"
+        )
+        copy_manifest(source, source_repository, target, target_repository, manifest)
+        for tag in tags_by_digest[digest]:
+            target.put_manifest(target_repository, tag, manifest)
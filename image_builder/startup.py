@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from image_builder.progress import Progress
+
+
+class StartupError(Exception):
+    pass
+
+
+class StartupDependencyError(StartupError):
+    pass
+
+
+class StartupTask:
+    name: str
+    function: Callable
+    dependencies: list
+    start_time: float | None
+    end_time: float | None
+
+    def __init__(self, name: str, function: Callable, dependencies: list):
+        self.name = name
+        self.function = function
+        self.dependencies = dependencies
+        self.future = Future()
+        self.start_time = None
+        self.end_time = None
+
+
+class Startup:
+    tasks: dict
+
+    def __init__(self, progress: Progress = None):
+        self.progress = progress
+        self.tasks = {}
+
+    def add(self, name: str, function: Callable, dependencies: list = None):
+        for dependency in dependencies or []:
+            if dependency not in self.tasks:
+                raise StartupError(f"{name} depends on unknown task {dependency}")
+        self.tasks[name] = StartupTask(name, function, dependencies or [])
+
+    def start(self):
+        for task in self.tasks.values():
+            threading.Thread(target=self._run, args=(task,), daemon=True).start()
+
+    def result(self, name: str):
+        return self.tasks[name].future.result()
+
+    def join(self) -> dict:
+        for task in self.tasks.values():
+            task.future.exception()
+
+        for task in self.tasks.values():
+            error = task.future.exception()
+            if error is not None and not isinstance(error, StartupDependencyError):
+                raise error
+
+        return {name: task.future.result() for name, task in self.tasks.items()}
+
+    def get_critical_path(self) -> list:
+        finished = [t for t in self.tasks.values() if t.end_time is not None]
+        if not finished:
+            return []
+
+        # Walk back from the last task to finish through whichever dependency
+        # finished last, as that is what it was waiting on
+        path = [max(finished, key=lambda t: t.end_time)]
+        while path[-1].dependencies:
+            path.append(
+                max(
+                    (self.tasks[d] for d in path[-1].dependencies),
+                    key=lambda t: t.end_time or 0,
+                )
+            )
+
+        return [task.name for task in reversed(path)]
+
+    def _run(self, task: StartupTask):
+        dependencies = [self.tasks[d].future for d in task.dependencies]
+        for dependency in dependencies:
+            if dependency.exception() is not None:
+                task.future.set_exception(
+                    StartupDependencyError(f"{task.name} dependency failed")
+                )
+                return
+
+        task.start_time = time.time()
+        try:
+            if self.progress is not None:
+                with self.progress.span(task.name):
+                    result = task.function(*[d.result() for d in dependencies])
+            else:
+                result = task.function(*[d.result() for d in dependencies])
+        except BaseException as e:
+            task.future.set_exception(e)
+            return
+        finally:
+            task.end_time = time.time()
+
+        task.future.set_result(result)
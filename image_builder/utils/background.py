@@ -0,0 +1,16 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+
+def run_in_background(function: Callable, *args) -> Future:
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
@@ -0,0 +1,76 @@
+import codecs
+import selectors
+import subprocess
+from typing import Callable
+
+ERROR_OUTPUT_SIZE = 2500
+READ_SIZE = 65536
+
+
+class RingBuffer:
+    size: int
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = ""
+
+    def write(self, data: str):
+        self._data = (self._data + data)[-self.size :]
+
+    def __str__(self):
+        return self._data
+
+
+class OutputReader:
+    def __init__(
+        self,
+        proc: subprocess.Popen,
+        on_line: Callable = None,
+        error_size: int = ERROR_OUTPUT_SIZE,
+        prefix: str = "",
+    ):
+        self.proc = proc
+        self.on_line = on_line
+        self.prefix = prefix
+        self.error = RingBuffer(error_size)
+        self._line = ""
+
+    def read(self):
+        selector = selectors.DefaultSelector()
+        decoders = {}
+        for stream in [self.proc.stdout, self.proc.stderr]:
+            if stream is not None:
+                # Read bytes whether or not the pipe was opened in text mode
+                selector.register(
+                    stream, selectors.EVENT_READ, getattr(stream, "buffer", stream)
+                )
+                decoders[stream] = codecs.getincrementaldecoder("utf-8")("replace")
+
+        # Drain both pipes as data arrives so neither can fill up and block the process
+        while selector.get_map():
+            for key, _ in selector.select():
+                chunk = key.data.read1(READ_SIZE)
+                final = not chunk
+                if final:
+                    selector.unregister(key.fileobj)
+
+                text = decoders[key.fileobj].decode(chunk, final)
+                if key.fileobj is self.proc.stderr:
+                    self.error.write(text)
+                else:
+                    self._write_output(text, final)
+
+        selector.close()
+        self.proc.wait()
+
+    def _write_output(self, text: str, final: bool):
+        lines = (self._line + text).split("\n")
+        self._line = lines.pop()
+        if final and self._line:
+            lines.append(self._line)
+            self._line = ""
+
+        for line in lines:
+            print(f"{self.prefix}{line}")
+            if self.on_line is not None:
+                self.on_line(line)
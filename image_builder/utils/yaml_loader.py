@@ -0,0 +1,11 @@
+import yaml
+
+try:
+    # libyaml is several times faster than the pure Python loader
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def yaml_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
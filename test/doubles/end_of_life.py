@@ -1,7 +1,7 @@
 import json
 
 
-def get_versions(url: str):
+def get_versions(url: str, **kwargs):
     if "nodejs" in url:
         return EndOfLifeResponse("nodejs", 200)
 
@@ -24,3 +24,6 @@ class StubbedProcess:
             return returncode
 
         return self._returncode
+
+    def wait(self):
+        return self._returncode
@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+MANIFEST_PATH = re.compile(r"^/v2/(.+)/manifests/([^/]+)$")
+BLOB_PATH = re.compile(r"^/v2/(.+)/blobs/(sha256:[0-9a-f]+)$")
+UPLOAD_PATH = re.compile(r"^/v2/(.+)/blobs/uploads/([^/]*)$")
+
+
+def digest_of(content: bytes) -> str:
+    return f"sha256:{hashlib.sha256(content).hexdigest()}"
+
+
+class FakeRegistry:
+    def __init__(self, credentials: tuple = None):
+        self.credentials = credentials
+        self.blobs = {}
+        self.repository_blobs = {}
+        self.manifests = {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_blob(self, repository: str, content: bytes) -> str:
+        digest = digest_of(content)
+        self.blobs[digest] = content
+        self.repository_blobs.setdefault(repository, set()).add(digest)
+        return digest
+
+    def add_image(
+        self, repository: str, tags: list, layers: list, labels: dict = None
+    ) -> str:
+        config = json.dumps(
+            {
+                "architecture": "amd64",
+                "layers": len(layers),
+                "config": {"Labels": labels or {}},
+            }
+        ).encode()
+        manifest = json.dumps(
+            {
+                "schemaVersion": 2,
+                "mediaType": "application/vnd.oci.image.manifest.v1+json",
+                "config": {
+                    "mediaType": "application/vnd.oci.image.config.v1+json",
+                    "digest": self.add_blob(repository, config),
+                    "size": len(config),
+                },
+                "layers": [
+                    {
+                        "mediaType": "application/vnd.oci.image.layer.v1.tar+gzip",
+                        "digest": self.add_blob(repository, layer),
+                        "size": len(layer),
+                    }
+                    for layer in layers
+                ],
+            }
+        ).encode()
+        for reference in tags + [digest_of(manifest)]:
+            self.manifests[(repository, reference)] = (
+                "application/vnd.oci.image.manifest.v1+json",
+                manifest,
+            )
+        return digest_of(manifest)
+
+    def requests_matching(self, method: str, pattern: str) -> list:
+        return [
+            path
+            for request_method, path in self.requests
+            if request_method == method and re.search(pattern, path)
+        ]
+
+    def _handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self._handle("HEAD")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def _handle(self, method):
+                registry.requests.append((method, self.path))
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+                if registry.credentials is not None and not self._authorized():
+                    return self._respond(
+                        401, headers={"WWW-Authenticate": 'Basic realm="fake"'}
+                    )
+
+                if match := MANIFEST_PATH.match(url.path):
+                    return self._manifest(method, *match.groups())
+                if match := UPLOAD_PATH.match(url.path):
+                    return self._upload(method, *match.groups(), query)
+                if match := BLOB_PATH.match(url.path):
+                    return self._blob(method, *match.groups())
+
+                self._respond(404)
+
+            def _authorized(self):
+                expected = base64.b64encode(
+                    ":".join(registry.credentials).encode()
+                ).decode()
+                return self.headers.get("Authorization") == f"Basic {expected}"
+
+            def _manifest(self, method, repository, reference):
+                if method == "PUT":
+                    content = self._read_body()
+                    media_type = self.headers["Content-Type"]
+                    for ref in [reference, digest_of(content)]:
+                        registry.manifests[(repository, ref)] = (media_type, content)
+                    return self._respond(201)
+
+                if (repository, reference) not in registry.manifests:
+                    return self._respond(404)
+
+                media_type, content = registry.manifests[(repository, reference)]
+                self._respond(
+                    200, content, {"Content-Type": media_type}, method == "HEAD"
+                )
+
+            def _blob(self, method, repository, digest):
+                if digest not in registry.repository_blobs.get(repository, set()):
+                    return self._respond(404)
+
+                content = registry.blobs[digest]
+                self._respond(
+                    200,
+                    content,
+                    {"Content-Type": "application/octet-stream"},
+                    method == "HEAD",
+                )
+
+            def _upload(self, method, repository, upload_id, query):
+                if method == "POST":
+                    mount, source = query.get("mount"), query.get("from")
+                    if mount and mount in registry.repository_blobs.get(source, set()):
+                        registry.repository_blobs.setdefault(repository, set()).add(
+                            mount
+                        )
+                        return self._respond(201)
+                    location = f"/v2/{repository}/blobs/uploads/{uuid.uuid4()}"
+                    return self._respond(202, headers={"Location": location})
+
+                if method == "DELETE":
+                    return self._respond(204)
+
+                content = self._read_body()
+                if digest_of(content) != query.get("digest"):
+                    return self._respond(400)
+                registry.blobs[query["digest"]] = content
+                registry.repository_blobs.setdefault(repository, set()).add(
+                    query["digest"]
+                )
+                self._respond(201)
+
+            def _read_body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _respond(self, status, content=b"", headers=None, head=False):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(content)
+
+        return Handler
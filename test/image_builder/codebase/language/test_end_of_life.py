@@ -1,8 +1,15 @@
+import os
 import unittest
+from pathlib import Path
+from test.base_test_case import BaseTestCase
 from test.doubles.end_of_life import get_versions
+from unittest.mock import ANY
 from unittest.mock import patch
 
 import pytest
+import requests
+from freezegun import freeze_time
+from parameterized import parameterized
 
 from image_builder.codebase.language import end_of_life
 from image_builder.codebase.language.end_of_life import is_end_of_life
@@ -14,28 +21,36 @@ class TestEndOfLifeLatestVersion(unittest.TestCase):
         with pytest.raises(end_of_life.EndOfLifeNoProductError):
             end_of_life.get_latest_version_for("not-a-product")
 
-        requests_get.assert_called_with("https://endoflife.date/api/not-a-product.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/not-a-product.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_when_a_product_exists(self, requests_get):
         version = end_of_life.get_latest_version_for("nodejs")
 
         self.assertEqual(version, "20.8")
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_when_looking_for_non_lts_versions(self, requests_get):
         version = end_of_life.get_latest_version_for("nodejs", False)
 
         self.assertEqual(version, "21.0")
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_when_looking_for_specific_versions(self, requests_get):
         version = end_of_life.get_latest_version_for("python", False, "3.11")
 
         self.assertEqual(version, "3.11")
-        requests_get.assert_called_with("https://endoflife.date/api/python.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/python.json", timeout=10
+        )
 
 
 class TestEndOfLifeVersionIsEndOfLife(unittest.TestCase):
@@ -50,3 +65,88 @@ class TestEndOfLifeVersionIsEndOfLife(unittest.TestCase):
     @patch("requests.get", wraps=get_versions)
     def test_when_a_version_is_not_end_of_life(self, requests_get):
         self.assertEqual(is_end_of_life("python", "3.11"), False)
+
+
+class TestEndOfLifeCache(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.setUpPyfakefs()
+        self.fs.add_real_file(end_of_life.SNAPSHOT_PATH)
+        os.environ["END_OF_LIFE_CACHE_DIR"] = "/cache/end_of_life"
+
+    def tearDown(self):
+        os.environ.pop("END_OF_LIFE_CACHE_DIR", None)
+        os.environ.pop("END_OF_LIFE_CACHE_TTL", None)
+        os.environ.pop("END_OF_LIFE_OFFLINE", None)
+        super().tearDown()
+
+    @patch("requests.get", wraps=get_versions)
+    def test_versions_are_cached_on_disk(self, requests_get):
+        end_of_life.get_latest_version_for("python", False)
+        end_of_life.get_latest_version_for("python", False)
+
+        requests_get.assert_called_once_with(
+            "https://endoflife.date/api/python.json", timeout=10
+        )
+        self.assertTrue(Path("/cache/end_of_life/python.json").exists())
+
+    @patch("threading.Thread")
+    @patch("requests.get", wraps=get_versions)
+    def test_stale_versions_are_served_while_revalidating(self, requests_get, thread):
+        os.environ["END_OF_LIFE_CACHE_TTL"] = "60"
+        cache = end_of_life.EndOfLifeCache("/cache/end_of_life")
+        with freeze_time("2025-04-14 10:00:00"):
+            cache.write("python", [{"cycle": "3.9", "latest": "3.9.1", "eol": False}])
+
+        version = end_of_life.get_latest_version_for("python", False)
+
+        self.assertEqual(version, "3.9")
+        requests_get.assert_not_called()
+        thread.assert_called_once_with(
+            target=end_of_life.refresh_cached_versions,
+            args=(ANY, "python"),
+            daemon=True,
+        )
+        thread().start.assert_called_once()
+
+    @parameterized.expand([("{}",), ('{"fetched_at": 0}',), ("[]",), ("null",)])
+    @patch("requests.get", wraps=get_versions)
+    def test_malformed_cache_entries_are_refetched(self, contents, requests_get):
+        self.fs.create_file("/cache/end_of_life/python.json", contents=contents)
+
+        end_of_life.get_latest_version_for("python", False)
+
+        requests_get.assert_called_once()
+        self.assertIsInstance(
+            end_of_life.EndOfLifeCache("/cache/end_of_life").read("python")[0], list
+        )
+
+    def test_an_invalid_ttl_uses_the_default(self):
+        os.environ["END_OF_LIFE_CACHE_TTL"] = "1d"
+
+        self.assertEqual(end_of_life.get_cache().ttl, end_of_life.DEFAULT_CACHE_TTL)
+
+    @parameterized.expand([(True,), (False,)])
+    @patch("builtins.print")
+    @patch("requests.get", side_effect=requests.ConnectionError("timed out"))
+    def test_falls_back_to_snapshot_when_endoflife_is_unavailable(
+        self, cached, requests_get, mock_print
+    ):
+        if not cached:
+            os.environ.pop("END_OF_LIFE_CACHE_DIR")
+
+        version = end_of_life.get_latest_version_for("python", False, "3.11")
+
+        self.assertEqual(version, "3.11")
+        self.assertFalse(Path("/cache/end_of_life/python.json").exists())
+        mock_print.assert_called_once_with(
+            "Could not reach endoflife.date for python, "
+            "using the bundled snapshot: timed out"
+        )
+
+    @patch("requests.get")
+    def test_offline_mode_uses_snapshot(self, requests_get):
+        os.environ["END_OF_LIFE_OFFLINE"] = "true"
+
+        self.assertEqual(is_end_of_life("python", "3.8"), True)
+        requests_get.assert_not_called()
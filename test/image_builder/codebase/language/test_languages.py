@@ -27,7 +27,9 @@ class TestDetectingCodebaseLanguages(BaseTestCase):
         self.assertEqual(languages["python"].name, "python")
         self.assertEqual(languages["python"].version, "3.11")
         self.assertEqual(languages["python"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/python.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/python.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_only_nodejs(self, requests_get):
@@ -38,7 +40,9 @@ class TestDetectingCodebaseLanguages(BaseTestCase):
         self.assertEqual(languages["nodejs"].name, "nodejs")
         self.assertEqual(languages["nodejs"].version, "18")
         self.assertEqual(languages["nodejs"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_only_ruby(self, requests_get):
@@ -49,7 +53,9 @@ class TestDetectingCodebaseLanguages(BaseTestCase):
         self.assertEqual(languages["ruby"].name, "ruby")
         self.assertEqual(languages["ruby"].version, "3.3")
         self.assertEqual(languages["ruby"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/ruby.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/ruby.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_only_php(self, requests_get):
@@ -60,7 +66,9 @@ class TestDetectingCodebaseLanguages(BaseTestCase):
         self.assertEqual(languages["php"].name, "php")
         self.assertEqual(languages["php"].version, "8.3")
         self.assertEqual(languages["php"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/php.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/php.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_all_languages(self, requests_get):
@@ -74,22 +82,44 @@ class TestDetectingCodebaseLanguages(BaseTestCase):
         self.assertEqual(languages["python"].name, "python")
         self.assertEqual(languages["python"].version, "3.11")
         self.assertEqual(languages["python"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/python.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/python.json", timeout=10
+        )
 
         self.assertEqual(languages["nodejs"].name, "nodejs")
         self.assertEqual(languages["nodejs"].version, "18")
         self.assertEqual(languages["nodejs"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
 
         self.assertEqual(languages["ruby"].name, "ruby")
         self.assertEqual(languages["ruby"].version, "3.3")
         self.assertEqual(languages["ruby"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/ruby.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/ruby.json", timeout=10
+        )
 
         self.assertEqual(languages["php"].name, "php")
         self.assertEqual(languages["php"].version, "8.3")
         self.assertEqual(languages["php"].end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/php.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/php.json", timeout=10
+        )
+
+    @patch("requests.get", wraps=get_versions)
+    def test_languages_keep_their_order_and_record_timings(self, requests_get):
+        create_php_indicator(self.fs, "8.3.1")
+        create_ruby_indicator(self.fs, "3.3.2")
+        create_python_indicator(self.fs, "3.11.x", "runtime")
+
+        languages = load_codebase_languages(Path("."))
+
+        self.assertEqual(list(languages.keys()), ["python", "ruby", "php"])
+        self.assertEqual(str(languages), "python@3.11, ruby@3.3, php@8.3")
+        self.assertEqual(
+            list(languages.timings.keys()), ["python", "nodejs", "ruby", "php"]
+        )
 
 
 class TestBaseLanguageClass(BaseTestCase):
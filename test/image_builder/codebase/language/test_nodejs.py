@@ -46,7 +46,9 @@ class TestCodebaseLanguageNodeJS(BaseTestCase):
         self.assertEqual(language.name, "nodejs")
         self.assertEqual(language.version, output_version)
         self.assertEqual(language.end_of_life, eol)
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
 
     @patch("requests.get", wraps=get_versions)
     def test_getting_nodejs_version_when_no_version_present(self, requests_get):
@@ -57,4 +59,6 @@ class TestCodebaseLanguageNodeJS(BaseTestCase):
         self.assertEqual(language.name, "nodejs")
         self.assertEqual(language.version, "20")
         self.assertEqual(language.end_of_life, False)
-        requests_get.assert_called_with("https://endoflife.date/api/nodejs.json")
+        requests_get.assert_called_with(
+            "https://endoflife.date/api/nodejs.json", timeout=10
+        )
@@ -1,4 +1,5 @@
 import os
+import time
 from pathlib import Path
 from test.base_test_case import BaseTestCase
 from test.doubles.codebase import load_codebase_languages_double
@@ -6,6 +7,7 @@ from test.doubles.codebase import load_codebase_processes_double
 from test.doubles.codebase import load_codebase_revision_double
 from unittest.mock import patch
 
+from freezegun import freeze_time
 from yaml import dump
 
 from image_builder.codebase.codebase import Codebase
@@ -80,6 +82,33 @@ class TestCodebase(BaseTestCase):
         self.assertEqual(codebase.processes[0].name, "web")
         self.assertEqual(codebase.processes[0].commands, ["django serve"])
 
+    def test_loading_codebase_records_timings(
+        self, load_codebase_revision, load_codebase_processes, get_codebase_languages
+    ):
+        codebase = Codebase(Path("."))
+
+        self.assertEqual(
+            sorted(codebase.timings.keys()),
+            ["builder", "configuration", "languages", "processes", "revision"],
+        )
+
+    def test_loading_codebase_records_when_each_loader_started(
+        self, load_codebase_revision, load_codebase_processes, get_codebase_languages
+    ):
+        with freeze_time("2025-04-14 12:26:00") as frozen_time:
+
+            def load_revision(path):
+                frozen_time.tick(2)
+                return load_codebase_revision_double(path)
+
+            load_codebase_revision.side_effect = load_revision
+            start_time = time.time()
+
+            codebase = Codebase(Path("."))
+
+        self.assertEqual(codebase.timings["revision"], (start_time, 2))
+        self.assertEqual(codebase.timings["processes"], (start_time + 2, 0))
+
     def test_codebase_setup(
         self, load_codebase_revision, load_codebase_processes, get_codebase_languages
     ):
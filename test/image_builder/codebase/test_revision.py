@@ -1,4 +1,5 @@
 import os
+import subprocess
 from pathlib import Path
 from test.base_test_case import BaseTestCase
 from test.doubles.codebase import load_codebase_languages_double
@@ -16,32 +17,45 @@ from image_builder.codebase.revision import CodebaseRevisionNoDataError
 from image_builder.codebase.revision import load_codebase_revision
 
 
-def git_revision_command(
-    short_commit="shorthash",
+def git_log_command(short_commit="shorthash", long_commit="longhash"):
+    return StubbedProcess(stdout=f"{short_commit} {long_commit}\n".encode())
+
+
+def create_git_data(
+    fs,
     long_commit="longhash",
     branch: str | None = "main",
-    repository="git@github.com:org/repo.git",
+    repository: str | None = "git@github.com:org/repo.git",
     tag: str | None = "2.0.0",
+    packed=False,
 ):
-    def get_git_revision_data(command, shell=None, stdout=None):
-        if command == "git rev-parse --short HEAD":
-            return StubbedProcess(stdout=f"{short_commit}\n".encode())
-        if command == "git rev-parse HEAD":
-            return StubbedProcess(stdout=f"{long_commit}\n".encode())
-        if command == "git show-ref --tags" and tag is not None:
-            return StubbedProcess(
-                stdout=f"longhash refs/tags/{tag}\notherhash refs/tags/1.0.0".encode()
-            )
-        if command == "git show-ref --heads" and branch is not None:
-            return StubbedProcess(
-                stdout=f"longhash refs/heads/{branch}\notherhash refs/heads/other".encode()
-            )
-        if command == "git ls-remote --get-url origin":
-            return StubbedProcess(stdout=f"{repository}\n".encode())
-        else:
-            return StubbedProcess(stdout="".encode())
-
-    return get_git_revision_data
+    refs = {
+        "refs/heads/other": "otherhash",
+        "refs/tags/1.0.0": "otherhash",
+    }
+    if branch is not None:
+        refs[f"refs/heads/{branch}"] = long_commit
+    if tag is not None:
+        refs[f"refs/tags/{tag}"] = long_commit
+
+    fs.create_file(".git/HEAD", contents=f"{long_commit}\n")
+    if packed:
+        fs.create_file(
+            ".git/packed-refs",
+            contents="# pack-refs with: peeled fully-peeled sorted\n"
+            + "".join(f"{commit} {ref}\n" for ref, commit in sorted(refs.items())),
+        )
+    else:
+        for ref, commit in refs.items():
+            fs.create_file(f".git/{ref}", contents=f"{commit}\n")
+
+    if repository is not None:
+        fs.create_file(
+            ".git/config",
+            contents="[core]\n\tbare = false\n"
+            f'[remote "origin"]\n\turl = {repository}\n'
+            "\tfetch = +refs/heads/*:refs/remotes/origin/*\n",
+        )
 
 
 class TestCodebaseRevision(BaseTestCase):
@@ -49,9 +63,9 @@ class TestCodebaseRevision(BaseTestCase):
         super().setUp()
         self.setUpPyfakefs()
 
-    @patch("subprocess.run", wraps=git_revision_command())
+    @patch("subprocess.run", return_value=git_log_command())
     def test_loading_revision_information(self, run):
-        self.fs.create_dir(".git")
+        create_git_data(self.fs)
         revision = load_codebase_revision(Path("."))
 
         self.assertEqual(revision.commit, "shorthash")
@@ -60,39 +74,120 @@ class TestCodebaseRevision(BaseTestCase):
         self.assertEqual(revision.tag, "2.0.0")
         self.assertEqual(revision.get_repository_name(), "org/repo")
         self.assertEqual(revision.get_repository_url(), "https://github.com/org/repo")
+        run.assert_called_once_with(
+            ["git", "log", "-1", "--format=%h %H"],
+            cwd=Path("."),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
 
-    @patch(
-        "subprocess.run",
-        wraps=git_revision_command(repository="https://github.com/org/repo.git"),
-    )
+    @patch("subprocess.run", return_value=git_log_command())
+    def test_loading_revision_information_from_packed_refs(self, run):
+        create_git_data(self.fs, packed=True)
+        revision = load_codebase_revision(Path("."))
+
+        self.assertEqual(revision.branch, "main")
+        self.assertEqual(revision.tag, "2.0.0")
+
+    @patch("subprocess.run", return_value=git_log_command())
+    def test_loose_refs_take_precedence_over_packed_refs(self, run):
+        create_git_data(self.fs, packed=True)
+        self.fs.create_file(".git/refs/tags/2.0.0", contents="movedhash\n")
+        revision = load_codebase_revision(Path("."))
+
+        self.assertEqual(revision.branch, "main")
+        self.assertEqual(revision.tag, None)
+
+    @patch("subprocess.run", return_value=git_log_command())
+    def test_loading_revision_information_from_worktree(self, run):
+        self.fs.create_dir("/repo/.git/worktrees/feature")
+        self.fs.create_file(
+            "/repo/.git/worktrees/feature/commondir", contents="../..\n"
+        )
+        self.fs.create_file("/repo/.git/refs/heads/feature", contents="longhash\n")
+        self.fs.create_file(
+            "/repo/.git/config",
+            contents='[remote "origin"]\n\turl = git@github.com:org/repo.git\n',
+        )
+        self.fs.create_file(
+            "/feature/.git", contents="gitdir: /repo/.git/worktrees/feature\n"
+        )
+        revision = load_codebase_revision(Path("/feature"))
+
+        self.assertEqual(revision.branch, "feature")
+        self.assertEqual(revision.get_repository_name(), "org/repo")
+
+    @patch("subprocess.run", return_value=git_log_command())
     def test_loading_revision_information_https_url(self, run):
-        self.fs.create_dir(".git")
+        create_git_data(self.fs, repository="https://github.com/org/repo.git")
         revision = load_codebase_revision(Path("."))
         self.assertEqual(revision.get_repository_name(), "org/repo")
         self.assertEqual(revision.get_repository_url(), "https://github.com/org/repo")
 
+    @patch("subprocess.run", return_value=git_log_command())
+    def test_loading_revision_information_with_uppercase_keys(self, run):
+        create_git_data(self.fs, repository=None)
+        self.fs.create_file(
+            ".git/config",
+            contents='[Remote "origin"]\n\tURL = "git@github.com:org/repo.git"\n',
+        )
+        revision = load_codebase_revision(Path("."))
+        self.assertEqual(revision.remote, "git@github.com:org/repo.git")
+
+    @patch("subprocess.run", return_value=git_log_command())
+    def test_loading_revision_information_with_instead_of_rewrites(self, run):
+        create_git_data(self.fs, repository=None)
+        self.fs.create_file(
+            ".git/config",
+            contents='[remote "origin"]\n\turl = gh:org/repo.git\n'
+            '[url "https://example.com/"]\n\tinsteadOf = g\n'
+            '[url "https://github.com/"]\n\tinsteadOf = gh:\n',
+        )
+        revision = load_codebase_revision(Path("."))
+        self.assertEqual(revision.remote, "https://github.com/org/repo.git")
+        self.assertEqual(revision.get_repository_name(), "org/repo")
+
     @patch(
-        "subprocess.run", wraps=git_revision_command(branch="slash/separated/branch")
+        "subprocess.run",
+        side_effect=[
+            git_log_command(),
+            StubbedProcess(stdout=b"https://github.com/org/repo.git\n"),
+        ],
     )
+    def test_loading_revision_information_with_included_config(self, run):
+        create_git_data(self.fs, repository=None)
+        self.fs.create_file(
+            ".git/config", contents="[include]\n\tpath = ../remotes.config\n"
+        )
+        revision = load_codebase_revision(Path("."))
+        self.assertEqual(revision.remote, "https://github.com/org/repo.git")
+        run.assert_called_with(
+            ["git", "ls-remote", "--get-url", "origin"],
+            cwd=Path("."),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    @patch("subprocess.run", return_value=git_log_command())
     def test_loading_revision_information_slash_separated_branch(self, run):
-        self.fs.create_dir(".git")
+        create_git_data(self.fs, branch="slash/separated/branch")
         revision = load_codebase_revision(Path("."))
         self.assertEqual(revision.branch, "slash/separated/branch")
         self.assertEqual(revision.get_repository_name(), "org/repo")
         self.assertEqual(revision.get_repository_url(), "https://github.com/org/repo")
 
-    @patch("subprocess.run", wraps=git_revision_command(branch=None, tag=None))
+    @patch("subprocess.run", return_value=git_log_command())
     def test_loading_revision_information_codebuild_branch(self, run):
-        self.fs.create_dir(".git")
+        create_git_data(self.fs, branch=None, tag=None)
         os.environ["CODEBUILD_WEBHOOK_TRIGGER"] = "branch/feat/tests"
         revision = load_codebase_revision(Path("."))
         self.assertEqual(revision.branch, "feat/tests")
         self.assertEqual(revision.tag, None)
         del os.environ["CODEBUILD_WEBHOOK_TRIGGER"]
 
-    @patch("subprocess.run", wraps=git_revision_command(branch=None, tag=None))
+    @patch("subprocess.run", return_value=git_log_command())
     def test_loading_revision_information_codebuild_tag(self, run):
-        self.fs.create_dir(".git")
+        create_git_data(self.fs, branch=None, tag=None)
         os.environ["CODEBUILD_WEBHOOK_TRIGGER"] = "tag/1.0.0"
         revision = load_codebase_revision(Path("."))
         self.assertEqual(revision.branch, None)
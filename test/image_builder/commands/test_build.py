@@ -5,14 +5,19 @@ from test.doubles.codebase import load_codebase_languages_double
 from test.doubles.codebase import load_codebase_processes_double
 from test.doubles.codebase import load_codebase_revision_double
 from unittest.mock import ANY
+from unittest.mock import MagicMock
 from unittest.mock import call
 from unittest.mock import patch
 
 from click.testing import CliRunner
 
 from image_builder.commands.build import build
+from image_builder.configuration.codebase import Cache
 from image_builder.const import ADDITIONAL_ECR_REPO
 from image_builder.const import ECR_REPO
+from image_builder.docker import DockerStartTimeoutError
+from image_builder.packages import PackagesBuildError
+from image_builder.plan import BuildPlan
 
 
 @patch("image_builder.commands.build.Progress")
@@ -21,6 +26,30 @@ from image_builder.const import ECR_REPO
 @patch("image_builder.commands.build.Docker")
 @patch("image_builder.commands.build.Pack")
 class TestBuildCommand(unittest.TestCase):
+    def setUp(self):
+        login = patch("image_builder.commands.build.login")
+        self.login = login.start()
+        self.addCleanup(login.stop)
+        packages_exist = patch(
+            "image_builder.packages.PackagesImages.exists", return_value=False
+        )
+        self.packages_exist = packages_exist.start()
+        self.addCleanup(packages_exist.stop)
+        resolve_packages_bases = patch(
+            "image_builder.packages.resolve_builder_images",
+            return_value=("builder@sha256:builder", "run@sha256:run"),
+        )
+        self.resolve_packages_bases = resolve_packages_bases.start()
+        self.addCleanup(resolve_packages_bases.stop)
+        build_packages = patch("image_builder.packages.PackagesImages.build")
+        self.build_packages = build_packages.start()
+        self.addCleanup(build_packages.stop)
+        record_build_duration = patch(
+            "image_builder.commands.build.record_build_duration"
+        )
+        self.record_build_duration = record_build_duration.start()
+        self.addCleanup(record_build_duration.stop)
+
     @staticmethod
     def setup_mocks(pack, docker, codebase, notify, progress):
         os.environ[ECR_REPO] = "ecr/test-repository"
@@ -38,19 +67,17 @@ class TestBuildCommand(unittest.TestCase):
             "revision_commit": "commit-sha",
             "repository_url": "https://github.com/org/repo",
         }
-        pack().get_buildpacks.return_value = [
-            "fagiani/apt",
-            "paketo-buildpacks/git",
-            "paketo-buildpacks/python",
-            "fagiani/run",
-        ]
+        codebase().build.packages = ["graphviz"]
+        codebase().build.packs = []
 
     @staticmethod
-    def run_build(publish=False, with_runner_image=None):
+    def run_build(publish=False, with_runner_image=None, process_images=False):
         runner = CliRunner()
         args = ["--send-notifications"]
         if publish:
             args.append("--publish")
+        if process_images:
+            args.append("--process-images")
         if with_runner_image:
             args.append("--with-runner-image")
             args.append(with_runner_image)
@@ -71,15 +98,19 @@ class TestBuildCommand(unittest.TestCase):
         self.assertNotIn("Pushing image to additional ECR repository:", result.output)
         self.assertIn("Found processes: ['web']", result.output)
         self.assertIn("Found languages: python@3.11, nodejs@20.7", result.output)
-        self.assertIn("Using builder: test-builder@0000000", result.output)
+        self.assertIn("Using builder: test-builder:0000000", result.output)
         self.assertIn(
-            "Using buildpacks: ['fagiani/apt', 'paketo-buildpacks/git', "
-            "'paketo-buildpacks/python', 'fagiani/run']",
+            "Using buildpacks: ['paketo-buildpacks/git', 'fagiani/apt', "
+            "'paketo-buildpacks/python', 'paketo-buildpacks/nodejs', "
+            "'paketo-buildpacks/ruby', 'paketo-buildpacks/php', 'fagiani/run', "
+            "'paketo-buildpacks/image-labels@4.9.0', "
+            "'paketo-buildpacks/environment-variables@4.9.0']",
             result.output,
         )
 
         pack().build.assert_called_once_with(False, ANY, ANY, None)
         pack().codebase.setup.assert_called()
+        self.record_build_duration.assert_not_called()
         progress().set_current_phase.assert_has_calls([])
         notify().post_build_progress.assert_has_calls([call(ANY, ANY)] * 2)
 
@@ -111,18 +142,88 @@ class TestBuildCommand(unittest.TestCase):
         )
         self.assertIn("Found processes: ['web']", result.output)
         self.assertIn("Found languages: python@3.11, nodejs@20.7", result.output)
-        self.assertIn("Using builder: test-builder@0000000", result.output)
+        self.assertIn("Using builder: test-builder:0000000", result.output)
         self.assertIn(
-            "Using buildpacks: ['fagiani/apt', 'paketo-buildpacks/git', "
-            "'paketo-buildpacks/python', 'fagiani/run']",
+            "Using buildpacks: ['paketo-buildpacks/git', 'fagiani/apt', "
+            "'paketo-buildpacks/python', 'paketo-buildpacks/nodejs', "
+            "'paketo-buildpacks/ruby', 'paketo-buildpacks/php', 'fagiani/run', "
+            "'paketo-buildpacks/image-labels@4.9.0', "
+            "'paketo-buildpacks/environment-variables@4.9.0']",
             result.output,
         )
 
         pack().build.assert_called_once_with(True, ANY, ANY, ANY)
+        self.record_build_duration.assert_called_once_with("ecr/test-repository", ANY)
+        self.login.assert_called_once_with(["ecr", "add"])
+        pack().resolve_images.assert_called_once_with(None)
+        pack().load_cached_builder.assert_called_once()
+        pack().pull_images.assert_called_once()
         pack().codebase.setup.assert_called()
         progress().set_current_phase.assert_has_calls([])
         notify().post_build_progress.assert_has_calls([call(ANY, ANY)] * 2)
 
+    def test_build_with_prebuilt_packages_images(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        self.packages_exist.return_value = True
+
+        result = self.run_build(publish=True)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Using prebuilt packages images: ", result.output)
+        plan = next(c.kwargs["plan"] for c in pack.call_args_list if c.kwargs)
+        self.assertRegex(plan.builder, r"^ecr/test-repository:packages-build-\w{64}$")
+        self.assertRegex(plan.run_image, r"^ecr/test-repository:packages-run-\w{64}$")
+        self.assertNotIn("fagiani/apt", plan.buildpacks)
+        pack().resolve_images.assert_called_once_with(plan.run_image)
+        self.build_packages.assert_not_called()
+
+    def test_publish_builds_missing_packages_images(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+
+        result = self.run_build(publish=True)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Building packages images for later builds: ", result.output)
+        plan = next(c.kwargs["plan"] for c in pack.call_args_list if c.kwargs)
+        self.assertIn("fagiani/apt", plan.buildpacks)
+        self.build_packages.assert_called_once_with()
+        progress().span.assert_any_call("packages.build")
+
+    def test_build_succeeds_when_packages_images_fail_to_build(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        self.build_packages.side_effect = PackagesBuildError("apt failed")
+
+        result = self.run_build(publish=True)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Could not build packages images: apt failed", result.output)
+
+    def test_packages_images_are_not_built_without_publishing(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+
+        self.run_build()
+
+        self.build_packages.assert_not_called()
+
+    def test_build_with_process_images(self, pack, docker, codebase, notify, progress):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        pack().get_image_repository.return_value = "ecr/test-repository/web"
+        result = self.run_build(process_images=True)
+
+        self.assertIn(
+            "Building process images: ['ecr/test-repository/web']", result.output
+        )
+        pack().build.assert_not_called()
+        pack().build_processes.assert_called_once_with(False, ANY, ANY, None, 3, ANY)
+
     @patch("click.secho")
     def test_when_setup_fails(
         self, mock_click, pack, docker, codebase, notify, progress
@@ -137,6 +238,40 @@ class TestBuildCommand(unittest.TestCase):
         self.assertEqual(result.exit_code, 1)
         mock_click.assert_called_with("Error: something went wrong!", fg="red")
 
+    def test_when_the_codebase_fails_to_load(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        codebase.side_effect = ValueError("invalid config")
+
+        result = self.run_build()
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Error: invalid config", result.output)
+        progress().current_phase_failure.assert_called()
+        notify().post_build_progress.assert_not_called()
+        notify().post_job_comment.assert_called_with(
+            "Build: cancelled", ["Error: ValueError", "invalid config"]
+        )
+        pack().build.assert_not_called()
+
+    def test_when_the_plan_fails_to_load(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        codebase().revision.get_docker_tags = MagicMock(
+            side_effect=ValueError("no commit")
+        )
+
+        result = self.run_build()
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Error: no commit", result.output)
+        codebase().teardown.assert_called_once()
+        notify().post_job_comment.assert_called_with(
+            "Build: cancelled", ["Error: ValueError", "no commit"]
+        )
+
     @patch("click.secho")
     def test_when_build_fails(
         self, mock_click, pack, docker, codebase, notify, progress
@@ -166,10 +301,66 @@ class TestBuildCommand(unittest.TestCase):
         self.assertEqual(result.exit_code, 1)
         mock_click.assert_called_with("Build was cancelled: ", fg="red")
 
+    def test_build_plan(self, pack, docker, codebase, notify, progress):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        codebase().build.cache = Cache()
+        codebase().build.additional_repository = None
+
+        result = CliRunner().invoke(
+            build, ["--plan", "--with-runner-image", "nice-secure-base-image"]
+        )
+
+        self.assertEqual(result.exit_code, 0)
+        plan = BuildPlan.from_json(result.output)
+        self.assertEqual(plan.builder, "test-builder:0000000")
+        self.assertEqual(plan.repository, "ecr/test-repository")
+        self.assertEqual(plan.run_image, "nice-secure-base-image")
+        self.assertEqual(plan.cache, ("registry", "ecr/test-repository:cache"))
+        self.assertEqual(plan.processes, ("web",))
+        docker.running.assert_not_called()
+        pack.assert_not_called()
+        notify.assert_not_called()
+        self.login.assert_not_called()
+        self.resolve_packages_bases.assert_not_called()
+        self.packages_exist.assert_not_called()
+
     def test_perfect_build_when_docker_is_not_started(
         self, pack, docker, codebase, notify, progress
     ):
         self.setup_mocks(pack, docker, codebase, notify, progress)
         docker.running.return_value = False
-        self.run_build()
+        docker.start.return_value = 1.2345
+        result = self.run_build()
         docker.start.assert_called()
+        self.assertIn("Docker started in 1.23 s", result.output)
+
+    def test_build_writes_a_timing_report(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+
+        result = CliRunner().invoke(build, ["--report-json", "report.json"])
+
+        self.assertEqual(result.exit_code, 0)
+        progress().span.assert_has_calls(
+            [call("codebase"), call("docker.login")], any_order=True
+        )
+        progress().add_timings.assert_called_with("codebase", codebase().timings)
+        progress().write_report.assert_called_with("report.json")
+
+    def test_build_fails_when_docker_does_not_start(
+        self, pack, docker, codebase, notify, progress
+    ):
+        self.setup_mocks(pack, docker, codebase, notify, progress)
+        docker.running.return_value = False
+        docker.start.side_effect = DockerStartTimeoutError()
+
+        result = self.run_build()
+
+        self.assertEqual(result.exit_code, 1)
+        pack().pull_images.assert_not_called()
+        pack().build.assert_not_called()
+        progress().current_phase_failure.assert_called()
+        notify().post_job_comment.assert_called_with(
+            ANY, ["Error: DockerStartTimeoutError", ""]
+        )
@@ -1,37 +1,35 @@
 import json
 import os
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
 from test.base_test_case import BaseTestCase
 from test.doubles.process import StubbedProcess
+from test.doubles.registry import FakeRegistry
 from unittest.mock import call
 from unittest.mock import patch
 
+import pytest
 from click.testing import CliRunner
 from parameterized import parameterized
 
+from image_builder.commands.deploy import CannotCloneDeployRepositoryDeployError
 from image_builder.commands.deploy import clone_deployment_repository
 from image_builder.commands.deploy import deploy
 from image_builder.const import ECR_REPO
+from image_builder.copilot import CopilotDownloadError
+from image_builder.registry import RegistryClient
 
 DEFAULT_TEST_COPILOT_VERSION = "1.33.1"
+DEPLOY_REPOSITORY_URL = (
+    "https://codestar-connections.eu-west-2.amazonaws.com/git-http/00000000000/eu-west-2/"
+    "00000000-0000-0000-0000-000000000000/organisation/repository-deploy.git"
+)
 FAILING_TEST_COPILOT_VERSION = "1.31.0"
 
 COMMAND_PATTERNS = {
-    "regctl": StubbedProcess(
-        stdout=json.dumps(
-            {
-                "config": {
-                    "Labels": {
-                        "uk.gov.trade.digital.build.timestamp": "00000000",
-                    },
-                },
-            }
-        )
-    ),
     "git clone": StubbedProcess(returncode=0),
-    "wget": StubbedProcess(returncode=0),
-    "chmod": StubbedProcess(returncode=0),
     f"/copilot/./copilot-{DEFAULT_TEST_COPILOT_VERSION} deploy": StubbedProcess(
         returncode=0
     ),
@@ -58,10 +56,34 @@ def call_subprocess_run(
 @patch("subprocess.Popen")
 @patch("subprocess.run", wraps=call_subprocess_run)
 @patch("image_builder.commands.deploy.Notify")
-@patch("image_builder.commands.deploy.Docker")
+@patch("image_builder.commands.deploy.login")
 class TestDeployCommand(BaseTestCase):
     def setUp(self):
         super().setUp()
+        self.registry = FakeRegistry().start()
+        self.addCleanup(self.registry.stop)
+        self.registry.add_image(
+            "repository/application",
+            ["commit-99999"],
+            [b"layer"],
+            {"uk.gov.trade.digital.build.timestamp": "00000000"},
+        )
+        registry_client = patch(
+            "image_builder.commands.deploy.get_registry_client",
+            return_value=RegistryClient(self.registry.address),
+        )
+        self.get_registry_client = registry_client.start()
+        self.addCleanup(registry_client.stop)
+        install_copilot_binary = patch(
+            "image_builder.commands.deploy.install_copilot_binary"
+        )
+        self.install_copilot_binary = install_copilot_binary.start()
+        self.addCleanup(install_copilot_binary.stop)
+        check_copilot_version = patch(
+            "image_builder.commands.deploy.check_copilot_version", return_value=True
+        )
+        check_copilot_version.start()
+        self.addCleanup(check_copilot_version.stop)
         self.setUpPyfakefs()
         self.fs.create_dir("/src")
         self.fs.create_file(
@@ -70,7 +92,6 @@ class TestDeployCommand(BaseTestCase):
 
     @staticmethod
     def setup_mocks(docker, notify, subprocess_run, subprocess_popen):
-        docker.running.return_value = True
         subprocess_popen.return_value = StubbedProcess()
         notify().get_build_url.return_value = "https://example.com/build_url"
 
@@ -112,6 +133,8 @@ class TestDeployCommand(BaseTestCase):
             del os.environ["COPILOT_SERVICES"]
         if os.getenv("DEPLOY_REPOSITORY"):
             del os.environ["DEPLOY_REPOSITORY"]
+        if os.getenv("DEPLOY_REPOSITORY_BRANCH"):
+            del os.environ["DEPLOY_REPOSITORY_BRANCH"]
         if os.getenv(ECR_REPO):
             del os.environ[ECR_REPO]
         if os.getenv("ECR_TAG_PATTERN"):
@@ -151,6 +174,9 @@ class TestDeployCommand(BaseTestCase):
             result.output,
         )
         self.assertIn("Found image timestamp 00000000", result.output)
+        self.get_registry_client.assert_called_once_with(
+            "00000000000.dkr.ecr.eu-west-2.amazonaws.com"
+        )
 
         subprocess_run.assert_has_calls(
             [
@@ -167,18 +193,20 @@ class TestDeployCommand(BaseTestCase):
                     stderr=subprocess.PIPE,
                     shell=True,
                 ),
-                call(
-                    "regctl image config 00000000000.dkr.ecr.eu-west-2.amazonaws.com/repository/application:commit-99999",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
+            ],
+            any_order=False,
+        )
+        subprocess_popen.assert_has_calls(
+            [
                 call(
                     f"/copilot/./copilot-{DEFAULT_TEST_COPILOT_VERSION} deploy"
-                    f" --env dev --deploy-env=false --force --name web/1 --name worker/2",
+                    f" --env dev --deploy-env=false --force --name {service}/{order}",
                     stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
                     shell=True,
                     cwd=Path("deploy"),
-                ),
+                )
+                for order, service in enumerate(["web", "worker"], 1)
             ],
             any_order=False,
         )
@@ -193,6 +221,14 @@ class TestDeployCommand(BaseTestCase):
                         "|Build Log>",
                     ],
                 ),
+                call(
+                    "organisation/repository@99999 web deployed to dev",
+                    ["*Service*: web deployed to `dev` (0 s)"],
+                ),
+                call(
+                    "organisation/repository@99999 worker deployed to dev",
+                    ["*Service*: worker deployed to `dev` (0 s)"],
+                ),
                 call(
                     "organisation/repository@99999 deployed to dev",
                     [
@@ -203,7 +239,11 @@ class TestDeployCommand(BaseTestCase):
                     True,
                 ),
             ],
-            any_order=False,
+            any_order=True,
+        )
+        self.assertEqual(
+            notify().post_job_comment.call_args.args[0],
+            "organisation/repository@99999 deployed to dev",
         )
         self.teardown_environment()
 
@@ -254,6 +294,24 @@ class TestDeployCommand(BaseTestCase):
         self.assertEqual(result.exit_code, 1)
         self.teardown_environment()
 
+    def test_deploy_fails_when_no_services_are_set(
+        self, docker, notify, subprocess_run, subprocess_popen
+    ):
+        self.setup_mocks(docker, notify, subprocess_run, subprocess_popen)
+        self.setup_environment()
+        os.environ["COPILOT_SERVICES"] = " "
+
+        result = self.run_deploy()
+
+        self.assertIn(
+            "MissingConfigurationDeployError: No services to deploy, set COPILOT_SERVICES",
+            result.output,
+        )
+        self.assertEqual(result.exit_code, 1)
+        subprocess_run.assert_not_called()
+        subprocess_popen.assert_not_called()
+        self.teardown_environment()
+
     def test_get_image_tag_for_deployment_fails_when_no_codebuild_src_dir(
         self, docker, notify, subprocess_run, subprocess_popen
     ):
@@ -353,30 +411,21 @@ class TestDeployCommand(BaseTestCase):
         subprocess_run,
         subprocess_popen,
     ):
-        old_regctl = COMMAND_PATTERNS["regctl"]
-        try:
-            self.setup_mocks(docker, notify, subprocess_run, subprocess_popen)
-            self.setup_environment()
-
-            COMMAND_PATTERNS["regctl"] = StubbedProcess(
-                stdout=json.dumps(
-                    {
-                        "config": {},
-                    }
-                )
-            )
+        self.setup_mocks(docker, notify, subprocess_run, subprocess_popen)
+        self.setup_environment()
+        self.registry.add_image(
+            "repository/application", ["commit-99999"], [b"layer"], {}
+        )
 
-            result = self.run_deploy()
+        result = self.run_deploy()
 
-            self.assertIn(
-                "MissingConfigurationDeployError: Image contains no timestamp",
-                result.output,
-            )
+        self.assertIn(
+            "MissingConfigurationDeployError: Image contains no timestamp",
+            result.output,
+        )
 
-            self.assertEqual(result.exit_code, 1)
-            self.teardown_environment()
-        finally:
-            COMMAND_PATTERNS["regctl"] = old_regctl
+        self.assertEqual(result.exit_code, 1)
+        self.teardown_environment()
 
     @patch("image_builder.commands.deploy.check_copilot_version", return_value=True)
     def test_installing_copilot(
@@ -426,18 +475,19 @@ class TestDeployCommand(BaseTestCase):
         COMMAND_PATTERNS["/copilot/./copilot-test --version"] = StubbedProcess(
             returncode=1
         )
-        COMMAND_PATTERNS["wget"] = StubbedProcess(returncode=1)
+        self.install_copilot_binary.side_effect = CopilotDownloadError(
+            "Download failed with 404"
+        )
 
         result = self.run_deploy()
 
         self.assertIn(
-            "Failed to install copilot version test",
+            "Failed to install copilot version test: Download failed with 404",
             result.output,
         )
 
         self.assertEqual(result.exit_code, 1)
         self.teardown_environment()
-        COMMAND_PATTERNS["wget"] = StubbedProcess(returncode=0)
 
     @patch("image_builder.commands.deploy.check_copilot_version", return_value=True)
     def test_installing_copilot_succeeds_when_preinstalled_version_does_not_exist(
@@ -459,6 +509,9 @@ class TestDeployCommand(BaseTestCase):
             f"Copilot version {FAILING_TEST_COPILOT_VERSION} not pre-installed, installing now",
             result.output,
         )
+        self.install_copilot_binary.assert_called_once_with(
+            FAILING_TEST_COPILOT_VERSION
+        )
 
         notify().post_job_comment.assert_has_calls(
             [
@@ -500,6 +553,32 @@ class TestDeployCommand(BaseTestCase):
         self.assertEqual(result.exit_code, 0)
         self.teardown_environment()
 
+    def test_a_slow_copilot_version_check_does_not_block_the_deploy(
+        self, docker, notify, subprocess_run, subprocess_popen
+    ):
+        self.setup_mocks(docker, notify, subprocess_run, subprocess_popen)
+        self.setup_environment()
+        checked = threading.Event()
+
+        def check_copilot_version(version):
+            checked.wait(5)
+            return False
+
+        with patch(
+            "image_builder.commands.deploy.check_copilot_version",
+            side_effect=check_copilot_version,
+        ):
+            result = self.run_deploy()
+
+            self.assertEqual(result.exit_code, 0)
+            self.assertNotIn(
+                "Warning: A newer version of copilot-cli is available",
+                [c.args[0] for c in notify().post_job_comment.call_args_list],
+            )
+            checked.set()
+
+        self.teardown_environment()
+
 
 @patch("subprocess.run")
 def test_clone_deployment_repository(mock_run):
@@ -534,3 +613,79 @@ def test_clone_deployment_repository_with_deploy_repo_branch_set(mock_run):
     )
 
     TestDeployCommand.teardown_environment()
+
+
+@patch("subprocess.run")
+@pytest.mark.parametrize(
+    "strategy,command",
+    [
+        ("full", "git clone {url} deploy"),
+        ("shallow", "git clone --depth 1 {url} deploy"),
+        ("blobless", "git clone --filter=blob:none {url} deploy"),
+        (
+            "sparse",
+            "git clone --depth 1 --filter=blob:none --sparse {url} deploy && "
+            "git -C deploy sparse-checkout set copilot",
+        ),
+    ],
+)
+def test_clone_deployment_repository_with_clone_strategy(mock_run, strategy, command):
+    TestDeployCommand.setup_environment()
+    mock_run.return_value = StubbedProcess()
+    os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"] = strategy
+
+    try:
+        clone_deployment_repository()
+
+        mock_run.assert_called_with(
+            command.format(url=DEPLOY_REPOSITORY_URL),
+            stdout=subprocess.PIPE,
+            shell=True,
+        )
+    finally:
+        del os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"]
+        TestDeployCommand.teardown_environment()
+
+
+@patch("subprocess.run")
+def test_clone_deployment_repository_from_a_mirror(mock_run):
+    TestDeployCommand.setup_environment()
+    mock_run.return_value = StubbedProcess()
+    os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"] = "mirror"
+
+    try:
+        with tempfile.TemporaryDirectory() as mirror_dir:
+            os.environ["DEPLOY_REPOSITORY_MIRROR_DIR"] = mirror_dir
+            mirror = f"{mirror_dir}/organisation/repository-deploy.git"
+
+            clone_deployment_repository()
+            mock_run.assert_called_with(
+                f"git clone --mirror {DEPLOY_REPOSITORY_URL} {mirror} && "
+                f"git clone {mirror} deploy",
+                stdout=subprocess.PIPE,
+                shell=True,
+            )
+
+            os.makedirs(mirror)
+            clone_deployment_repository()
+            mock_run.assert_called_with(
+                f"git -C {mirror} remote update --prune && git clone {mirror} deploy",
+                stdout=subprocess.PIPE,
+                shell=True,
+            )
+    finally:
+        del os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"]
+        os.environ.pop("DEPLOY_REPOSITORY_MIRROR_DIR", None)
+        TestDeployCommand.teardown_environment()
+
+
+def test_clone_deployment_repository_with_unknown_clone_strategy():
+    TestDeployCommand.setup_environment()
+    os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"] = "teleport"
+
+    try:
+        with pytest.raises(CannotCloneDeployRepositoryDeployError):
+            clone_deployment_repository()
+    finally:
+        del os.environ["DEPLOY_REPOSITORY_CLONE_STRATEGY"]
+        TestDeployCommand.teardown_environment()
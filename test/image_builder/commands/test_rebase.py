@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from test.doubles.codebase import load_codebase_languages_double
+from test.doubles.codebase import load_codebase_processes_double
+from test.doubles.codebase import load_codebase_revision_double
+from unittest.mock import call
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from image_builder.codebase.processes import Processes
+from image_builder.commands.rebase import rebase
+from image_builder.configuration.codebase import Cache
+from image_builder.pack import PackCommandFailedError
+from image_builder.packages import PackagesBuildError
+
+
+@patch("image_builder.commands.rebase.login")
+@patch("image_builder.commands.rebase.Codebase")
+@patch("image_builder.commands.rebase.Pack")
+class TestRebaseCommand(unittest.TestCase):
+    @staticmethod
+    def setup_mocks(pack, codebase):
+        codebase().revision = load_codebase_revision_double(Path("."))
+        codebase().processes = load_codebase_processes_double(Path("."))
+        codebase().languages = load_codebase_languages_double(Path("."))
+        codebase().build.builder.name = "test-builder"
+        codebase().build.builder.version = "0000000"
+        codebase().build.repository = "ecr/test-repository"
+        codebase().build.additional_repository = None
+        codebase().build.packages = []
+        codebase().build.packs = []
+        codebase().build.cache = Cache()
+        pack().get_run_image_top_layer.return_value = "sha256:top"
+        pack().rebase.return_value = True
+
+    def test_rebase(self, pack, codebase, login):
+        self.setup_mocks(pack, codebase)
+
+        result = CliRunner().invoke(rebase, ["--with-runner-image", "run-image"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Rebased 1 of 1 images in", result.output)
+        pack().resolve_images.assert_called_once_with("run-image")
+        pack().rebase.assert_called_once_with(None, "sha256:top")
+        login.assert_called_once_with(["ecr"])
+        plan = next(c.kwargs["plan"] for c in pack.call_args_list if c.kwargs)
+        self.assertEqual(plan.run_image, "run-image")
+
+    def test_rebase_process_images(self, pack, codebase, login):
+        self.setup_mocks(pack, codebase)
+
+        result = CliRunner().invoke(rebase, ["--process-images"])
+
+        self.assertEqual(result.exit_code, 0)
+        pack().rebase.assert_has_calls([call("web", "sha256:top")])
+
+    def test_rebase_reports_the_time_saved_against_a_full_build(
+        self, pack, codebase, login
+    ):
+        self.setup_mocks(pack, codebase)
+        report = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        self.addCleanup(os.remove, report.name)
+        report.write(json.dumps({"duration": 600}))
+        report.close()
+
+        result = CliRunner().invoke(rebase, ["--build-report", report.name])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, r"Saved (59\d\.\d+|600\.0) s")
+        self.assertIn(
+            f"compared to the full build in {report.name} (600", result.output
+        )
+
+    @patch("image_builder.commands.rebase.get_build_duration", return_value=600)
+    def test_rebase_estimates_the_time_saved_by_default(
+        self, get_build_duration, pack, codebase, login
+    ):
+        self.setup_mocks(pack, codebase)
+
+        result = CliRunner().invoke(rebase)
+
+        self.assertEqual(result.exit_code, 0)
+        get_build_duration.assert_called_once_with("ecr/test-repository")
+        self.assertRegex(result.output, r"Saved an estimated (59\d\.\d+|600\.0) s")
+        self.assertIn(
+            "compared to the last full build of ecr/test-repository (600", result.output
+        )
+
+    @patch("image_builder.commands.rebase.get_build_duration", return_value=None)
+    def test_rebase_without_a_recorded_build(
+        self, get_build_duration, pack, codebase, login
+    ):
+        self.setup_mocks(pack, codebase)
+
+        result = CliRunner().invoke(rebase)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("No full build of ecr/test-repository recorded", result.output)
+
+    def test_rebase_process_images_without_processes(self, pack, codebase, login):
+        self.setup_mocks(pack, codebase)
+        codebase().processes = Processes(Path("Procfile"))
+
+        result = CliRunner().invoke(rebase, ["--process-images"])
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("No processes found in the Procfile to rebase", result.output)
+        pack().rebase.assert_not_called()
+
+    def test_rebase_fails(self, pack, codebase, login):
+        self.setup_mocks(pack, codebase)
+        pack().rebase.side_effect = PackCommandFailedError("run image not found")
+
+        result = CliRunner().invoke(rebase)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Error: ecr/test-repository: run image not found", result.output)
+
+    @patch("image_builder.commands.rebase.Docker")
+    @patch("image_builder.commands.rebase.get_packages_images")
+    def test_rebase_builds_the_packages_images_for_a_new_run_image(
+        self, get_packages_images, docker, pack, codebase, login
+    ):
+        self.setup_mocks(pack, codebase)
+        codebase().build.packages = ["libpq-dev"]
+        codebase().build.registry = "ecr"
+        packages = get_packages_images()
+        packages.available = False
+        packages.prebuilt_run_image = "ecr/test-repository:packages-run-key"
+        docker.running.return_value = False
+        docker.start.return_value = 1.5
+
+        result = CliRunner().invoke(rebase)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn(
+            "Building packages images for the latest run image", result.output
+        )
+        login.assert_any_call(["ecr"])
+        docker.start.assert_called_once()
+        packages.build.assert_called_once()
+        pack().resolve_images.assert_called_once_with(
+            "ecr/test-repository:packages-run-key"
+        )
+        pack().rebase.assert_called_once()
+
+    @patch("image_builder.commands.rebase.Docker")
+    @patch("image_builder.commands.rebase.get_packages_images")
+    def test_rebase_fails_when_the_packages_images_cannot_be_built(
+        self, get_packages_images, docker, pack, codebase, login
+    ):
+        self.setup_mocks(pack, codebase)
+        get_packages_images().available = False
+        get_packages_images().build.side_effect = PackagesBuildError("no package")
+
+        result = CliRunner().invoke(rebase)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Error: no package", result.output)
+        pack().rebase.assert_not_called()
@@ -0,0 +1,166 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from image_builder import credentials
+from image_builder.commands.rebase_fleet import rebase_fleet
+from image_builder.credentials import CredentialManager
+from image_builder.images import ResolvedImage
+from image_builder.pack import PackCommandFailedError
+from image_builder.registry import RegistryError
+
+MANIFEST = """
+run_image: paketobuildpacks/run-jammy-full:latest
+images:
+  - repository: 000000000000.dkr.ecr.region.amazonaws.com/app/one
+    commit: abc1234
+  - repository: 000000000000.dkr.ecr.region.amazonaws.com/app/two
+    commit: def5678
+  - repository: public.ecr.aws/app/three
+    tag: tag-v1.0.0
+"""
+
+
+@patch(
+    "image_builder.fleet.resolve_image",
+    return_value=ResolvedImage(
+        "run:latest", "run@sha256:run", {"rootfs": {"diff_ids": ["sha256:top"]}}
+    ),
+)
+@patch("image_builder.fleet.rebase_image", return_value=True)
+@patch("image_builder.commands.rebase_fleet.Notify")
+@patch(
+    "image_builder.commands.rebase_fleet.login",
+    side_effect=lambda registries: registries,
+)
+class TestRebaseFleetCommand(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.manifest = Path(self.directory.name).joinpath("fleet.yml")
+        self.manifest.write_text(MANIFEST)
+        self.state = Path(self.directory.name).joinpath("state.json")
+
+    def invoke(self, *args):
+        return CliRunner().invoke(
+            rebase_fleet, [str(self.manifest), "--state", str(self.state), *args]
+        )
+
+    def test_rebase_fleet(self, login, notify, rebase_image, resolve_image):
+        result = self.invoke("--send-notifications")
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Rebased 3, skipped 0 and failed 0 of 3 images in", result.output)
+        login.assert_called_once_with(
+            ["000000000000.dkr.ecr.region.amazonaws.com", "public.ecr.aws"]
+        )
+        resolve_image.assert_called_once_with("paketobuildpacks/run-jammy-full:latest")
+        notify.assert_called_once_with(True, background=True)
+        notify().start_thread.assert_called_once()
+        self.assertEqual(notify().post_job_comment.call_count, 4)
+        self.assertTrue(
+            notify().post_job_comment.call_args.kwargs["send_to_main_channel"]
+        )
+
+    def test_rebase_fleet_with_run_image_override(
+        self, login, notify, rebase_image, resolve_image
+    ):
+        result = self.invoke("--run-image", "run:other")
+
+        self.assertEqual(result.exit_code, 0)
+        resolve_image.assert_called_once_with("run:other")
+
+    def test_rebase_fleet_resumes_and_reports_failures(
+        self, login, notify, rebase_image, resolve_image
+    ):
+        rebase_image.side_effect = [True, PackCommandFailedError("denied"), False]
+        report = Path(self.directory.name).joinpath("report.json")
+
+        result = self.invoke("--max-parallel-rebases", "1", "--report-json", report)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Rebased 1, skipped 1 and failed 1 of 3 images", result.output)
+        self.assertIn("failed (0 s): denied", result.output)
+        spans = [span["name"] for span in json.loads(report.read_text())["spans"]]
+        self.assertIn("rebase.public.ecr.aws/app/three:tag-v1.0.0", spans)
+
+        rebase_image.side_effect = None
+        result = self.invoke()
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Resuming, 2 images already done", result.output)
+        self.assertIn(
+            "Rebased 1, skipped 0 and failed 0 of 3 images (2 already done)",
+            result.output,
+        )
+
+    def test_rebase_fleet_with_an_invalid_manifest(
+        self, login, notify, rebase_image, resolve_image
+    ):
+        self.manifest.write_text("images: {}")
+
+        result = self.invoke()
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("must contain a list of images", result.output)
+        login.assert_not_called()
+
+    def test_rebase_fleet_without_a_run_image(
+        self, login, notify, rebase_image, resolve_image
+    ):
+        self.manifest.write_text("images: []")
+
+        result = self.invoke()
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("a run image must be set", result.output)
+
+    @patch("image_builder.credentials.write_docker_config")
+    @patch("image_builder.credentials.get_registry_credentials")
+    @patch("image_builder.credentials.credential_manager", CredentialManager())
+    def test_rebase_fleet_when_logging_in_fails(
+        self,
+        get_registry_credentials,
+        write_docker_config,
+        login,
+        notify,
+        rebase_image,
+        resolve_image,
+    ):
+        login.side_effect = credentials.login
+        get_registry_credentials.side_effect = lambda registry: (
+            ("AWS", "token")
+            if registry == "public.ecr.aws"
+            else (_ for _ in ()).throw(RegistryError("unauthorized"))
+        )
+
+        result = self.invoke("--send-notifications")
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn(
+            "Error: Failed to log in to 000000000000.dkr.ecr.region.amazonaws.com",
+            result.output,
+        )
+        rebase_image.assert_not_called()
+        self.assertTrue(
+            notify().post_job_comment.call_args.kwargs["send_to_main_channel"]
+        )
+
+    def test_rebase_fleet_with_a_registry_that_needs_no_login(
+        self, login, notify, rebase_image, resolve_image
+    ):
+        self.manifest.write_text(
+            MANIFEST + "  - repository: ghcr.io/app/four\n    tag: tag-v1.0.0\n"
+        )
+        login.side_effect = lambda registries: [
+            registry for registry in registries if registry != "ghcr.io"
+        ]
+
+        result = self.invoke()
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Rebased 4, skipped 0 and failed 0 of 4 images", result.output)
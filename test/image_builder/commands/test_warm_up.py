@@ -0,0 +1,123 @@
+import threading
+import time
+from test.base_test_case import BaseTestCase
+from unittest.mock import call
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from image_builder.commands.warm_up import warm_up
+from image_builder.registry import RegistryError
+
+
+@patch("image_builder.commands.warm_up.save_to_oci_layout")
+@patch("image_builder.commands.warm_up.pull_images", return_value=[])
+@patch("image_builder.commands.warm_up.resolve_builder_images")
+@patch("image_builder.commands.warm_up.Docker")
+class TestWarmUpCommand(BaseTestCase):
+    def test_warm_up_pulls_supported_builders_and_run_images(
+        self, docker, resolve_builder_images, pull_images, save_to_oci_layout
+    ):
+        docker.running.return_value = True
+        resolve_builder_images.side_effect = lambda builder: (
+            f"{builder}@sha256:builder",
+            f"{builder}-run@sha256:run",
+        )
+
+        result = CliRunner().invoke(warm_up, ["--max-parallel-pulls", "4"])
+
+        self.assertEqual(result.exit_code, 0)
+        docker.start.assert_not_called()
+        images = pull_images.call_args.args[0]
+        self.assertIn(
+            "paketobuildpacks/builder-jammy-full:0.3.288@sha256:builder", images
+        )
+        self.assertIn(
+            "paketobuildpacks/builder-jammy-full:0.3.288-run@sha256:run", images
+        )
+        self.assertFalse(any("paketobuildpacks/builder:" in i for i in images))
+        self.assertEqual(pull_images.call_args.args[1], 4)
+
+    def test_warm_up_pulls_tags_when_images_cannot_be_resolved(
+        self, docker, resolve_builder_images, pull_images, save_to_oci_layout
+    ):
+        docker.running.return_value = False
+        docker.start.return_value = 1.5
+        resolve_builder_images.side_effect = RegistryError("rate limited")
+
+        result = CliRunner().invoke(warm_up)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Docker started in 1.5 s", result.output)
+        self.assertIn(
+            "paketobuildpacks/builder-jammy-full:0.3.288", pull_images.call_args.args[0]
+        )
+
+    def test_warm_up_saves_the_latest_builders_to_an_oci_layout(
+        self, docker, resolve_builder_images, pull_images, save_to_oci_layout
+    ):
+        result = CliRunner().invoke(
+            warm_up, ["--oci-layout", "/builder_cache", "--latest-versions", "1"]
+        )
+
+        self.assertEqual(result.exit_code, 0)
+        save_to_oci_layout.assert_has_calls(
+            [
+                call("paketobuildpacks/builder-jammy-full:0.3.482", "/builder_cache"),
+                call("paketobuildpacks/builder-jammy-base:0.4.409", "/builder_cache"),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(save_to_oci_layout.call_count, 2)
+        docker.running.assert_not_called()
+        pull_images.assert_not_called()
+
+    def test_warm_up_copies_versions_of_a_builder_one_at_a_time(
+        self, docker, resolve_builder_images, pull_images, save_to_oci_layout
+    ):
+        running = {}
+        overlapping = []
+        lock = threading.Lock()
+
+        def save(builder, layout):
+            name = builder.split(":")[0]
+            with lock:
+                running[name] = running.get(name, 0) + 1
+                overlapping.append(running[name] > 1)
+            time.sleep(0.05)
+            with lock:
+                running[name] -= 1
+
+        save_to_oci_layout.side_effect = save
+
+        result = CliRunner().invoke(
+            warm_up,
+            ["--oci-layout", "/builder_cache", "--latest-versions", "2"]
+            + ["--max-parallel-pulls", "4"],
+        )
+
+        self.assertEqual(result.exit_code, 0)
+        save_to_oci_layout.assert_has_calls(
+            [
+                call("paketobuildpacks/builder-jammy-full:0.3.482", "/builder_cache"),
+                call("paketobuildpacks/builder-jammy-full:0.3.473", "/builder_cache"),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(save_to_oci_layout.call_count, 4)
+        self.assertFalse(any(overlapping))
+
+    def test_warm_up_fails_when_images_cannot_be_pulled(
+        self, docker, resolve_builder_images, pull_images, save_to_oci_layout
+    ):
+        docker.running.return_value = True
+        resolve_builder_images.side_effect = lambda builder: (builder, None)
+        pull_images.return_value = ["paketobuildpacks/builder-jammy-full:0.3.288"]
+
+        result = CliRunner().invoke(warm_up)
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn(
+            "Error: failed to pull paketobuildpacks/builder-jammy-full:0.3.288",
+            result.output,
+        )
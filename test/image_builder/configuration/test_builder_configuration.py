@@ -44,6 +44,25 @@ class TestBuilderConfiguration(unittest.TestCase):
         self.assertEqual(config.builders[1].deprecated, True)
         self.assertEqual(config.builders[1].versions[0].version, "0.2.443-full")
 
+    def test_get_supported_builders(self):
+        config = load_builder_configuration(self.builder_config_path)
+
+        self.assertEqual(
+            config.get_supported_builders(),
+            ["paketobuildpacks/builder-jammy-full:0.3.288"],
+        )
+
+    def test_get_latest_supported_builders(self):
+        config = load_builder_configuration()
+
+        self.assertEqual(
+            config.get_supported_builders(latest_versions=1),
+            [
+                "paketobuildpacks/builder-jammy-full:0.3.482",
+                "paketobuildpacks/builder-jammy-base:0.4.409",
+            ],
+        )
+
     @parameterized.expand(
         [
             ("supported", BuilderSupport.SUPPORTED),
@@ -7,6 +7,7 @@ from parameterized import parameterized
 
 from image_builder.configuration.codebase import CodebaseConfiguration
 from image_builder.configuration.codebase import CodebaseConfigurationLoadError
+from image_builder.configuration.codebase import load_cache_configuration
 from image_builder.const import ADDITIONAL_ECR_REPO
 from image_builder.const import ECR_REPO
 
@@ -207,3 +208,35 @@ class TestCodebaseConfiguration(unittest.TestCase):
 
         with pytest.raises(CodebaseConfigurationLoadError):
             config.additional_repository
+
+
+class TestCacheConfiguration(unittest.TestCase):
+    def test_cache_defaults_to_registry(self):
+        config = CodebaseConfiguration()
+
+        self.assertEqual(config.cache.type, "registry")
+
+    def test_loading_a_volume_cache(self):
+        cache = load_cache_configuration({"type": "volume", "name": "app-cache"})
+
+        self.assertEqual(cache.type, "volume")
+        self.assertEqual(cache.name, "app-cache")
+
+    def test_loading_a_bind_cache(self):
+        cache = load_cache_configuration({"type": "bind", "path": "/cache/pack"})
+
+        self.assertEqual(cache.type, "bind")
+        self.assertEqual(cache.path, "/cache/pack")
+
+    def test_loading_a_bind_cache_without_a_path(self):
+        with pytest.raises(CodebaseConfigurationLoadError):
+            load_cache_configuration({"type": "bind"})
+
+    def test_loading_an_unknown_cache_type(self):
+        with pytest.raises(CodebaseConfigurationLoadError):
+            load_cache_configuration({"type": "s3"})
+
+    @parameterized.expand([("volume",), (["volume"],), (None,)])
+    def test_loading_a_cache_that_is_not_a_mapping(self, config):
+        with pytest.raises(CodebaseConfigurationLoadError, match="must be a mapping"):
+            load_cache_configuration(config)
@@ -0,0 +1,238 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import requests
+from parameterized import parameterized
+
+from image_builder.copilot import COPILOT_RELEASE_URL
+from image_builder.copilot import CopilotBinaryCache
+from image_builder.copilot import CopilotChecksumError
+from image_builder.copilot import CopilotDeployer
+from image_builder.copilot import CopilotDownloadError
+from image_builder.copilot import download_copilot
+from image_builder.copilot import get_latest_copilot_version
+from image_builder.copilot import install_copilot_binary
+from image_builder.progress import Progress
+
+REAL_MKSTEMP = tempfile.mkstemp
+COMMANDS = {
+    "web": "echo deploying web; echo done >&2",
+    "worker": "echo deploying worker; exit 1",
+}
+
+
+@patch(
+    "image_builder.copilot.CopilotDeployer.get_command",
+    side_effect=lambda service, order: COMMANDS[service],
+)
+class TestCopilotDeployer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_deploying_services_streams_prefixed_output(self, get_command):
+        output = io.StringIO()
+        progress = Progress()
+        on_service_complete = MagicMock()
+
+        with redirect_stdout(output):
+            results = CopilotDeployer(
+                "1.33.1", "dev", Path(self.directory.name), progress
+            ).deploy(["web", "worker"], 2, on_service_complete)
+
+        self.assertIn("[web] deploying web", output.getvalue())
+        self.assertIn("[web] done", output.getvalue())
+        self.assertIn("[worker] deploying worker", output.getvalue())
+        self.assertEqual([r.service for r in results], ["web", "worker"])
+        self.assertEqual([r.succeeded for r in results], [True, False])
+        self.assertEqual(on_service_complete.call_count, 2)
+        self.assertEqual(
+            sorted(span.name for span in progress.spans),
+            ["deploy.copilot.web", "deploy.copilot.worker"],
+        )
+
+
+class TestCopilotDeployCommand(unittest.TestCase):
+    def test_get_command(self):
+        deployer = CopilotDeployer("1.33.1", "dev")
+
+        self.assertEqual(
+            deployer.get_command("web", 1),
+            "/copilot/./copilot-1.33.1 deploy --env dev --deploy-env=false --force --name web/1",
+        )
+
+
+def copilot_response(status_code=200, content=b""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = content.decode()
+    response.iter_content.return_value = [content]
+    response.__enter__.return_value = response
+    return response
+
+
+class TestCopilotBinaryCache(unittest.TestCase):
+    binary = b"copilot binary"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = CopilotBinaryCache(Path(self.directory.name).joinpath("cache"))
+        self.install_dir = Path(self.directory.name).joinpath("copilot")
+        self.install_dir.mkdir()
+        self.sha256 = hashlib.sha256(self.binary).hexdigest()
+
+    def mock_release(self, requests_get, checksum_response, binary_response=None):
+        responses = {
+            f"{COPILOT_RELEASE_URL.format(version='1.34.1')}.sha256": checksum_response,
+            COPILOT_RELEASE_URL.format(version="1.34.1"): binary_response
+            or copilot_response(content=self.binary),
+        }
+        requests_get.side_effect = lambda url, **kwargs: responses[url]
+
+    @patch("image_builder.copilot.requests.get")
+    def test_installing_copilot_verifies_and_caches_the_binary(self, requests_get):
+        self.mock_release(
+            requests_get,
+            copilot_response(content=f"{self.sha256}  copilot-linux\n".encode()),
+        )
+
+        installed = install_copilot_binary("1.34.1", self.cache, self.install_dir)
+
+        self.assertEqual(installed, self.install_dir.joinpath("copilot-1.34.1"))
+        self.assertEqual(installed.read_bytes(), self.binary)
+        self.assertEqual(
+            installed.resolve(),
+            self.cache.path.joinpath("sha256", self.sha256).resolve(),
+        )
+        self.assertTrue(os.access(installed, os.X_OK))
+
+    @patch("image_builder.copilot.requests.get")
+    def test_installing_a_cached_copilot_does_not_download_it(self, requests_get):
+        self.mock_release(requests_get, copilot_response(404))
+        install_copilot_binary("1.34.1", self.cache, self.install_dir)
+        requests_get.reset_mock()
+
+        installed = install_copilot_binary("1.34.1", self.cache, self.install_dir)
+
+        requests_get.assert_not_called()
+        self.assertEqual(installed.read_bytes(), self.binary)
+
+    @patch("image_builder.copilot.requests.get")
+    def test_installing_copilot_with_a_mismatched_checksum(self, requests_get):
+        self.mock_release(requests_get, copilot_response(content=b"0" * 64))
+
+        with self.assertRaises(CopilotChecksumError):
+            install_copilot_binary("1.34.1", self.cache, self.install_dir)
+
+        self.assertIsNone(self.cache.get("1.34.1"))
+        self.assertEqual(list(self.cache.path.iterdir()), [])
+
+    @patch("image_builder.copilot.requests.get")
+    def test_a_corrupted_cache_entry_is_downloaded_again(self, requests_get):
+        self.mock_release(requests_get, copilot_response(404))
+        install_copilot_binary("1.34.1", self.cache, self.install_dir)
+        self.cache.path.joinpath("sha256", self.sha256).write_bytes(b"corrupted")
+
+        self.assertIsNone(self.cache.get("1.34.1"))
+
+    @patch("image_builder.copilot.requests.get")
+    def test_failing_to_download_copilot(self, requests_get):
+        self.mock_release(requests_get, copilot_response(404), copilot_response(403))
+
+        with self.assertRaises(CopilotDownloadError):
+            install_copilot_binary("1.34.1", self.cache, self.install_dir)
+
+    @parameterized.expand(
+        [(requests.ConnectionError("refused"),), (copilot_response(404),)]
+    )
+    @patch("image_builder.copilot.requests.get")
+    def test_a_failed_download_closes_the_temporary_file(self, response, requests_get):
+        if isinstance(response, Exception):
+            requests_get.side_effect = response
+        else:
+            requests_get.return_value = response
+        temporary_files = []
+
+        def mkstemp(**kwargs):
+            temporary_files.append(REAL_MKSTEMP(**kwargs))
+            return temporary_files[-1]
+
+        with patch("image_builder.copilot.tempfile.mkstemp", side_effect=mkstemp):
+            with self.assertRaises(CopilotDownloadError):
+                download_copilot("1.34.1", Path(self.directory.name))
+
+        handle, temporary_path = temporary_files[0]
+        with self.assertRaises(OSError):
+            os.fstat(handle)
+        self.assertFalse(Path(temporary_path).exists())
+
+
+@patch("image_builder.copilot.requests.head")
+class TestLatestCopilotVersion(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = CopilotBinaryCache(self.directory.name)
+
+    @staticmethod
+    def release_response(version):
+        response = MagicMock()
+        response.url = f"https://github.com/aws/copilot-cli/releases/tag/v{version}"
+        return response
+
+    def test_the_latest_version_is_fetched_with_a_timeout(self, requests_head):
+        requests_head.return_value = self.release_response("1.34.1")
+
+        self.assertEqual(get_latest_copilot_version(self.cache), "1.34.1")
+
+        requests_head.assert_called_once_with(
+            "https://github.com/aws/copilot-cli/releases/latest",
+            allow_redirects=True,
+            timeout=5,
+        )
+
+    def test_a_fresh_cached_version_is_not_fetched_again(self, requests_head):
+        self.cache.set_latest_release("1.34.0")
+
+        self.assertEqual(get_latest_copilot_version(self.cache), "1.34.0")
+
+        requests_head.assert_not_called()
+
+    def test_a_stale_cached_version_is_refreshed(self, requests_head):
+        requests_head.return_value = self.release_response("1.34.1")
+        self.cache.set_latest_release("1.34.0")
+
+        with patch.dict(os.environ, {"COPILOT_LATEST_RELEASE_TTL": "0"}):
+            self.assertEqual(get_latest_copilot_version(self.cache), "1.34.1")
+
+        self.assertEqual(self.cache.get_latest_release(60), ("1.34.1", True))
+
+    def test_a_malformed_cached_version_is_fetched_again(self, requests_head):
+        requests_head.return_value = self.release_response("1.34.1")
+        self.cache.path.mkdir(parents=True, exist_ok=True)
+        self.cache.path.joinpath("latest_release.json").write_text("{}")
+
+        with patch.dict(os.environ, {"COPILOT_LATEST_RELEASE_TTL": "6h"}):
+            self.assertEqual(get_latest_copilot_version(self.cache), "1.34.1")
+
+        requests_head.assert_called_once()
+
+    def test_a_stale_cached_version_is_used_when_github_fails(self, requests_head):
+        requests_head.side_effect = requests.Timeout("timed out")
+        self.cache.set_latest_release("1.34.0")
+
+        with patch.dict(os.environ, {"COPILOT_LATEST_RELEASE_TTL": "0"}):
+            self.assertEqual(get_latest_copilot_version(self.cache), "1.34.0")
+
+    def test_no_version_when_github_fails_without_a_cache(self, requests_head):
+        requests_head.side_effect = requests.Timeout("timed out")
+
+        self.assertIsNone(get_latest_copilot_version(self.cache))
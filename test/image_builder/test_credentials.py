@@ -0,0 +1,152 @@
+import base64
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from test.base_test_case import BaseTestCase
+from unittest.mock import call
+from unittest.mock import patch
+
+import boto3
+from botocore.stub import Stubber
+
+from image_builder.credentials import DOCKER_HUB_REGISTRY
+from image_builder.credentials import CredentialManager
+from image_builder.registry import RegistryError
+
+PRIVATE_REGISTRY = "000000000000.dkr.ecr.eu-west-2.amazonaws.com"
+
+
+def get_auth(username, password):
+    return {"auth": base64.b64encode(f"{username}:{password}".encode()).decode()}
+
+
+@patch(
+    "image_builder.credentials.get_registry_credentials",
+    side_effect=lambda registry: ("AWS", f"{registry}-password"),
+)
+class TestCredentialManager(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ssm_client = boto3.client("ssm", region_name="eu-west-2")
+        self.ssm_client_stub = Stubber(self.ssm_client)
+        self.setUpPyfakefs()
+        os.environ["DOCKER_CONFIG"] = "/docker"
+        os.environ.pop("CODESTAR_CONNECTION_ARN", None)
+
+    def tearDown(self):
+        os.environ.pop("DOCKER_CONFIG", None)
+        os.environ.pop("CODESTAR_CONNECTION_ARN", None)
+        super().tearDown()
+
+    def read_docker_config(self):
+        return json.loads(Path("/docker/config.json").read_text())
+
+    def test_credentials_are_cached(self, get_registry_credentials):
+        manager = CredentialManager()
+
+        manager.get(PRIVATE_REGISTRY)
+        manager.get(PRIVATE_REGISTRY)
+
+        get_registry_credentials.assert_called_once_with(PRIVATE_REGISTRY)
+
+    def test_logging_into_registries_writes_the_docker_config_once(
+        self, get_registry_credentials
+    ):
+        self.fs.create_file(
+            "/docker/config.json",
+            contents=json.dumps(
+                {"auths": {"ghcr.io": {"auth": "existing"}}, "psFormat": "table"}
+            ),
+        )
+
+        CredentialManager().login([PRIVATE_REGISTRY, "public.ecr.aws"])
+
+        get_registry_credentials.assert_has_calls(
+            [call(PRIVATE_REGISTRY), call("public.ecr.aws")], any_order=True
+        )
+        self.assertEqual(
+            self.read_docker_config(),
+            {
+                "auths": {
+                    "ghcr.io": {"auth": "existing"},
+                    PRIVATE_REGISTRY: get_auth("AWS", f"{PRIVATE_REGISTRY}-password"),
+                    "public.ecr.aws": get_auth("AWS", "public.ecr.aws-password"),
+                },
+                "psFormat": "table",
+            },
+        )
+
+    def test_logging_into_the_same_registry_twice_fetches_credentials_once(
+        self, get_registry_credentials
+    ):
+        manager = CredentialManager()
+
+        manager.login([PRIVATE_REGISTRY, PRIVATE_REGISTRY])
+        manager.login([PRIVATE_REGISTRY])
+
+        get_registry_credentials.assert_called_once_with(PRIVATE_REGISTRY)
+
+    def test_logging_in_skips_registries_without_credentials(
+        self, get_registry_credentials
+    ):
+        get_registry_credentials.side_effect = RegistryError("access denied")
+
+        logged_in = CredentialManager().login([PRIVATE_REGISTRY])
+
+        self.assertEqual(logged_in, [])
+        self.assertFalse(Path("/docker/config.json").exists())
+
+    def test_logging_into_docker_hub_in_codebuild(self, get_registry_credentials):
+        os.environ["CODESTAR_CONNECTION_ARN"] = "something"
+        self.ssm_client_stub.add_response(
+            "get_parameter",
+            {
+                "Parameter": {
+                    "Name": "/codebuild/docker_hub_credentials",
+                    "Type": "SecureString",
+                    "Value": '{"username":"USER","password":"PASS"}',
+                    "Version": 123,
+                    "LastModifiedDate": datetime(2015, 1, 1),
+                    "ARN": "string",
+                    "DataType": "string",
+                }
+            },
+            {
+                "Name": "/codebuild/docker_hub_credentials",
+                "WithDecryption": True,
+            },
+        )
+
+        with self.ssm_client_stub:
+            CredentialManager().login([PRIVATE_REGISTRY], self.ssm_client)
+
+        self.assertEqual(
+            self.read_docker_config()["auths"][DOCKER_HUB_REGISTRY],
+            get_auth("USER", "PASS"),
+        )
+
+    def test_failing_to_get_docker_hub_credentials_still_logs_into_ecr(
+        self, get_registry_credentials
+    ):
+        os.environ["CODESTAR_CONNECTION_ARN"] = "something"
+        self.ssm_client_stub.add_client_error("get_parameter")
+
+        with self.ssm_client_stub:
+            logged_in = CredentialManager().login([PRIVATE_REGISTRY], self.ssm_client)
+
+        self.assertEqual(logged_in, [PRIVATE_REGISTRY])
+
+    def test_registry_clients_are_shared(self, get_registry_credentials):
+        manager = CredentialManager()
+
+        client = manager.get_client(PRIVATE_REGISTRY)
+
+        self.assertIs(manager.get_client(PRIVATE_REGISTRY), client)
+        self.assertEqual(client.credentials, ("AWS", f"{PRIVATE_REGISTRY}-password"))
+        get_registry_credentials.assert_called_once_with(PRIVATE_REGISTRY)
+
+    def test_logging_in_in_the_background(self, get_registry_credentials):
+        login = CredentialManager().login_in_background([PRIVATE_REGISTRY])
+
+        self.assertEqual(login.result(timeout=5), [PRIVATE_REGISTRY])
@@ -1,213 +1,235 @@
+import json
 import os
+import socket
 import subprocess
+import tempfile
+import threading
 import unittest
-from datetime import datetime
 from test.doubles.process import StubbedProcess
 from unittest.mock import call
 from unittest.mock import patch
 
-import boto3
 import pytest
-from botocore.stub import Stubber
+from parameterized import parameterized
 
 from image_builder.docker import Docker
+from image_builder.docker import DockerError
 from image_builder.docker import DockerNotInstalledError
 from image_builder.docker import DockerStartTimeoutError
+from image_builder.docker import get_cached_image_reference
+from image_builder.docker import save_to_oci_layout
 
+BUILDER = "paketobuildpacks/builder-jammy-full:0.3.288"
 
-class TestDocker(unittest.TestCase):
-    returncode_docker_not_installed = 127
-    returncode_docker_running = 0
-    returncode_docker_wont_start = 1
-    returncodes_docker_ps_successful_on_5th_attempt = [1, 1, 1, 1, 0]
 
+class TestDocker(unittest.TestCase):
     def setUp(self):
-        os.environ[
-            "CODEBUILD_BUILD_ARN"
-        ] = "arn:aws:codebuild:region:000000000000:build/project:example-build-id"
-        self.ssm_client = boto3.client("ssm", region_name="eu-west-2")
-        self.ssm_client_stub = Stubber(self.ssm_client)
-        self.ssm_client_stub.add_response(
-            "get_parameter",
-            {
-                "Parameter": {
-                    "Name": "/codebuild/docker_hub_credentials",
-                    "Type": "SecureString",
-                    "Value": '{"username":"USER","password":"PASS"}',
-                    "Version": 123,
-                    "Selector": "string",
-                    "SourceResult": "string",
-                    "LastModifiedDate": datetime(2015, 1, 1),
-                    "ARN": "string",
-                    "DataType": "string",
-                }
-            },
-            {
-                "Name": "/codebuild/docker_hub_credentials",
-                "WithDecryption": True,
-            },
-        )
+        environment = patch.dict(os.environ)
+        environment.start()
+        self.addCleanup(environment.stop)
+        os.environ.pop("DOCKER_HOST", None)
 
+    @patch("image_builder.docker.Docker.ping", return_value=True)
     @patch("subprocess.Popen", return_value=None)
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_running),
-    )
+    @patch("subprocess.run")
     @patch("time.sleep", return_value=None)
-    def test_starting_docker_when_already_running(self, sleep, run, popen):
+    def test_starting_docker_when_already_running(self, sleep, run, popen, ping):
         Docker.start()
 
-        run.assert_has_calls(
-            [
-                call("docker ps", stdout=subprocess.PIPE, shell=True),
-            ]
-        )
+        run.assert_not_called()
         popen.assert_not_called()
         sleep.assert_not_called()
 
-    @patch("subprocess.Popen", return_value=None)
+    @patch("image_builder.docker.Docker.ping", return_value=False)
+    @patch("subprocess.run")
+    def test_docker_is_not_running_without_its_socket(self, run, ping):
+        self.assertFalse(Docker.running())
+
+        ping.assert_called_once_with("/var/run/docker.sock")
+        run.assert_not_called()
+
+    @patch("image_builder.docker.Docker.ping", return_value=True)
+    @patch("subprocess.run")
+    def test_docker_is_pinged_on_the_docker_host_socket(self, run, ping):
+        with patch.dict(
+            os.environ, {"DOCKER_HOST": "unix:///home/me/.colima/docker.sock"}
+        ):
+            self.assertTrue(Docker.running())
+
+        ping.assert_called_once_with("/home/me/.colima/docker.sock")
+        run.assert_not_called()
+
+    @parameterized.expand([(0, True), (1, False)])
+    @patch("image_builder.docker.Docker.ping")
+    @patch("subprocess.run")
+    def test_docker_on_a_remote_docker_host(self, returncode, running, run, ping):
+        run.return_value = StubbedProcess(returncode=returncode)
+
+        with patch.dict(os.environ, {"DOCKER_HOST": "tcp://127.0.0.1:2376"}):
+            self.assertEqual(Docker.running(), running)
+
+        ping.assert_not_called()
+        run.assert_called_once_with(
+            "docker ps", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
+        )
+
     @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(
-            returncodes=returncodes_docker_ps_successful_on_5th_attempt
-        ),
+        "image_builder.docker.Docker.ping",
+        side_effect=[False, False, False, False, False, True],
     )
+    @patch("image_builder.docker.Path.exists", return_value=True)
+    @patch("subprocess.Popen", return_value=None)
+    @patch("subprocess.run")
     @patch("time.sleep", return_value=None)
-    def test_starting_docker_when_not_running(self, sleep, run, popen):
-        Docker.start()
+    def test_starting_docker_when_not_running(self, sleep, run, popen, exists, ping):
+        startup_time = Docker.start()
 
-        run.assert_has_calls(
-            [
-                call("docker ps", stdout=subprocess.PIPE, shell=True),
-            ]
-        )
+        run.assert_not_called()
         popen.assert_called_with(
             "nohup /usr/local/bin/dockerd --host=unix:///var/run/docker.sock "
             "--host=tcp://127.0.0.1:2375 --storage-driver=overlay2",
             shell=True,
         )
-        sleep.assert_called_with(1)
+        sleep.assert_has_calls([call(0.01), call(0.02), call(0.04), call(0.08)])
+        self.assertEqual(startup_time, Docker.startup_time)
 
+    @patch("image_builder.docker.Docker.ping", return_value=False)
+    @patch("image_builder.docker.Path.exists", return_value=False)
     @patch("subprocess.Popen", return_value=None)
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_not_installed),
-    )
     @patch("time.sleep", return_value=None)
-    def test_starting_docker_when_not_installed(self, sleep, run, popen):
+    def test_starting_docker_when_not_installed(self, sleep, popen, exists, ping):
         with pytest.raises(DockerNotInstalledError):
             Docker.start()
 
-        run.assert_called_with("docker ps", stdout=subprocess.PIPE, shell=True)
         popen.assert_not_called()
         sleep.assert_not_called()
 
+    @patch("image_builder.docker.Docker.ping", return_value=False)
+    @patch("image_builder.docker.Path.exists", return_value=True)
     @patch("subprocess.Popen", return_value=None)
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_wont_start),
-    )
     @patch("time.sleep", return_value=None)
-    def test_docker_never_starts(self, sleep, run, popen):
+    def test_docker_never_starts(self, sleep, popen, exists, ping):
         with pytest.raises(DockerStartTimeoutError):
             Docker.start()
 
-        run.assert_called_with("docker ps", stdout=subprocess.PIPE, shell=True)
         popen.assert_called_with(
             "nohup /usr/local/bin/dockerd --host=unix:///var/run/docker.sock "
             "--host=tcp://127.0.0.1:2375 --storage-driver=overlay2",
             shell=True,
         )
-        sleep.assert_has_calls([call(1)] * 60)
+        self.assertGreaterEqual(sum(c.args[0] for c in sleep.call_args_list), 60)
+        sleep.assert_called_with(1)
 
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_running),
-    )
-    def test_docker_login_with_public_repository(self, run):
-        with self.ssm_client_stub:
-            Docker.login(registry="public.ecr.aws", ssm_client=self.ssm_client)
+    def test_pinging_docker_over_its_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "docker.sock")
+            requests = []
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+                server.bind(socket_path)
+                server.listen(1)
 
-        run.assert_has_calls(
-            [
-                call(
-                    f"aws ecr-public get-login-password --region us-east-1 | docker login --username AWS --password-stdin public.ecr.aws",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
-            ]
-        )
+                def respond():
+                    connection, _ = server.accept()
+                    with connection:
+                        requests.append(connection.recv(1024))
+                        connection.sendall(b"HTTP/1.1 200 OK\r\n\r\nOK")
 
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_running),
-    )
-    def test_docker_login_with_private_repository(self, run):
-        with self.ssm_client_stub:
-            Docker.login(
-                registry="000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                ssm_client=self.ssm_client,
+                thread = threading.Thread(target=respond)
+                thread.start()
+                self.assertTrue(Docker.ping(socket_path))
+                thread.join()
+
+        self.assertTrue(requests[0].startswith(b"GET /_ping HTTP/1.0\r\n"))
+
+    def test_pinging_docker_when_the_socket_does_not_exist(self):
+        self.assertFalse(Docker.ping("/does/not/exist/docker.sock"))
+
+
+class TestDockerBuilderCache(unittest.TestCase):
+    def setUp(self):
+        self.layout = tempfile.TemporaryDirectory()
+        self.addCleanup(self.layout.cleanup)
+
+    def add_cached_image(self, name, tag):
+        path = os.path.join(self.layout.name, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "index.json"), "w") as index:
+            json.dump(
+                {
+                    "manifests": [
+                        {
+                            "digest": "sha256:abc",
+                            "annotations": {"org.opencontainers.image.ref.name": tag},
+                        }
+                    ]
+                },
+                index,
             )
 
-        run.assert_has_calls(
-            [
-                call(
-                    f"aws ecr get-login-password --region oz-wizd-1 | docker login --username AWS --password-stdin 000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
-            ]
+    def test_finding_a_cached_image(self):
+        self.add_cached_image("paketobuildpacks/builder-jammy-full", "0.3.288")
+
+        self.assertEqual(
+            get_cached_image_reference(BUILDER, self.layout.name),
+            f"ocidir://{self.layout.name}/paketobuildpacks/builder-jammy-full:0.3.288",
+        )
+        self.assertIsNone(
+            get_cached_image_reference(
+                "paketobuildpacks/builder-jammy-full:0.3.294", self.layout.name
+            )
         )
 
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_running),
-    )
-    def test_docker_login_to_docker_hub(self, run):
-        os.environ["CODESTAR_CONNECTION_ARN"] = "something"
+    @patch("subprocess.run")
+    @patch("subprocess.Popen")
+    def test_loading_a_cached_image(self, popen, run):
+        self.add_cached_image("paketobuildpacks/builder-jammy-full", "0.3.288")
+        popen().wait.return_value = 0
+        run.return_value = StubbedProcess(returncode=0)
 
-        with self.ssm_client_stub:
-            Docker.login(
-                registry="000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                ssm_client=self.ssm_client,
-            )
+        self.assertTrue(Docker.load_cached_image(BUILDER, self.layout.name))
 
-        run.assert_has_calls(
+        popen.assert_called_with(
             [
-                call(
-                    "docker login --username USER --password PASS",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
-                call(
-                    f"aws ecr get-login-password --region oz-wizd-1 | docker login --username AWS --password-stdin 000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
-            ]
+                "regctl",
+                "image",
+                "export",
+                "--name",
+                BUILDER,
+                f"ocidir://{self.layout.name}/paketobuildpacks/builder-jammy-full:0.3.288",
+            ],
+            stdout=subprocess.PIPE,
+        )
+        run.assert_called_once_with(
+            ["docker", "load"],
+            stdin=popen().stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
         )
 
-    @patch(
-        "subprocess.run",
-        return_value=StubbedProcess(returncode=returncode_docker_running),
-    )
-    def test_docker_login_failed_logging_into_docker_hub(self, run):
-        os.environ["CODESTAR_CONNECTION_ARN"] = "something"
+    @patch("subprocess.run")
+    @patch("subprocess.Popen")
+    def test_loading_an_image_that_is_not_cached(self, popen, run):
+        self.assertFalse(Docker.load_cached_image(BUILDER, self.layout.name))
 
-        self.ssm_client_stub.add_client_error("get_parameter")
+        popen.assert_not_called()
+        run.assert_not_called()
 
-        with self.ssm_client_stub:
-            Docker.login(
-                registry="000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                ssm_client=self.ssm_client,
-            )
+    @patch("subprocess.run")
+    @patch("subprocess.Popen")
+    def test_loading_a_cached_image_that_fails_to_load(self, popen, run):
+        self.add_cached_image("paketobuildpacks/builder-jammy-full", "0.3.288")
+        popen().wait.return_value = 0
+        run.return_value = StubbedProcess(returncode=1, stderr="no space left")
 
-        run.assert_has_calls(
-            [
-                call(
-                    f"aws ecr get-login-password --region oz-wizd-1 | docker login --username AWS --password-stdin 000000000000.dkr.ecr.oz-wizd-1.amazonaws.com",
-                    stdout=subprocess.PIPE,
-                    shell=True,
-                ),
-            ]
+        self.assertFalse(Docker.load_cached_image(BUILDER, self.layout.name))
+
+    @patch("subprocess.run", return_value=StubbedProcess(returncode=1))
+    def test_saving_an_image_that_cannot_be_copied(self, run):
+        with pytest.raises(DockerError):
+            save_to_oci_layout(BUILDER, self.layout.name)
+
+        self.assertEqual(
+            run.call_args.args[0][-1],
+            f"ocidir://{self.layout.name}/paketobuildpacks/builder-jammy-full:0.3.288",
         )
@@ -0,0 +1,249 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from image_builder.fleet import FAILED
+from image_builder.fleet import REBASED
+from image_builder.fleet import SKIPPED
+from image_builder.fleet import FleetImage
+from image_builder.fleet import FleetManifestError
+from image_builder.fleet import FleetRebaser
+from image_builder.fleet import FleetRebaseResult
+from image_builder.fleet import FleetState
+from image_builder.fleet import RegistryRateLimiter
+from image_builder.fleet import load_fleet_manifest
+from image_builder.images import ResolvedImage
+from image_builder.pack import PackCommandFailedError
+from image_builder.registry import RegistryError
+
+REGISTRY = "000000000000.dkr.ecr.region.amazonaws.com"
+
+
+class TestFleetManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name).joinpath("fleet.yml")
+
+    def test_loading_a_manifest(self):
+        self.path.write_text(
+            f"""
+run_image: paketobuildpacks/run-jammy-full:latest
+images:
+  - repository: {REGISTRY}/app/application
+    commit: abc1234
+    tags: [tag-v1.0.0, tag-latest]
+  - repository: {REGISTRY}/other/application
+    tag: tag-v2.0.0
+"""
+        )
+
+        run_image, images = load_fleet_manifest(self.path)
+
+        self.assertEqual(run_image, "paketobuildpacks/run-jammy-full:latest")
+        self.assertEqual(images[0].key, f"{REGISTRY}/app/application:commit-abc1234")
+        self.assertEqual(images[0].registry, REGISTRY)
+        self.assertEqual(images[0].tags, ["commit-abc1234", "tag-v1.0.0", "tag-latest"])
+        self.assertEqual(images[1].tag, "tag-v2.0.0")
+        self.assertEqual(images[1].tags, ["tag-v2.0.0"])
+
+    @parameterized.expand(
+        [
+            ("images: {}", "must contain a list of images"),
+            ("images: [{tag: commit-abc1234}]", "must have a repository"),
+            ("images: [{repository: app/application}]", "must have a tag"),
+        ]
+    )
+    def test_loading_an_invalid_manifest(self, contents, message):
+        self.path.write_text(contents)
+
+        with self.assertRaisesRegex(FleetManifestError, message):
+            load_fleet_manifest(self.path)
+
+
+class TestFleetState(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name).joinpath("state.json")
+        self.images = [
+            FleetImage(f"{REGISTRY}/app/{name}", "commit-abc1234")
+            for name in ["one", "two", "three"]
+        ]
+
+    def record(self, run_image):
+        state = FleetState(self.path, run_image)
+        state.record(FleetRebaseResult(self.images[0], REBASED, 1.5))
+        state.record(FleetRebaseResult(self.images[1], SKIPPED, 0.5))
+        state.record(FleetRebaseResult(self.images[2], FAILED, 2.0, "denied"))
+
+    def test_completed_images_are_done_when_resuming(self):
+        self.record("run@sha256:run")
+
+        state = FleetState(self.path, "run@sha256:run")
+
+        self.assertEqual(
+            [state.is_done(image) for image in self.images], [True, True, False]
+        )
+        self.assertEqual(
+            json.loads(self.path.read_text())["results"][self.images[2].key]["error"],
+            "denied",
+        )
+
+    def test_progress_is_reset_for_another_run_image(self):
+        self.record("run@sha256:run")
+
+        state = FleetState(self.path, "run@sha256:newer")
+
+        self.assertFalse(any(state.is_done(image) for image in self.images))
+
+
+class TestRegistryRateLimiter(unittest.TestCase):
+    def test_concurrency_is_limited_per_registry(self):
+        limiter = RegistryRateLimiter(max_concurrent=2, interval=0)
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+        lock = threading.Lock()
+
+        def rebase(registry):
+            with limiter.limit(registry):
+                with lock:
+                    running[registry] += 1
+                    peak[registry] = max(peak[registry], running[registry])
+                time.sleep(0.05)
+                with lock:
+                    running[registry] -= 1
+
+        threads = [
+            threading.Thread(target=rebase, args=(registry,))
+            for registry in ["a", "b"] * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak, {"a": 2, "b": 2})
+
+    def test_starts_are_spaced_per_registry(self):
+        limiter = RegistryRateLimiter(max_concurrent=3, interval=0.05)
+        start_time = time.monotonic()
+
+        for _ in range(3):
+            with limiter.limit("a"):
+                pass
+        with limiter.limit("b"):
+            pass
+
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.1)
+        self.assertLess(time.monotonic() - start_time, 0.5)
+
+
+@patch(
+    "image_builder.fleet.resolve_image",
+    return_value=ResolvedImage(
+        "run:latest", "run@sha256:run", {"rootfs": {"diff_ids": ["sha256:top"]}}
+    ),
+)
+@patch("image_builder.fleet.rebase_image", return_value=True)
+class TestFleetRebaser(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.state_path = Path(self.directory.name).joinpath("state.json")
+        self.images = [
+            FleetImage(f"{REGISTRY}/app/{name}", "commit-abc1234")
+            for name in ["one", "two", "three"]
+        ]
+
+    def rebaser(self):
+        return FleetRebaser(
+            "run:latest",
+            self.state_path,
+            RegistryRateLimiter(interval=0),
+        )
+
+    def test_rebasing_the_fleet_onto_the_pinned_run_image(
+        self, rebase_image, resolve_image
+    ):
+        completed = []
+
+        results = self.rebaser().rebase(self.images, completed.append)
+
+        self.assertEqual([r.status for r in results], [REBASED] * 3)
+        self.assertEqual(len(completed), 3)
+        rebase_image.assert_any_call(
+            f"{REGISTRY}/app/one",
+            "commit-abc1234",
+            ["commit-abc1234"],
+            "run@sha256:run",
+            "sha256:top",
+            prefix=f"[{REGISTRY}/app/one:commit-abc1234] ",
+        )
+
+    def test_failures_are_recorded_and_retried_when_resuming(
+        self, rebase_image, resolve_image
+    ):
+        rebase_image.side_effect = lambda repository, *args, **kwargs: (
+            False
+            if repository.endswith("one")
+            else (_ for _ in ()).throw(PackCommandFailedError("denied"))
+        )
+
+        results = self.rebaser().rebase(self.images)
+
+        self.assertEqual([r.status for r in results], [SKIPPED, FAILED, FAILED])
+        self.assertEqual(results[1].error, "denied")
+
+        rebase_image.side_effect = None
+        rebase_image.reset_mock()
+        results = self.rebaser().rebase(self.images)
+
+        self.assertEqual(
+            [r.image.key for r in results], [i.key for i in self.images[1:]]
+        )
+        self.assertEqual(rebase_image.call_count, 2)
+
+    def test_progress_starts_again_when_the_tag_points_at_a_new_digest(
+        self, rebase_image, resolve_image
+    ):
+        self.assertEqual(len(self.rebaser().rebase(self.images)), 3)
+
+        resolve_image.return_value = ResolvedImage(
+            "run:latest", "run@sha256:patched", {"rootfs": {"diff_ids": ["sha256:new"]}}
+        )
+        results = self.rebaser().rebase(self.images)
+
+        self.assertEqual([r.status for r in results], [REBASED] * 3)
+        self.assertEqual(
+            rebase_image.call_args.args[3:], ("run@sha256:patched", "sha256:new")
+        )
+
+        self.assertEqual(self.rebaser().rebase(self.images), [])
+
+    def test_unexpected_errors_are_recorded_as_failures(
+        self, rebase_image, resolve_image
+    ):
+        rebase_image.side_effect = [True, OSError("no space left"), True]
+
+        results = self.rebaser().rebase(self.images)
+
+        self.assertEqual(
+            sorted(r.status for r in results), sorted([REBASED, FAILED, REBASED])
+        )
+        self.assertIn("no space left", [r.error for r in results])
+
+    def test_rebasing_onto_the_tag_when_the_run_image_cannot_be_resolved(
+        self, rebase_image, resolve_image
+    ):
+        resolve_image.side_effect = RegistryError("unauthorized")
+
+        self.rebaser().rebase(self.images[:1])
+
+        self.assertEqual(rebase_image.call_args.args[3:], ("run:latest", None))
@@ -0,0 +1,179 @@
+import json
+from test.base_test_case import BaseTestCase
+from test.doubles.process import StubbedProcess
+from test.doubles.registry import FakeRegistry
+from test.doubles.registry import digest_of
+from unittest.mock import call
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from image_builder.images import BUILDER_METADATA_LABEL
+from image_builder.images import ImageReference
+from image_builder.images import pull_images
+from image_builder.images import resolve_builder_images
+from image_builder.images import resolve_image
+from image_builder.registry import OCI_INDEX
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
+
+
+class TestImageReference(BaseTestCase):
+    @parameterized.expand(
+        [
+            (
+                "paketobuildpacks/builder-jammy-full:0.3.288",
+                "paketobuildpacks/builder-jammy-full",
+                "registry-1.docker.io",
+                "paketobuildpacks/builder-jammy-full",
+                "0.3.288",
+            ),
+            ("ubuntu", "ubuntu", "registry-1.docker.io", "library/ubuntu", "latest"),
+            (
+                "public.ecr.aws/uktrade/run:tag",
+                "public.ecr.aws/uktrade/run",
+                "public.ecr.aws",
+                "uktrade/run",
+                "tag",
+            ),
+            (
+                "localhost:5000/run@sha256:abc",
+                "localhost:5000/run",
+                "localhost:5000",
+                "run",
+                "sha256:abc",
+            ),
+        ]
+    )
+    def test_parsing_image_references(
+        self, image, name, client_registry, repository, reference
+    ):
+        parsed = ImageReference(image)
+
+        self.assertEqual(parsed.name, name)
+        self.assertEqual(parsed.client_registry, client_registry)
+        self.assertEqual(parsed.repository, repository)
+        self.assertEqual(parsed.reference, reference)
+
+
+@patch(
+    "image_builder.images.get_registry_client",
+    side_effect=lambda registry, credentials_registry: RegistryClient(registry),
+)
+class TestResolveImages(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = FakeRegistry().start()
+
+    def tearDown(self):
+        self.registry.stop()
+        super().tearDown()
+
+    def add_builder(self, run_image_metadata):
+        return self.registry.add_image(
+            "builder",
+            ["0.3.288"],
+            [b"builder"],
+            {BUILDER_METADATA_LABEL: json.dumps(run_image_metadata)},
+        )
+
+    def test_resolving_an_image_pins_it_by_digest(self, get_registry_client):
+        digest = self.registry.add_image("run", ["latest"], [b"run"])
+
+        resolved = resolve_image(f"{self.registry.address}/run:latest")
+
+        self.assertEqual(resolved.pinned, f"{self.registry.address}/run@{digest}")
+
+    def test_resolving_an_index_pins_the_index(self, get_registry_client):
+        arm64 = self.registry.add_image("run", [], [b"arm64"], {"arch": "arm64"})
+        amd64 = self.registry.add_image("run", [], [b"amd64"], {"arch": "amd64"})
+        index = json.dumps(
+            {
+                "schemaVersion": 2,
+                "mediaType": OCI_INDEX,
+                "manifests": [
+                    {
+                        "digest": arm64,
+                        "platform": {"os": "linux", "architecture": "arm64"},
+                    },
+                    {
+                        "digest": amd64,
+                        "platform": {"os": "linux", "architecture": "amd64"},
+                    },
+                ],
+            }
+        ).encode()
+        self.registry.manifests[("run", "latest")] = (OCI_INDEX, index)
+
+        resolved = resolve_image(f"{self.registry.address}/run:latest")
+
+        self.assertEqual(
+            resolved.pinned, f"{self.registry.address}/run@{digest_of(index)}"
+        )
+        self.assertEqual(resolved.labels, {"arch": "amd64"})
+
+    @parameterized.expand(
+        [
+            ({"run": {"images": [{"image": "{registry}/run:latest"}]}},),
+            ({"stack": {"runImage": {"image": "{registry}/run:latest"}}},),
+        ]
+    )
+    def test_resolving_a_builder_resolves_its_run_image(
+        self, get_registry_client, metadata
+    ):
+        metadata = json.loads(
+            json.dumps(metadata).replace("{registry}", self.registry.address)
+        )
+        builder = self.add_builder(metadata)
+        run = self.registry.add_image("run", ["latest"], [b"run"])
+
+        images = resolve_builder_images(f"{self.registry.address}/builder:0.3.288")
+
+        self.assertEqual(
+            images,
+            (
+                f"{self.registry.address}/builder@{builder}",
+                f"{self.registry.address}/run@{run}",
+            ),
+        )
+
+    def test_resolving_a_builder_with_a_run_image(self, get_registry_client):
+        self.add_builder({})
+        custom = self.registry.add_image("custom", ["latest"], [b"custom"])
+
+        images = resolve_builder_images(
+            f"{self.registry.address}/builder:0.3.288",
+            f"{self.registry.address}/custom:latest",
+        )
+
+        self.assertEqual(images[1], f"{self.registry.address}/custom@{custom}")
+
+    def test_resolving_a_missing_image_raises_an_error(self, get_registry_client):
+        with self.assertRaises(RegistryError):
+            resolve_image(f"{self.registry.address}/builder:missing")
+
+
+class TestPullImages(BaseTestCase):
+    @patch("subprocess.run", return_value=StubbedProcess(returncode=0))
+    def test_pulling_images_pulls_each_image_once(self, subprocess_run):
+        failed = pull_images(["builder@sha256:a", "run@sha256:b", "builder@sha256:a"])
+
+        subprocess_run.assert_has_calls(
+            [
+                call(["docker", "pull", "builder@sha256:a"]),
+                call(["docker", "pull", "run@sha256:b"]),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(subprocess_run.call_count, 2)
+        self.assertEqual(failed, [])
+
+    @patch("subprocess.run")
+    def test_pulling_images_reports_failed_pulls(self, subprocess_run):
+        subprocess_run.side_effect = lambda command: StubbedProcess(
+            returncode=1 if command[-1] == "run@sha256:b" else 0
+        )
+
+        failed = pull_images(["builder@sha256:a", "run@sha256:b"])
+
+        self.assertEqual(failed, ["run@sha256:b"])
@@ -1,4 +1,5 @@
 import os
+import threading
 import unittest
 from test.doubles.slack import WebClient
 from unittest.mock import ANY
@@ -252,6 +253,140 @@ class TestNotify(unittest.TestCase):
         )
 
 
+@patch("builtins.round", return_value=15)
+@patch("image_builder.notify.WebClient", return_value=WebClient("slack-token"))
+class TestNotifyInBackground(unittest.TestCase):
+    def setUp(self):
+        os.environ["SLACK_TOKEN"] = "slack-token"
+        os.environ["SLACK_CHANNEL_ID"] = "channel-id"
+        os.environ[
+            "CODEBUILD_BUILD_ARN"
+        ] = "arn:aws:codebuild:region:000000000000:build/project:example-build-id"
+        self.attrs = {
+            "repository_name": "org/repo",
+            "revision_commit": "commit-sha",
+            "repository_url": "https://github.com/org/repo",
+        }
+
+    def test_first_progress_message_sets_the_reference_before_returning(
+        self, webclient, time
+    ):
+        notify = Notify(True, background=True)
+        notify.slack = WebClient("slack-token")
+
+        notify.post_build_progress(Progress(), self.attrs)
+
+        self.assertEqual(notify.reference, "first-message")
+        notify.close()
+
+    def test_starting_a_thread_sets_the_reference_for_replies(self, webclient, time):
+        notify = Notify(True, background=True)
+        notify.slack = WebClient("slack-token")
+
+        notify.start_thread("Rebasing", ["Rebasing 2 images"])
+        notify.post_job_comment("Rebased", ["Rebased 1 image"])
+        notify.close()
+
+        self.assertEqual(notify.reference, "first-message")
+        self.assertIsNone(
+            notify.slack.chat_postMessage.call_args_list[0].kwargs["thread_ts"]
+        )
+        self.assertEqual(
+            notify.slack.chat_postMessage.call_args_list[1].kwargs["thread_ts"],
+            "first-message",
+        )
+
+    def test_queued_progress_updates_are_merged(self, webclient, time):
+        notify = Notify(True, background=True)
+        notify.slack = WebClient("slack-token")
+        progress = Progress()
+        progress.current_phase_running()
+        notify.post_build_progress(progress, self.attrs)
+
+        sending = threading.Event()
+        release = threading.Event()
+        notify.slack.chat_postMessage.side_effect = lambda **kwargs: (
+            sending.set(),
+            release.wait(5),
+            {"ts": "comment"},
+        )[-1]
+        notify.post_job_comment("Comment", ["A comment"])
+        sending.wait(5)
+
+        for phase in ["build", "publish", "deploy"]:
+            progress.current_phase_success()
+            progress.set_current_phase(phase)
+            progress.current_phase_running()
+            notify.post_build_progress(progress, self.attrs)
+        release.set()
+        notify.close()
+
+        notify.slack.chat_update.assert_called_once_with(
+            channel="channel-id",
+            ts="first-message",
+            blocks=get_expected_message_blocks(
+                setup="success", build="success", publish="success", deploy="running"
+            ),
+            text="Building: org/repo@commit-sha",
+            unfurl_links=False,
+            unfurl_media=False,
+        )
+
+    @patch("image_builder.notify.time.sleep")
+    def test_rate_limited_messages_are_retried(self, sleep, webclient, time):
+        notify = Notify(True, background=True)
+        notify.slack = WebClient("slack-token")
+        notify.reference = "first-message"
+        notify.slack.chat_postMessage.side_effect = [
+            SlackApiError(message="ratelimited", response=rate_limited_response(7)),
+            {"ts": "comment"},
+        ]
+
+        notify.post_job_comment("Comment", ["A comment"])
+        notify.close()
+
+        sleep.assert_called_once_with(7)
+        self.assertEqual(notify.slack.chat_postMessage.call_count, 2)
+
+    def test_rate_limit_retries_stop_at_the_flush_deadline(self, webclient, time):
+        mock_logger = MagicMock()
+        notify = Notify(True, logger=mock_logger, background=True)
+        notify.slack = WebClient("slack-token")
+        notify.reference = "first-message"
+        notify.slack.chat_postMessage.side_effect = SlackApiError(
+            message="ratelimited", response=rate_limited_response(60)
+        )
+
+        notify.dispatcher.deadline = 0
+        notify.post_job_comment("Comment", ["A comment"])
+        notify.close()
+
+        self.assertEqual(notify.slack.chat_postMessage.call_count, 1)
+        mock_logger.error.assert_called_once_with("Slack API Error: ratelimited")
+
+    def test_closing_drops_messages_still_pending_after_the_deadline(
+        self, webclient, time
+    ):
+        mock_logger = MagicMock()
+        notify = Notify(True, logger=mock_logger, background=True)
+        notify.slack = WebClient("slack-token")
+        notify.reference = "first-message"
+        release = threading.Event()
+        notify.slack.chat_postMessage.side_effect = lambda **kwargs: (
+            release.wait(5),
+            {"ts": "comment"},
+        )[-1]
+
+        notify.post_job_comment("First", ["First comment"])
+        notify.post_job_comment("Second", ["Second comment"])
+        notify.close(timeout=0.1)
+        release.set()
+
+        mock_logger.error.assert_called_once_with(
+            "Dropped 1 Slack messages still pending after 0.1 s"
+        )
+
+
 def test_slack_api_error_on_chat_post_message_in_post_build_progress_method():
     mock_logger = MagicMock()
     notify = Notify(True, logger=mock_logger)
@@ -395,6 +530,14 @@ def test_exception_on_chat_post_message_in_post_job_comment_method():
     )
 
 
+def rate_limited_response(retry_after):
+    response = MagicMock()
+    response.status_code = 429
+    response.headers = {"Retry-After": str(retry_after)}
+    response.__getitem__.side_effect = {"error": "ratelimited"}.__getitem__
+    return response
+
+
 def get_expected_message_blocks(
     setup="running", build="pending", publish="pending", deploy="pending"
 ):
@@ -1,22 +1,37 @@
 import os
 import subprocess
+import unittest
 from pathlib import Path
 from test.base_test_case import BaseTestCase
 from test.doubles.codebase import load_codebase_languages_double
 from test.doubles.codebase import load_codebase_processes_double
 from test.doubles.codebase import load_codebase_revision_double
+from test.doubles.registry import FakeRegistry
 from unittest import mock
+from unittest.mock import MagicMock
 from unittest.mock import patch
 
 from parameterized import parameterized
 from yaml import dump
 
 from image_builder.codebase.codebase import Codebase
+from image_builder.codebase.language import Languages
+from image_builder.codebase.processes import Process
 from image_builder.codebase.revision import Revision
+from image_builder.configuration.codebase import load_cache_configuration
 from image_builder.const import ADDITIONAL_ECR_REPO
 from image_builder.const import ECR_REPO
+from image_builder.images import LIFECYCLE_METADATA_LABEL
+from image_builder.images import ResolvedImage
+from image_builder.pack import BUILD_KEY_LABEL
 from image_builder.pack import Pack
 from image_builder.pack import PackCommandFailedError
+from image_builder.pack import PackNoProcessesError
+from image_builder.pack import PackOutputReader
+from image_builder.pack import PackRebaseError
+from image_builder.progress import Progress
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
 
 
 @patch(
@@ -175,6 +190,11 @@ class TestPackBuildpacks(BaseTestCase):
 class TestPackEnvironment(BaseTestCase):
     def setUp(self):
         super().setUp()
+        build_key = patch(
+            "image_builder.pack.Pack.get_build_key", return_value="build-key"
+        )
+        build_key.start()
+        self.addCleanup(build_key.stop)
         os.environ[
             "CODEBUILD_BUILD_ARN"
         ] = "arn:aws:codebuild:region:000000000000:build/project:example-build-id"
@@ -232,7 +252,7 @@ class TestPackEnvironment(BaseTestCase):
                 "BP_OCI_SOURCE=https://github.com/org/repo",
                 "BPE_DD_GIT_REPOSITORY_URL=https://github.com/org/repo",
                 "BPE_DD_GIT_COMMIT_SHA=longhash",
-                'BP_IMAGE_LABELS="uk.gov.trade.digital.build.timestamp=timestamp"',
+                'BP_IMAGE_LABELS="uk.gov.trade.digital.build.timestamp=timestamp uk.gov.trade.digital.build.key=build-key"',
             ],
         )
 
@@ -293,6 +313,11 @@ class TestPackEnvironment(BaseTestCase):
 class TestCommand(BaseTestCase):
     def setUp(self):
         super().setUp()
+        build_key = patch(
+            "image_builder.pack.Pack.get_build_key", return_value="build-key"
+        )
+        build_key.start()
+        self.addCleanup(build_key.stop)
         self.setUpPyfakefs()
         self.fs.create_dir(".copilot")
         self.fs.create_file(
@@ -352,7 +377,7 @@ class TestCommand(BaseTestCase):
             "--env BP_OCI_SOURCE=https://github.com/org/repo",
             "--env BPE_DD_GIT_REPOSITORY_URL=https://github.com/org/repo",
             "--env BPE_DD_GIT_COMMIT_SHA=longhash",
-            '--env BP_IMAGE_LABELS="uk.gov.trade.digital.build.timestamp=timestamp"',
+            '--env BP_IMAGE_LABELS="uk.gov.trade.digital.build.timestamp=timestamp uk.gov.trade.digital.build.key=build-key"',
             "--buildpack paketo-buildpacks/git",
             "--buildpack paketo-buildpacks/python",
             "--buildpack paketo-buildpacks/nodejs",
@@ -469,6 +494,330 @@ class TestCommand(BaseTestCase):
 
         self.assertEqual(pack.get_command(run_image="nice-secure-base-image"), expected)
 
+    @patch(
+        "image_builder.pack.resolve_builder_images",
+        return_value=("builder@sha256:builder", "run@sha256:run"),
+    )
+    @patch("image_builder.pack.pull_images", return_value=[])
+    def test_get_command_with_pinned_images(
+        self,
+        pull_images,
+        resolve_builder_images,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+
+        pack.resolve_images()
+        pack.pull_images()
+        pack.pull_images()
+
+        pull_images.assert_called_once_with(
+            ["builder@sha256:builder", "run@sha256:run"]
+        )
+        expected = " ".join(
+            [
+                command.replace(
+                    "paketobuildpacks/builder-jammy-full:0.3.288",
+                    "builder@sha256:builder",
+                )
+                for command in self.expected_command
+            ]
+            + ["--pull-policy if-not-present", "--run-image run@sha256:run"]
+        )
+        self.assertEqual(pack.get_command(), expected)
+
+    @patch(
+        "image_builder.pack.resolve_builder_images",
+        return_value=("builder@sha256:builder", "run@sha256:run"),
+    )
+    @patch("image_builder.pack.pull_images", return_value=["run@sha256:run"])
+    def test_get_command_when_pulling_images_fails(
+        self,
+        pull_images,
+        resolve_builder_images,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+
+        pack.resolve_images()
+        pack.pull_images()
+
+        self.assertFalse(pack.images_pulled)
+        self.assertNotIn("--pull-policy", pack.get_command())
+        pack.pull_images()
+        self.assertEqual(pull_images.call_count, 2)
+
+    @patch(
+        "image_builder.pack.resolve_builder_images",
+        return_value=("builder@sha256:builder", "run@sha256:run"),
+    )
+    @patch("image_builder.pack.Docker.load_cached_image", return_value=True)
+    @patch("image_builder.pack.pull_images", return_value=[])
+    def test_get_command_with_cached_builder(
+        self,
+        pull_images,
+        load_cached_image,
+        resolve_builder_images,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+
+        pack.load_cached_builder()
+        pack.resolve_images()
+        pack.pull_images()
+
+        load_cached_image.assert_called_once_with(
+            "paketobuildpacks/builder-jammy-full:0.3.288"
+        )
+        pull_images.assert_called_once_with(["run@sha256:run"])
+        self.assertEqual(
+            pack.get_command(),
+            " ".join(
+                self.expected_command
+                + ["--pull-policy if-not-present", "--run-image run@sha256:run"]
+            ),
+        )
+
+    @patch(
+        "image_builder.pack.resolve_builder_images",
+        side_effect=RegistryError("unauthorized"),
+    )
+    def test_get_command_when_images_cannot_be_resolved(
+        self,
+        resolve_builder_images,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+
+        pack.resolve_images()
+
+        self.assertEqual(pack.get_command(), " ".join(self.expected_command))
+
+    @parameterized.expand(
+        [
+            ({"type": "volume"}, "--cache 'type=build;format=volume'"),
+            (
+                {"type": "volume", "name": "app-cache"},
+                "--cache 'type=build;format=volume;name=app-cache'",
+            ),
+            (
+                {"type": "bind", "path": "/codebuild/cache/pack"},
+                "--cache 'type=build;format=bind;source=/codebuild/cache/pack'",
+            ),
+        ]
+    )
+    def test_get_command_with_local_cache(
+        self,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+        cache_config,
+        cache_option,
+    ):
+        codebase = Codebase(Path("."))
+        codebase.build.cache = load_cache_configuration(cache_config)
+        pack = Pack(codebase, "timestamp")
+
+        self.assertEqual(
+            pack.get_command(), " ".join(self.expected_command + [cache_option])
+        )
+        self.assertEqual(
+            pack.get_command(True),
+            " ".join(self.expected_command + ["--publish", cache_option]),
+        )
+
+    def test_get_command_with_process(
+        self,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+        process_repository = "000000000000.dkr.ecr.region.amazonaws.com/ecr/repos/web"
+
+        expected = " ".join(
+            [
+                command.replace(
+                    "000000000000.dkr.ecr.region.amazonaws.com/ecr/repos",
+                    process_repository,
+                )
+                for command in self.expected_command
+            ]
+            + [
+                "--default-process web --pull-policy if-not-present",
+                f"--publish --cache-image {process_repository}:cache",
+            ]
+        )
+
+        self.assertEqual(pack.get_command(True, process="web"), expected)
+
+    @parameterized.expand(
+        [
+            ({"type": "volume"}, "--cache 'type=build;format=volume'"),
+            (
+                {"type": "volume", "name": "app-cache"},
+                "--cache 'type=build;format=volume;name=app-cache-web'",
+            ),
+            (
+                {"type": "bind", "path": "/codebuild/cache/pack"},
+                "--cache 'type=build;format=bind;source=/codebuild/cache/pack/web'",
+            ),
+        ]
+    )
+    def test_process_images_have_their_own_local_cache(
+        self,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+        cache_config,
+        cache_option,
+    ):
+        codebase = Codebase(Path("."))
+        codebase.build.cache = load_cache_configuration(cache_config)
+        pack = Pack(codebase, "timestamp")
+
+        self.assertEqual(pack.get_cache_option(True, "web"), cache_option)
+
+    @patch("image_builder.pack.create_repository")
+    @patch("subprocess.run")
+    def test_build_processes(
+        self,
+        subprocess_run,
+        create_repository,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        worker = Process()
+        worker.name = "worker"
+        worker.commands = ["celery worker"]
+        codebase.processes.append(worker)
+        pack = Pack(codebase, "timestamp")
+        on_building = mock.Mock()
+        on_process_complete = mock.Mock()
+
+        def build(publish, on_building, on_exporting, run_image, process):
+            on_building()
+
+        with patch.object(pack, "build", side_effect=build) as pack_build:
+            results = pack.build_processes(
+                True,
+                on_building,
+                on_process_complete=on_process_complete,
+                max_workers=2,
+            )
+
+        subprocess_run.assert_called_once_with(
+            ["docker", "pull", "paketobuildpacks/builder-jammy-full:0.3.288"]
+        )
+        pack_build.assert_has_calls(
+            [
+                mock.call(True, mock.ANY, None, None, "web"),
+                mock.call(True, mock.ANY, None, None, "worker"),
+            ],
+            any_order=True,
+        )
+        on_building.assert_called_once()
+        self.assertEqual(on_process_complete.call_count, 2)
+        self.assertEqual([r.process for r in results], ["web", "worker"])
+        create_repository.assert_has_calls(
+            [
+                mock.call("000000000000.dkr.ecr.region.amazonaws.com/ecr/repos/web"),
+                mock.call("000000000000.dkr.ecr.region.amazonaws.com/ecr/repos/worker"),
+            ],
+            any_order=True,
+        )
+
+    @patch("image_builder.pack.create_repository")
+    def test_build_processes_when_a_repository_cannot_be_created(
+        self,
+        create_repository,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+        pack.images_pulled = True
+        create_repository.side_effect = RegistryError("access denied")
+
+        with patch.object(pack, "build") as pack_build:
+            with self.assertRaisesRegex(PackCommandFailedError, "web: access denied"):
+                pack.build_processes(True)
+
+        pack_build.assert_not_called()
+
+    def test_build_processes_without_processes(
+        self,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        codebase.processes.clear()
+        pack = Pack(codebase, "timestamp")
+
+        with patch.object(pack, "build") as pack_build:
+            with self.assertRaisesRegex(PackNoProcessesError, "No processes"):
+                pack.build_processes()
+
+        pack_build.assert_not_called()
+
+    @patch("subprocess.run")
+    def test_build_processes_with_error(
+        self,
+        subprocess_run,
+        publish_to_additional,
+        subprocess_popen,
+        load_codebase_revision,
+        load_codebase_processes,
+        load_codebase_languages,
+    ):
+        codebase = Codebase(Path("."))
+        pack = Pack(codebase, "timestamp")
+
+        with patch.object(
+            pack, "build", side_effect=PackCommandFailedError("no space left")
+        ):
+            with self.assertRaises(PackCommandFailedError) as e:
+                pack.build_processes()
+
+        self.assertEqual(str(e.exception), "web: no space left")
+
     def test_build(
         self,
         publish_to_additional,
@@ -642,3 +991,250 @@ class TestCommandErrors(BaseTestCase):
 
         self.assertEqual(len(str(e.exception)), 2500)
         self.assertNotIn("Not in notification", str(e.exception))
+
+
+class TestPackOutputReader(unittest.TestCase):
+    def test_reading_large_error_output_does_not_block(self):
+        proc = subprocess.Popen(
+            "head -c 1048576 /dev/zero | tr '\\0' x >&2; "
+            "echo '===> DETECTING'; echo '===> BUILDING'; echo done; exit 1",
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        on_phase = mock.Mock()
+
+        reader = PackOutputReader(proc, on_phase)
+        reader.read()
+
+        self.assertEqual(proc.returncode, 1)
+        on_phase.assert_has_calls([mock.call("DETECTING"), mock.call("BUILDING")])
+        self.assertEqual(str(reader.error), "x" * 2500)
+
+    def test_reading_output_without_trailing_newline(self):
+        proc = subprocess.Popen(
+            "printf '===> EXPORTING\\nlast line'",
+            shell=True,
+            stdout=subprocess.PIPE,
+        )
+        on_phase = mock.Mock()
+
+        with mock.patch("builtins.print") as mock_print:
+            PackOutputReader(proc, on_phase).read()
+
+        on_phase.assert_called_once_with("EXPORTING")
+        mock_print.assert_has_calls(
+            [mock.call("===> EXPORTING"), mock.call("last line")]
+        )
+
+
+class TestPackBuildTimings(unittest.TestCase):
+    @patch(
+        "image_builder.pack.Pack.get_command",
+        return_value="printf '===> DETECTING\\nok\\n===> BUILDING\\nok\\n===> EXPORTING\\n'",
+    )
+    def test_build_records_a_span_for_each_lifecycle_stage(self, get_command):
+        progress = Progress()
+
+        Pack(MagicMock(), progress=progress).build()
+
+        self.assertEqual(
+            [span.name for span in progress.spans],
+            ["pack.detecting", "pack.building", "pack.exporting"],
+        )
+        self.assertTrue(all(span.end_time is not None for span in progress.spans))
+
+
+@patch(
+    "image_builder.pack.get_registry_client",
+    side_effect=lambda registry: RegistryClient(registry),
+)
+@patch("image_builder.pack.Pack.get_command", return_value="true")
+class TestPackSkipExisting(unittest.TestCase):
+    def setUp(self):
+        self.registry = FakeRegistry().start()
+        self.codebase = MagicMock()
+        self.codebase.revision = load_codebase_revision_double(Path("."))
+        self.codebase.languages = Languages()
+        self.codebase.build.repository = f"{self.registry.address}/my/repo"
+        self.codebase.build.additional_repository = None
+        self.codebase.build.builder.name = "paketobuildpacks/builder-jammy-full"
+        self.codebase.build.builder.version = "0.3.288"
+        self.codebase.build.packages = []
+        self.codebase.build.packs = []
+        self.pack = Pack(self.codebase, "timestamp", skip_existing=True)
+
+    def tearDown(self):
+        self.registry.stop()
+
+    def add_existing_image(self, build_key):
+        self.registry.add_image(
+            "my/repo",
+            ["commit-shorthash"],
+            [b"layer"],
+            {BUILD_KEY_LABEL: build_key},
+        )
+
+    def test_build_is_skipped_when_the_build_key_matches(
+        self, get_command, get_registry_client
+    ):
+        self.add_existing_image(self.pack.get_build_key())
+        on_building = MagicMock()
+        on_exporting = MagicMock()
+
+        self.pack.build(True, on_building, on_exporting)
+
+        get_command.assert_not_called()
+        on_building.assert_called_once()
+        on_exporting.assert_called_once()
+        for tag in ["tag-v2.4.6", "tag-latest", "branch-feat-tests"]:
+            self.assertEqual(
+                self.registry.manifests[("my/repo", tag)],
+                self.registry.manifests[("my/repo", "commit-shorthash")],
+            )
+
+    def test_build_runs_when_the_build_key_differs(
+        self, get_command, get_registry_client
+    ):
+        self.add_existing_image("another-build-key")
+
+        self.pack.build(True)
+
+        get_command.assert_called_once()
+        self.assertNotIn(("my/repo", "tag-latest"), self.registry.manifests)
+
+    def test_build_runs_when_the_commit_has_no_image(
+        self, get_command, get_registry_client
+    ):
+        self.pack.build(True)
+
+        get_command.assert_called_once()
+
+    def test_build_runs_when_the_registry_cannot_be_checked(
+        self, get_command, get_registry_client
+    ):
+        get_registry_client.side_effect = RegistryError("no credentials")
+
+        self.pack.build(True)
+
+        get_command.assert_called_once()
+
+    def test_build_key_changes_with_the_ref_being_built(
+        self, get_command, get_registry_client
+    ):
+        build_key = self.pack.get_build_key()
+
+        self.codebase.revision.tag = None
+        self.codebase.revision.branch = "main"
+        pack = Pack(self.codebase, "timestamp", skip_existing=True)
+
+        self.assertNotEqual(pack.get_build_key(), build_key)
+        self.assertNotEqual(self.pack.get_build_key(process="web"), build_key)
+
+    def test_build_key_uses_the_resolved_run_image(
+        self, get_command, get_registry_client
+    ):
+        self.pack.run_image = "run@sha256:run"
+        build_key = self.pack.get_build_key("run:latest")
+
+        self.pack.run_image = "run@sha256:patched"
+
+        self.assertNotEqual(self.pack.get_build_key("run:latest"), build_key)
+        self.assertEqual(
+            build_key, self.pack.plan.get_build_key("run@sha256:run", None)
+        )
+
+
+@patch(
+    "image_builder.pack.get_registry_client",
+    side_effect=lambda registry: RegistryClient(registry),
+)
+class TestPackRebase(unittest.TestCase):
+    def setUp(self):
+        self.registry = FakeRegistry().start()
+        self.addCleanup(self.registry.stop)
+        self.codebase = MagicMock()
+        self.codebase.revision = load_codebase_revision_double(Path("."))
+        self.codebase.languages = Languages()
+        self.codebase.build.repository = f"{self.registry.address}/my/repo"
+        self.codebase.build.additional_repository = None
+        self.codebase.build.builder.name = "paketobuildpacks/builder-jammy-full"
+        self.codebase.build.builder.version = "0.3.288"
+        self.codebase.build.packages = []
+        self.codebase.build.packs = []
+        self.pack = Pack(self.codebase)
+
+    def add_built_image(self, top_layer):
+        self.registry.add_image(
+            "my/repo",
+            ["commit-shorthash"],
+            [b"layer"],
+            {
+                LIFECYCLE_METADATA_LABEL: f'{{"runImage": {{"topLayer": "{top_layer}"}}}}'
+            },
+        )
+
+    def test_get_rebase_command(self, get_registry_client):
+        self.pack.run_image = "run@sha256:run"
+
+        self.assertEqual(
+            self.pack.get_rebase_command("web"),
+            f"pack rebase {self.registry.address}/my/repo/web:commit-shorthash "
+            "--publish --run-image run@sha256:run",
+        )
+
+    @patch("image_builder.pack.get_rebase_command", return_value="true")
+    def test_rebase_retags_the_rebased_image(
+        self, get_rebase_command, get_registry_client
+    ):
+        self.add_built_image("sha256:old")
+
+        self.assertTrue(self.pack.rebase(run_image_top_layer="sha256:new"))
+
+        get_rebase_command.assert_called_once_with(
+            f"{self.registry.address}/my/repo:commit-shorthash", None
+        )
+        for tag in ["tag-v2.4.6", "tag-latest", "branch-feat-tests"]:
+            self.assertEqual(
+                self.registry.manifests[("my/repo", tag)],
+                self.registry.manifests[("my/repo", "commit-shorthash")],
+            )
+
+    @patch("image_builder.pack.get_rebase_command", return_value="true")
+    def test_rebase_is_skipped_when_already_on_the_run_image(
+        self, get_rebase_command, get_registry_client
+    ):
+        self.add_built_image("sha256:new")
+
+        self.assertFalse(self.pack.rebase(run_image_top_layer="sha256:new"))
+
+        get_rebase_command.assert_not_called()
+        self.assertNotIn(("my/repo", "tag-latest"), self.registry.manifests)
+
+    @patch("image_builder.pack.get_rebase_command", return_value="exit 1")
+    def test_rebase_fails_when_pack_fails(
+        self, get_rebase_command, get_registry_client
+    ):
+        self.add_built_image("sha256:old")
+
+        with self.assertRaises(PackCommandFailedError):
+            self.pack.rebase()
+
+        self.assertNotIn(("my/repo", "tag-latest"), self.registry.manifests)
+
+    def test_rebase_fails_when_the_commit_has_not_been_built(self, get_registry_client):
+        with self.assertRaises(PackRebaseError):
+            self.pack.rebase()
+
+    @patch(
+        "image_builder.pack.resolve_image",
+        return_value=ResolvedImage(
+            "run", "run@sha256:run", {"rootfs": {"diff_ids": ["sha256:a", "sha256:b"]}}
+        ),
+    )
+    def test_get_run_image_top_layer(self, resolve_image, get_registry_client):
+        self.pack.run_image = "run@sha256:run"
+
+        self.assertEqual(self.pack.get_run_image_top_layer(), "sha256:b")
+        resolve_image.assert_called_once_with("run@sha256:run")
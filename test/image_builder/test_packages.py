@@ -0,0 +1,233 @@
+import subprocess
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import call
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from image_builder.images import ResolvedImage
+from image_builder.packages import PackagesBuildError
+from image_builder.packages import PackagesImages
+from image_builder.packages import build_packages_image
+from image_builder.packages import get_packages_dockerfile
+from image_builder.packages import get_packages_images
+from image_builder.packages import get_packages_key
+from image_builder.registry import RegistryError
+from image_builder.registry import RegistryNotFoundError
+
+REPOSITORY = "000000000000.dkr.ecr.region.amazonaws.com/my/repo"
+BUILDER = "paketobuildpacks/builder-jammy-full:0.3.288"
+
+
+def resolved_image(image, user="cnb", labels=None):
+    return ResolvedImage(
+        image,
+        f"{image}@sha256:digest",
+        {"config": {"User": user, "Labels": labels or {}}},
+    )
+
+
+BUILDER_PINNED = "paketobuildpacks/builder-jammy-full@sha256:builder"
+RUN_IMAGE_PINNED = "paketobuildpacks/run-jammy-full@sha256:run"
+
+
+class TestPackagesKey(unittest.TestCase):
+    def test_key_does_not_depend_on_package_order(self):
+        self.assertEqual(
+            get_packages_key(["libpq-dev", "graphviz"], BUILDER, RUN_IMAGE_PINNED),
+            get_packages_key(
+                ["graphviz", "libpq-dev", "graphviz"], BUILDER, RUN_IMAGE_PINNED
+            ),
+        )
+
+    @parameterized.expand(
+        [
+            (["graphviz"], BUILDER_PINNED, RUN_IMAGE_PINNED),
+            (["libpq-dev"], "paketobuildpacks/builder@sha256:other", RUN_IMAGE_PINNED),
+            (["libpq-dev"], BUILDER_PINNED, "paketobuildpacks/run@sha256:patched"),
+        ]
+    )
+    def test_key_changes_with_the_inputs(self, packages, builder, run_image):
+        self.assertNotEqual(
+            get_packages_key(["libpq-dev"], BUILDER_PINNED, RUN_IMAGE_PINNED),
+            get_packages_key(packages, builder, run_image),
+        )
+
+
+class TestPackagesImages(unittest.TestCase):
+    def setUp(self):
+        self.images = PackagesImages(
+            REPOSITORY, ["libpq-dev", "graphviz"], BUILDER_PINNED, RUN_IMAGE_PINNED
+        )
+
+    def test_images_are_tagged_with_the_key(self):
+        self.assertEqual(self.images.packages, ["graphviz", "libpq-dev"])
+        self.assertEqual(
+            self.images.build_image, f"{REPOSITORY}:packages-build-{self.images.key}"
+        )
+        self.assertEqual(
+            self.images.prebuilt_run_image,
+            f"{REPOSITORY}:packages-run-{self.images.key}",
+        )
+
+    @patch("image_builder.packages.get_registry_client")
+    def test_images_exist(self, get_registry_client):
+        self.assertTrue(self.images.exists())
+
+        get_registry_client.assert_called_once_with(
+            "000000000000.dkr.ecr.region.amazonaws.com"
+        )
+        get_registry_client().get_manifest.assert_has_calls(
+            [call("my/repo", tag) for tag in self.images.tags]
+        )
+
+    @parameterized.expand(
+        [(RegistryNotFoundError("not found"),), (RegistryError("unauthorized"),)]
+    )
+    @patch("image_builder.packages.get_registry_client")
+    def test_images_do_not_exist(self, error, get_registry_client):
+        get_registry_client().get_manifest.side_effect = error
+
+        self.assertFalse(self.images.exists())
+
+    @patch("image_builder.packages.build_packages_image")
+    def test_build_from_the_pinned_base_images(self, build_packages_image):
+        self.images.build()
+
+        build_packages_image.assert_has_calls(
+            [
+                call(
+                    BUILDER_PINNED, self.images.build_image, ["graphviz", "libpq-dev"]
+                ),
+                call(
+                    RUN_IMAGE_PINNED,
+                    self.images.prebuilt_run_image,
+                    ["graphviz", "libpq-dev"],
+                ),
+            ]
+        )
+
+
+@patch("image_builder.packages.PackagesImages.exists", return_value=True)
+@patch(
+    "image_builder.packages.resolve_builder_images",
+    return_value=(BUILDER_PINNED, RUN_IMAGE_PINNED),
+)
+class TestGetPackagesImages(unittest.TestCase):
+    @staticmethod
+    def codebase(packages):
+        codebase = MagicMock()
+        codebase.build.packages = packages
+        codebase.build.repository = REPOSITORY
+        codebase.build.builder.name = "paketobuildpacks/builder-jammy-full"
+        codebase.build.builder.version = "0.3.288"
+        return codebase
+
+    def test_packages_images_are_keyed_by_the_base_image_digests(
+        self, resolve_builder_images, exists
+    ):
+        images = get_packages_images(self.codebase(["libpq-dev"]), "run-image")
+
+        self.assertTrue(images.available)
+        resolve_builder_images.assert_called_once_with(BUILDER, "run-image")
+        self.assertEqual(images.builder, BUILDER_PINNED)
+        self.assertEqual(images.run_image, RUN_IMAGE_PINNED)
+        self.assertEqual(
+            images.key,
+            get_packages_key(["libpq-dev"], BUILDER_PINNED, RUN_IMAGE_PINNED),
+        )
+
+    def test_patched_run_image_needs_new_packages_images(
+        self, resolve_builder_images, exists
+    ):
+        key = get_packages_images(self.codebase(["libpq-dev"])).key
+        resolve_builder_images.return_value = (
+            BUILDER_PINNED,
+            "paketobuildpacks/run-jammy-full@sha256:patched",
+        )
+
+        self.assertNotEqual(get_packages_images(self.codebase(["libpq-dev"])).key, key)
+
+    @parameterized.expand(
+        [
+            (RegistryError("unauthorized"), (BUILDER_PINNED, RUN_IMAGE_PINNED)),
+            (None, (BUILDER_PINNED, None)),
+        ]
+    )
+    def test_base_images_cannot_be_resolved(
+        self, resolve_builder_images, exists, error, resolved
+    ):
+        resolve_builder_images.side_effect = error
+        resolve_builder_images.return_value = resolved
+
+        self.assertIsNone(get_packages_images(self.codebase(["libpq-dev"])))
+        exists.assert_not_called()
+
+    @parameterized.expand(
+        [
+            ([],),
+            (["http://example.com/package.deb"],),
+            ([":repo:deb http://example.com/ubuntu jammy main"],),
+        ]
+    )
+    def test_no_packages_images(self, resolve_builder_images, exists, packages):
+        self.assertIsNone(get_packages_images(self.codebase(packages)))
+        resolve_builder_images.assert_not_called()
+        exists.assert_not_called()
+
+
+@patch("image_builder.packages.subprocess.run")
+class TestBuildPackagesImage(unittest.TestCase):
+    def test_dockerfile_installs_the_packages_as_root(self, run):
+        dockerfile = get_packages_dockerfile("base@sha256:digest", ["a", "b"], "cnb")
+
+        self.assertEqual(
+            dockerfile.splitlines(),
+            [
+                "FROM base@sha256:digest",
+                "USER root",
+                "RUN apt-get update \\",
+                "    && DEBIAN_FRONTEND=noninteractive apt-get install --yes "
+                "--no-install-recommends a b \\",
+                "    && rm -rf /var/lib/apt/lists/*",
+                "USER cnb",
+            ],
+        )
+
+    @patch("image_builder.packages.resolve_image")
+    def test_build_and_push(self, resolve_image, run):
+        run.return_value = subprocess.CompletedProcess([], 0)
+        base = resolved_image("run:latest", user="1002:1000")
+        resolve_image.return_value = base
+
+        build_packages_image("run:latest", "repo:packages-run-key", ["a"])
+
+        run.assert_has_calls(
+            [
+                call(
+                    ["docker", "build", "--tag", "repo:packages-run-key", "-"],
+                    input=get_packages_dockerfile(base.pinned, ["a"], "1002:1000"),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                ),
+                call(
+                    ["docker", "push", "repo:packages-run-key"],
+                    input=None,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                ),
+            ]
+        )
+
+    @patch("image_builder.packages.resolve_image")
+    def test_build_fails(self, resolve_image, run):
+        resolve_image.return_value = resolved_image("run:latest")
+        run.return_value = subprocess.CompletedProcess([], 100, stderr="no package")
+
+        with self.assertRaisesRegex(PackagesBuildError, "no package"):
+            build_packages_image("run:latest", "repo:packages-run-key", ["a"])
+
+        self.assertEqual(run.call_count, 1)
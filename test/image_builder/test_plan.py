@@ -0,0 +1,138 @@
+import os
+from pathlib import Path
+from test.base_test_case import BaseTestCase
+from test.doubles.codebase import load_codebase_languages_double
+from test.doubles.codebase import load_codebase_processes_double
+from test.doubles.codebase import load_codebase_revision_double
+from unittest.mock import patch
+
+from yaml import dump
+from yaml import safe_load
+
+from image_builder.codebase.codebase import Codebase
+from image_builder.const import ECR_REPO
+from image_builder.packages import get_packages_images
+from image_builder.plan import BuildPlan
+from image_builder.plan import BuildPlanError
+
+
+@patch(
+    "image_builder.codebase.codebase.load_codebase_languages",
+    wraps=load_codebase_languages_double,
+)
+@patch(
+    "image_builder.codebase.codebase.load_codebase_processes",
+    wraps=load_codebase_processes_double,
+)
+@patch(
+    "image_builder.codebase.codebase.load_codebase_revision",
+    wraps=load_codebase_revision_double,
+)
+class TestBuildPlan(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ[
+            "CODEBUILD_BUILD_ARN"
+        ] = "arn:aws:codebuild:region:000000000000:build/project:example-build-id"
+        os.environ.pop(ECR_REPO, None)
+
+        self.setUpPyfakefs()
+        self.fs.add_real_paths(
+            [
+                Path(__file__)
+                .parent.parent.parent.joinpath(
+                    "image_builder/configuration/builder_configuration.yml"
+                )
+                .resolve()
+            ]
+        )
+        self.fs.create_file(
+            ".copilot/config.yml",
+            contents=dump(
+                {
+                    "repository": "ecr/repos",
+                    "builder": {
+                        "name": "paketobuildpacks/builder-jammy-full",
+                        "version": "0.3.288",
+                    },
+                    "cache": {"type": "volume", "name": "app-cache"},
+                }
+            ),
+        )
+
+    def test_plan_is_resolved_from_the_codebase(self, *loaders):
+        plan = BuildPlan.from_codebase(Codebase(Path(".")), "run-image")
+
+        self.assertEqual(plan.repository_name, "org/repo")
+        self.assertEqual(plan.commit, "shorthash")
+        self.assertEqual(plan.builder, "paketobuildpacks/builder-jammy-full:0.3.288")
+        self.assertEqual(
+            plan.repository, "000000000000.dkr.ecr.region.amazonaws.com/ecr/repos"
+        )
+        self.assertEqual(plan.registry, "000000000000.dkr.ecr.region.amazonaws.com")
+        self.assertIsNone(plan.additional_registry)
+        self.assertEqual(
+            plan.tags,
+            ("commit-shorthash", "tag-v2.4.6", "tag-latest", "branch-feat-tests"),
+        )
+        self.assertIn("BP_CPYTHON_VERSION=3.11", plan.environment)
+        self.assertEqual(plan.cache, ("volume", "app-cache"))
+        self.assertEqual(plan.run_image, "run-image")
+        self.assertEqual(plan.processes, ("web",))
+        self.assertEqual(
+            plan.get_languages(), "python@3.11, nodejs@20.7, ruby@3.3, php@8.2"
+        )
+
+    @patch(
+        "image_builder.packages.resolve_builder_images",
+        return_value=("builder@sha256:builder", "run@sha256:run"),
+    )
+    @patch("image_builder.packages.PackagesImages.exists", return_value=True)
+    def test_plan_uses_prebuilt_packages_images(self, exists, resolve, *loaders):
+        config = safe_load(Path(".copilot/config.yml").read_text())
+        config["packages"] = ["libpq-dev"]
+        Path(".copilot/config.yml").write_text(dump(config))
+        codebase = Codebase(Path("."))
+        packages = get_packages_images(codebase)
+
+        plan = BuildPlan.from_codebase(codebase, "run-image", packages)
+
+        self.assertEqual(plan.builder, packages.build_image)
+        self.assertEqual(plan.run_image, packages.prebuilt_run_image)
+        self.assertNotIn("fagiani/apt", plan.buildpacks)
+
+        exists.return_value = False
+        plan = BuildPlan.from_codebase(
+            codebase, "run-image", get_packages_images(codebase)
+        )
+
+        self.assertEqual(plan.builder, "paketobuildpacks/builder-jammy-full:0.3.288")
+        self.assertEqual(plan.run_image, "run-image")
+        self.assertIn("fagiani/apt", plan.buildpacks)
+
+    def test_plan_is_not_recomputed_when_the_environment_changes(self, *loaders):
+        plan = BuildPlan.from_codebase(Codebase(Path(".")))
+
+        os.environ[ECR_REPO] = "ecr/environment-repo"
+
+        self.assertTrue(plan.repository.endswith("/ecr/repos"))
+
+    def test_plan_is_immutable(self, *loaders):
+        plan = BuildPlan.from_codebase(Codebase(Path(".")))
+
+        with self.assertRaises(BuildPlanError):
+            plan.repository = "another/repository"
+        with self.assertRaises(BuildPlanError):
+            del plan.builder
+
+    def test_plan_is_hashable_and_round_trips_through_json(self, *loaders):
+        plan = BuildPlan.from_codebase(Codebase(Path(".")))
+        loaded = BuildPlan.from_json(plan.to_json())
+
+        self.assertEqual(loaded, plan)
+        self.assertEqual(hash(loaded), hash(plan))
+        self.assertEqual(len({plan, loaded}), 1)
+        self.assertEqual(loaded.get_build_key(), plan.get_build_key())
+        self.assertNotEqual(
+            BuildPlan.from_codebase(Codebase(Path(".")), "run-image"), plan
+        )
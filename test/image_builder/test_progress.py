@@ -0,0 +1,88 @@
+import json
+import os
+from test.base_test_case import BaseTestCase
+
+from freezegun import freeze_time
+
+from image_builder.progress import BUILD_DURATIONS_FILE
+from image_builder.progress import Progress
+from image_builder.progress import get_build_duration
+from image_builder.progress import record_build_duration
+
+
+class TestProgressReport(BaseTestCase):
+    def test_spans_are_timed(self):
+        progress = Progress()
+
+        with freeze_time("2025-04-14 12:26:00") as frozen_time:
+            with progress.span("docker.login"):
+                frozen_time.tick(2.5)
+
+        self.assertEqual(progress.spans[0].name, "docker.login")
+        self.assertEqual(progress.spans[0].duration, 2.5)
+
+    def test_adding_timings_recorded_elsewhere(self):
+        progress = Progress()
+
+        progress.add_timings(
+            "codebase", {"revision": (100, 0.5), "languages.python": (100.5, 1.5)}
+        )
+
+        self.assertEqual(
+            [(s.name, s.start_time, s.duration) for s in progress.spans],
+            [
+                ("codebase.revision", 100, 0.5),
+                ("codebase.languages.python", 100.5, 1.5),
+            ],
+        )
+
+    def test_writing_a_report(self):
+        self.setUpPyfakefs()
+        progress = Progress()
+        progress.current_phase_running()
+        with progress.span("codebase"):
+            pass
+        progress.start_span("pack.building")
+        progress.current_phase_success()
+
+        progress.write_report("report.json")
+
+        report = json.loads(open("report.json").read())
+        self.assertEqual(
+            report["phases"][0], {"name": "setup", "status": "success", "duration": 0}
+        )
+        self.assertEqual(
+            report["phases"][1],
+            {"name": "build", "status": "pending", "duration": None},
+        )
+        self.assertEqual(
+            report["spans"],
+            [
+                {"name": "codebase", "start": 0, "duration": 0},
+                {"name": "pack.building", "start": 0, "duration": None},
+            ],
+        )
+
+
+class TestBuildDurations(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.setUpPyfakefs()
+        os.environ[BUILD_DURATIONS_FILE] = "/cache/build-durations.json"
+        self.addCleanup(os.environ.pop, BUILD_DURATIONS_FILE)
+
+    def test_recording_build_durations_per_repository(self):
+        record_build_duration("ecr/one", 600)
+        record_build_duration("ecr/two", 300)
+        record_build_duration("ecr/one", 550)
+
+        self.assertEqual(get_build_duration("ecr/one"), 550)
+        self.assertEqual(get_build_duration("ecr/two"), 300)
+        self.assertIsNone(get_build_duration("ecr/three"))
+
+    def test_unreadable_build_durations_are_ignored(self):
+        self.fs.create_file("/cache/build-durations.json", contents="[600]")
+
+        self.assertIsNone(get_build_duration("ecr/one"))
+        record_build_duration("ecr/one", 600)
+        self.assertEqual(get_build_duration("ecr/one"), 600)
@@ -1,28 +1,118 @@
 from test.base_test_case import BaseTestCase
 from test.doubles.process import StubbedProcess
+from test.doubles.registry import FakeRegistry
 from unittest.mock import call
 from unittest.mock import patch
 
 import pytest
 
 from image_builder.publish import publish_to_additional_repository
+from image_builder.publish import publish_with_docker
 from image_builder.publish import run_and_check_result
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
 
 
-@patch("image_builder.publish.Docker.login")
+@patch(
+    "image_builder.publish.get_registry_client",
+    side_effect=lambda registry: RegistryClient(registry),
+)
+class TestPublishToAdditionalRepo(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = FakeRegistry().start()
+        self.target = FakeRegistry().start()
+        self.digest = self.source.add_image(
+            "my/repo", ["commit-abc", "tag-1.0.0"], [b"layer-one", b"layer-two"]
+        )
+
+    def tearDown(self):
+        self.source.stop()
+        self.target.stop()
+        super().tearDown()
+
+    def test_publishing_to_a_repository_in_the_same_registry_mounts_blobs(
+        self, get_registry_client
+    ):
+        publish_to_additional_repository(
+            f"{self.source.address}/my/repo",
+            f"{self.source.address}/other/repo",
+            ["commit-abc", "tag-1.0.0"],
+        )
+
+        for tag in ["commit-abc", "tag-1.0.0"]:
+            self.assertEqual(
+                self.source.manifests[("other/repo", tag)],
+                self.source.manifests[("my/repo", tag)],
+            )
+        self.assertEqual(len(self.source.requests_matching("POST", r"mount=sha256")), 3)
+        self.assertEqual(self.source.requests_matching("GET", r"/blobs/sha256"), [])
+
+    def test_publishing_to_another_registry_streams_each_blob_once(
+        self, get_registry_client
+    ):
+        publish_to_additional_repository(
+            f"{self.source.address}/my/repo",
+            f"{self.target.address}/my/repo",
+            ["commit-abc", "tag-1.0.0"],
+        )
+
+        self.assertEqual(
+            self.target.manifests[("my/repo", "tag-1.0.0")],
+            self.source.manifests[("my/repo", "tag-1.0.0")],
+        )
+        self.assertEqual(
+            self.target.repository_blobs["my/repo"],
+            self.source.repository_blobs["my/repo"],
+        )
+        self.assertEqual(len(self.source.requests_matching("GET", r"/blobs/sha256")), 3)
+        self.assertEqual(len(self.target.requests_matching("PUT", r"/manifests/")), 2)
+
+    def test_publishing_skips_blobs_already_in_the_target(self, get_registry_client):
+        self.target.add_image("my/repo", ["commit-old"], [b"layer-one", b"layer-two"])
+
+        publish_to_additional_repository(
+            f"{self.source.address}/my/repo",
+            f"{self.target.address}/my/repo",
+            ["commit-abc"],
+        )
+
+        self.assertEqual(self.source.requests_matching("GET", r"/blobs/sha256"), [])
+        self.assertIn(("my/repo", "commit-abc"), self.target.manifests)
+
+    @patch("image_builder.publish.publish_with_docker")
+    def test_publishing_falls_back_to_docker_when_the_registry_copy_fails(
+        self, publish_with_docker, get_registry_client
+    ):
+        get_registry_client.side_effect = RegistryError("no credentials")
+
+        publish_to_additional_repository(
+            f"{self.source.address}/my/repo",
+            f"{self.target.address}/my/repo",
+            ["commit-abc"],
+        )
+
+        publish_with_docker.assert_called_once_with(
+            f"{self.source.address}/my/repo",
+            f"{self.target.address}/my/repo",
+            ["commit-abc"],
+        )
+
+
+@patch("image_builder.publish.login")
 @patch("subprocess.run")
 class TestPackPublishToAdditionalRepo(BaseTestCase):
     def test_publish_to_additional_calls_the_correct_commands(
-        self, subprocess_popen, docker_login
+        self, subprocess_popen, registry_login
     ):
         subprocess_popen.return_value = StubbedProcess(returncode=0)
         repository = "000000000000.dkr.ecr.region.amazonaws.com/my/repo"
         additional_repo = "public.ecr.aws/my/repo"
         tags = ["tag1", "tag2"]
 
-        publish_to_additional_repository(repository, additional_repo, tags)
+        publish_with_docker(repository, additional_repo, tags)
 
-        docker_login.assert_called_with("public.ecr.aws")
+        registry_login.assert_called_with(["public.ecr.aws"])
 
         tagged_image_0 = f"{repository}:{tags[0]}"
         tagged_image_1 = f"{repository}:{tags[1]}"
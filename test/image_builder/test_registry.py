@@ -0,0 +1,204 @@
+import base64
+import json
+from test.base_test_case import BaseTestCase
+from test.doubles.registry import FakeRegistry
+from test.doubles.registry import digest_of
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import botocore
+import pytest
+from parameterized import parameterized
+
+from image_builder.registry import OCI_INDEX
+from image_builder.registry import Manifest
+from image_builder.registry import RegistryClient
+from image_builder.registry import RegistryError
+from image_builder.registry import RegistryRequestError
+from image_builder.registry import copy_image_tags
+from image_builder.registry import create_repository
+from image_builder.registry import get_image_labels
+from image_builder.registry import get_registry_credentials
+from image_builder.registry import split_repository
+
+
+class TestRegistryClient(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = FakeRegistry(credentials=("AWS", "secret")).start()
+
+    def tearDown(self):
+        self.registry.stop()
+        super().tearDown()
+
+    def test_client_authenticates_when_challenged(self):
+        digest = self.registry.add_image("my/repo", ["latest"], [b"layer"])
+        client = RegistryClient(self.registry.address, ("AWS", "secret"))
+
+        manifest = client.get_manifest("my/repo", "latest")
+        client.get_manifest("my/repo", "latest")
+
+        self.assertEqual(manifest.digest, digest)
+        self.assertEqual(len(self.registry.requests), 3)
+
+    def test_client_without_credentials_raises_an_error_when_challenged(self):
+        client = RegistryClient(self.registry.address)
+
+        with pytest.raises(RegistryRequestError):
+            client.get_manifest("my/repo", "latest")
+
+    def test_copying_an_index_copies_each_child_manifest(self):
+        first = self.registry.add_image("my/repo", [], [b"amd64"])
+        second = self.registry.add_image("my/repo", [], [b"arm64"])
+        index = json.dumps(
+            {
+                "schemaVersion": 2,
+                "mediaType": OCI_INDEX,
+                "manifests": [{"digest": first}, {"digest": second}],
+            }
+        ).encode()
+        self.registry.manifests[("my/repo", "latest")] = (OCI_INDEX, index)
+        client = RegistryClient(self.registry.address, ("AWS", "secret"))
+
+        copy_image_tags(client, "my/repo", client, "other/repo", ["latest"])
+
+        self.assertEqual(self.registry.manifests[("other/repo", "latest")][1], index)
+        self.assertIn(("other/repo", first), self.registry.manifests)
+        self.assertIn(("other/repo", second), self.registry.manifests)
+        self.assertIn(digest_of(b"arm64"), self.registry.repository_blobs["other/repo"])
+
+    def test_getting_image_labels_caches_the_config_by_digest(self):
+        self.registry.add_image(
+            "my/repo", ["commit-abc", "tag-1.0.0"], [b"layer"], {"key": "value"}
+        )
+        client = RegistryClient(self.registry.address, ("AWS", "secret"))
+
+        labels = get_image_labels(client, "my/repo", "commit-abc")
+        get_image_labels(client, "my/repo", "tag-1.0.0")
+
+        self.assertEqual(labels, {"key": "value"})
+        self.assertEqual(len(self.registry.requests_matching("GET", "/blobs/")), 1)
+        self.assertEqual(len(self.registry.requests_matching("GET", "/manifests/")), 3)
+
+
+class TestManifest(BaseTestCase):
+    def test_manifest_lists_config_and_layer_digests(self):
+        manifest = Manifest(
+            "application/vnd.oci.image.manifest.v1+json",
+            json.dumps(
+                {
+                    "config": {"digest": "sha256:config"},
+                    "layers": [{"digest": "sha256:one"}, {"digest": "sha256:two"}],
+                }
+            ).encode(),
+        )
+
+        self.assertFalse(manifest.is_index())
+        self.assertEqual(
+            manifest.get_blob_digests(), ["sha256:config", "sha256:one", "sha256:two"]
+        )
+
+
+def ecr_error(code):
+    return botocore.exceptions.ClientError({"Error": {"Code": code}}, "operation")
+
+
+class TestRegistryCredentials(BaseTestCase):
+    def test_split_repository(self):
+        self.assertEqual(
+            split_repository("public.ecr.aws/my/repo"), ("public.ecr.aws", "my/repo")
+        )
+
+    @patch("image_builder.registry.boto3.client")
+    def test_getting_private_ecr_credentials(self, client):
+        token = base64.b64encode(b"AWS:password").decode()
+        ecr = MagicMock()
+        ecr.get_authorization_token.return_value = {
+            "authorizationData": [{"authorizationToken": token}]
+        }
+        client.return_value = ecr
+
+        credentials = get_registry_credentials(
+            "000000000000.dkr.ecr.eu-west-2.amazonaws.com"
+        )
+
+        self.assertEqual(credentials, ("AWS", "password"))
+        client.assert_called_with("ecr", region_name="eu-west-2")
+        ecr.get_authorization_token.assert_called_with(registryIds=["000000000000"])
+
+    @patch("image_builder.registry.boto3.client")
+    def test_getting_public_ecr_credentials(self, client):
+        token = base64.b64encode(b"AWS:password").decode()
+        client.return_value.get_authorization_token.return_value = {
+            "authorizationData": {"authorizationToken": token}
+        }
+
+        self.assertEqual(
+            get_registry_credentials("public.ecr.aws"), ("AWS", "password")
+        )
+        client.assert_called_with("ecr-public", region_name="us-east-1")
+
+    def test_other_registries_have_no_credentials(self):
+        self.assertIsNone(get_registry_credentials("ghcr.io"))
+
+    @patch("image_builder.registry.boto3.client")
+    def test_creating_a_repository_that_exists(self, client):
+        create_repository("000000000000.dkr.ecr.eu-west-2.amazonaws.com/my/repo/web")
+
+        client.assert_called_with("ecr", region_name="eu-west-2")
+        client().describe_repositories.assert_called_once_with(
+            registryId="000000000000", repositoryNames=["my/repo/web"]
+        )
+        client().create_repository.assert_not_called()
+
+    @patch("image_builder.registry.boto3.client")
+    def test_creating_a_missing_repository(self, client):
+        client().describe_repositories.side_effect = ecr_error(
+            "RepositoryNotFoundException"
+        )
+
+        create_repository("000000000000.dkr.ecr.eu-west-2.amazonaws.com/my/repo/web")
+
+        client().create_repository.assert_called_once_with(
+            registryId="000000000000",
+            repositoryName="my/repo/web",
+            imageScanningConfiguration={"scanOnPush": True},
+            imageTagMutability="IMMUTABLE",
+        )
+
+    @patch("image_builder.registry.boto3.client")
+    def test_creating_a_repository_created_concurrently(self, client):
+        client().describe_repositories.side_effect = ecr_error(
+            "RepositoryNotFoundException"
+        )
+        client().create_repository.side_effect = ecr_error(
+            "RepositoryAlreadyExistsException"
+        )
+
+        create_repository("000000000000.dkr.ecr.eu-west-2.amazonaws.com/my/repo/web")
+
+    @parameterized.expand(["describe_repositories", "create_repository"])
+    @patch("image_builder.registry.boto3.client")
+    def test_repository_errors_are_raised_as_registry_errors(self, method, client):
+        client().describe_repositories.side_effect = ecr_error(
+            "RepositoryNotFoundException"
+        )
+        getattr(client(), method).side_effect = ecr_error("AccessDeniedException")
+
+        with pytest.raises(RegistryError):
+            create_repository(
+                "000000000000.dkr.ecr.eu-west-2.amazonaws.com/my/repo/web"
+            )
+
+    @patch("image_builder.registry.boto3.client")
+    def test_repositories_are_only_created_in_private_ecr(self, client):
+        create_repository("public.ecr.aws/my/repo/web")
+
+        client.assert_not_called()
+
+    @patch("image_builder.registry.boto3.client")
+    def test_credential_errors_are_raised_as_registry_errors(self, client):
+        client.side_effect = botocore.exceptions.NoCredentialsError()
+
+        with pytest.raises(RegistryError):
+            get_registry_credentials("public.ecr.aws")
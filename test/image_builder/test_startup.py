@@ -0,0 +1,88 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import pytest
+
+from image_builder.startup import Startup
+from image_builder.startup import StartupDependencyError
+from image_builder.startup import StartupError
+
+
+class TestStartup(unittest.TestCase):
+    def test_tasks_receive_the_results_of_their_dependencies(self):
+        startup = Startup()
+        startup.add("codebase", lambda: "codebase")
+        startup.add("docker", lambda: "docker")
+        startup.add(
+            "builder",
+            lambda codebase, docker: f"{codebase}+{docker}",
+            ["codebase", "docker"],
+        )
+
+        startup.start()
+
+        self.assertEqual(
+            startup.join(),
+            {"codebase": "codebase", "docker": "docker", "builder": "codebase+docker"},
+        )
+
+    def test_independent_tasks_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        startup = Startup()
+        startup.add("codebase", barrier.wait)
+        startup.add("docker", barrier.wait)
+
+        startup.start()
+        startup.join()
+
+    def test_a_failed_task_is_raised_and_its_dependants_do_not_run(self):
+        builder = MagicMock()
+        startup = Startup()
+        startup.add("codebase", lambda: "codebase")
+        startup.add("docker", MagicMock(side_effect=ValueError("no daemon")))
+        startup.add("builder", builder, ["codebase", "docker"])
+
+        startup.start()
+
+        with pytest.raises(ValueError, match="no daemon"):
+            startup.join()
+        with pytest.raises(StartupDependencyError):
+            startup.result("builder")
+        builder.assert_not_called()
+
+    def test_adding_a_task_with_an_unknown_dependency(self):
+        startup = Startup()
+
+        with pytest.raises(StartupError):
+            startup.add("builder", lambda docker: None, ["docker"])
+
+    def test_getting_the_critical_path(self):
+        startup = Startup()
+        startup.add("codebase", lambda: None)
+        startup.add("docker", lambda: None)
+        startup.add("login", lambda codebase: None, ["codebase"])
+        startup.add("builder", lambda docker, login: None, ["docker", "login"])
+        startup.start()
+        startup.join()
+
+        for name, start_time, end_time in [
+            ("codebase", 0, 2),
+            ("docker", 0, 1),
+            ("login", 2, 3),
+            ("builder", 3, 5),
+        ]:
+            startup.tasks[name].start_time = start_time
+            startup.tasks[name].end_time = end_time
+
+        self.assertEqual(startup.get_critical_path(), ["codebase", "login", "builder"])
+
+    def test_tasks_are_recorded_as_progress_spans(self):
+        progress = MagicMock()
+        startup = Startup(progress)
+        startup.add("codebase", lambda: None)
+
+        startup.start()
+        startup.join()
+
+        progress.span.assert_called_once_with("codebase")
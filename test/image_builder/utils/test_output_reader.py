@@ -0,0 +1,32 @@
+import subprocess
+import unittest
+from unittest import mock
+
+from image_builder.utils.output_reader import OutputReader
+from image_builder.utils.output_reader import RingBuffer
+
+
+class TestOutputReader(unittest.TestCase):
+    def test_reading_output_with_a_prefix(self):
+        proc = subprocess.Popen(
+            "echo first; echo error >&2; printf 'last'",
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        on_line = mock.Mock()
+
+        with mock.patch("builtins.print") as mock_print:
+            reader = OutputReader(proc, on_line, prefix="[web] ")
+            reader.read()
+
+        on_line.assert_has_calls([mock.call("first"), mock.call("last")])
+        mock_print.assert_has_calls([mock.call("[web] first"), mock.call("[web] last")])
+        self.assertEqual(str(reader.error), "error\n")
+
+    def test_ring_buffer_keeps_the_most_recent_data(self):
+        buffer = RingBuffer(5)
+        buffer.write("abc")
+        buffer.write("defg")
+
+        self.assertEqual(str(buffer), "cdefg")
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+import unittest
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec
+from importlib.util import spec_from_loader
+from pathlib import Path
+
+from click.testing import CliRunner
+
+CLI_PATH = Path(__file__).parent.parent.joinpath("cli")
+HEAVY_MODULES = ["boto3", "botocore", "requests", "slack_sdk", "yaml"]
+
+
+def load_cli():
+    # The cli script has no .py suffix so it needs an explicit loader
+    loader = SourceFileLoader("cli", str(CLI_PATH))
+    module = module_from_spec(spec_from_loader("cli", loader))
+    loader.exec_module(module)
+    return module
+
+
+def get_import_times(*args) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(CLI_PATH), *args],
+        capture_output=True,
+        text=True,
+        cwd=CLI_PATH.parent,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        import_times[module.strip()] = int(cumulative)
+
+    return import_times
+
+
+class TestCli(unittest.TestCase):
+    def test_help_does_not_import_heavy_dependencies(self):
+        import_times = get_import_times("--help")
+
+        self.assertIn("image_builder.commands.group", import_times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, import_times)
+
+    def test_commands_are_imported_when_invoked(self):
+        import_times = get_import_times("warm-up", "--help")
+
+        # Lazily imported modules aren't reported, only their dependencies
+        self.assertIn("image_builder.docker", import_times)
+        self.assertNotIn("image_builder.notify", import_times)
+        self.assertNotIn("image_builder.copilot", import_times)
+
+    def test_deploy_does_not_import_the_build_stack(self):
+        import_times = get_import_times("deploy", "--help")
+
+        self.assertIn("image_builder.copilot", import_times)
+        self.assertNotIn("image_builder.pack", import_times)
+        self.assertNotIn("image_builder.docker", import_times)
+
+    def test_lazy_help_matches_the_commands(self):
+        cli = load_cli()
+
+        for name, lazy_command in cli.COMMANDS.items():
+            command = lazy_command.load()
+            self.assertEqual(command.name, name)
+            self.assertEqual(command.get_short_help_str(), lazy_command.help)
+
+    def test_help_lists_the_commands(self):
+        result = CliRunner().invoke(load_cli().cli, ["--help"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("build         Build an image.", result.output)
+        self.assertIn(
+            "deploy        Deploy an image to a list of services.", result.output
+        )
+        self.assertIn(
+            "rebase        Rebase an image onto the latest run image.", result.output
+        )
+        self.assertIn("rebase-fleet  Rebase every image in a manifest.", result.output)
+        self.assertIn(
+            "warm-up       Pull the supported builder and run images.", result.output
+        )